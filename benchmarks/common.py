@@ -389,6 +389,20 @@ def cold_start_experiment(args, model_iter_fn, model, example_inputs, optimize_c
     pvalue = ttest_ind(timings[:, 0], timings[:, 1]).pvalue
     worst = np.max(timings, axis=0)
 
+    # Compile again like a restarted process would, with only the caches that
+    # persist on disk (e.g. torchinductor.config.persistent_cache) still warm
+    torchdynamo.reset()
+    if "torchinductor.codecache" in sys.modules:
+        from torchinductor.codecache import CppCodeCache
+        from torchinductor.codecache import PyCodeCache
+
+        CppCodeCache.clear()
+        PyCodeCache.clear()
+    warm_model_iter_fn = optimize_ctx(model_iter_fn)
+    warm_times = np.array(
+        [timed(model, warm_model_iter_fn, example_inputs) for _ in range(compile_iters)]
+    )
+
     def breakeven(dynamo_times, eager_times):
         """
         Solve for the number of iterations it takes dynamo to 'catch up' with eager,
@@ -411,17 +425,31 @@ def cold_start_experiment(args, model_iter_fn, model, example_inputs, optimize_c
             # a nonsense negative number
             return 0
 
+    def compile_time(first_times, dynamo_times):
+        """Time spent in the first iterations beyond a warmed up iteration"""
+        return float(np.sum(first_times - np.median(dynamo_times[compile_iters:])))
+
     speedup = worst[0] / worst[1]
     eager_times, dynamo_times = timings[:, 0], timings[:, 1]
     output_csv(
         output_filename,
-        ("dev", "name", "batch_size", "cold-start speedup", "breakeven iters"),
+        (
+            "dev",
+            "name",
+            "batch_size",
+            "cold-start speedup",
+            "breakeven iters",
+            "cold compile sec",
+            "warm compile sec",
+        ),
         [
             current_device,
             current_name,
             current_batch_size,
             float(speedup),
             breakeven(dynamo_times, eager_times),
+            compile_time(dynamo_times[:compile_iters], dynamo_times),
+            compile_time(warm_times, dynamo_times),
         ],
     )
 
@@ -1439,6 +1467,31 @@ def parse_args():
         action="store_true",
         help="Fail a benchmark if backend throws an exception",
     )
+    parser.add_argument(
+        "--fake-propagation-cache",
+        action="store_true",
+        help="Reuse FakeTensor metadata of repeated ops while tracing, "
+        "see torchdynamo.config.fake_propagation_cache",
+    )
+    parser.add_argument(
+        "--cpp-single-module",
+        action="store_true",
+        help="Compile the C++ kernels of each graph as one .so, see "
+        "torchinductor.config.cpp.single_module; compare compile times with "
+        "--cold-start --inductor --devices cpu",
+    )
+    parser.add_argument(
+        "--cpp-vectorize",
+        action="store_true",
+        help="Vectorize the innermost loop of float32 C++ kernels, see "
+        "torchinductor.config.cpp.vectorize; compare speedups with "
+        "--inductor --devices cpu",
+    )
+    parser.add_argument(
+        "--compile-threads",
+        type=int,
+        help="Override torchinductor.config.compile_threads",
+    )
     parser.add_argument(
         "--output",
         help="Overrides the output filename",
@@ -1691,6 +1744,7 @@ def main(runner, original_dir=None):
 
     torchdynamo.config.raise_on_assertion_error = args.raise_on_assertion_error
     torchdynamo.config.raise_on_backend_error = args.raise_on_backend_error
+    torchdynamo.config.fake_propagation_cache = args.fake_propagation_cache
 
     if args.training:
         runner.model_iter_fn = runner.forward_and_backward_pass
@@ -1726,6 +1780,14 @@ def main(runner, original_dir=None):
     if args.no_skip:
         runner.skip_models.clear()
 
+    if args.cpp_single_module or args.cpp_vectorize or args.compile_threads:
+        import torchinductor.config
+
+        torchinductor.config.cpp.single_module = args.cpp_single_module
+        torchinductor.config.cpp.vectorize = args.cpp_vectorize
+        if args.compile_threads:
+            torchinductor.config.compile_threads = args.compile_threads
+
     experiment = null_experiment
     global current_name, current_device, current_batch_size, output_filename, optimize_ctx
     optimize_ctx = NullContext()
@@ -1735,10 +1797,18 @@ def main(runner, original_dir=None):
         experiment = speedup_experiment
         output_filename = "overheads.csv"
     elif args.cold_start:
-        optimize_ctx = torchdynamo.optimize("aot_nvfuser", nopython=args.nopython)
         experiment = cold_start_experiment
-        assert args.nvfuser, "TODO - Add another aot string for mem fusion with NNC"
-        backend_str = "nvfuser" if args.nvfuser else "nnc"
+        if args.inductor:
+            import torchinductor.config
+
+            # the warm restart reuses the output code of the cold one
+            torchinductor.config.persistent_cache = True
+            optimize_ctx = torchdynamo.optimize("inductor", nopython=args.nopython)
+            backend_str = "inductor"
+        else:
+            optimize_ctx = torchdynamo.optimize("aot_nvfuser", nopython=args.nopython)
+            assert args.nvfuser, "TODO - Add another aot string for mem fusion with NNC"
+            backend_str = "nvfuser" if args.nvfuser else "nnc"
         output_filename = f"cold_start_{backend_str}.csv"
         # TODO(whc) should we move this to a more general part of the script?
         torch.backends.cuda.matmul.allow_tf32 = True
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+g++ time per C++ kernel with and without config.cpp.precompiled_header,
+compiling the kernels of a few small graphs into an empty cache directory.
+"""
+import argparse
+import tempfile
+from unittest.mock import patch
+
+import numpy as np
+import tabulate
+import torch
+from torch.fx.experimental.proxy_tensor import make_fx
+
+from torchdynamo.utils import compilation_metrics
+from torchinductor import codecache
+from torchinductor import config
+from torchinductor.codegen.cpp import cpp_prefix_path
+from torchinductor.compile_fx import compile_fx_inner
+
+
+def pointwise(x, y):
+    return (torch.relu(x * y + 1),)
+
+
+def softmax(x, y):
+    return (torch.softmax(x + y, -1),)
+
+
+def layer_norm(x, y):
+    return (torch.nn.functional.layer_norm(x, x.size()[-1:]) * y,)
+
+
+def compile_times(fns, x, y):
+    """(ms per kernel, kernels, ms to build the precompiled header)"""
+    compilation_metrics.clear()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        with patch.object(codecache, "cache_dir", lambda: cache_dir):
+            cpp_prefix_path.cache_clear()
+            codecache._precompile_header.cache_clear()
+            codecache.CppCodeCache.clear()
+            for fn in fns:
+                compile_fx_inner(make_fx(fn)(x, y), [x, y])
+            pch_times = compilation_metrics.pop("_precompile_header", [])
+        cpp_prefix_path.cache_clear()
+    times = compilation_metrics.get("run_cpp_compile", [])
+    return np.mean(times) * 1000, len(times), sum(pch_times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", "-n", type=int, default=3)
+    args = parser.parse_args()
+
+    fns = [pointwise, softmax, layer_norm]
+    x = torch.randn(64, 128)
+    y = torch.randn(64, 128)
+    rows = []
+    for enabled in (False, True):
+        with patch.object(config.cpp, "precompiled_header", enabled), patch.object(
+            config, "compile_threads", 1
+        ):
+            results = [compile_times(fns, x, y) for _ in range(args.repeat)]
+        ms, kernels, pch_ms = min(results)
+        rows.append(
+            ["pch" if enabled else "no pch", kernels, f"{ms:.1f}", f"{pch_ms:.1f}"]
+        )
+
+    print(
+        tabulate.tabulate(
+            rows, headers=["mode", "kernels", "ms per kernel", "pch build ms"]
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Time per call of small CPU graphs with the Python wrapper and with
+config.cpp.wrapper, which generates the wrapper as C++.
+"""
+import argparse
+from unittest.mock import patch
+
+import tabulate
+import torch
+from torch.fx.experimental.proxy_tensor import make_fx
+
+from torchdynamo.testing import same
+from torchinductor import config
+from torchinductor.compile_fx import compile_fx_inner
+from torchinductor.utils import timed
+
+
+def pointwise_chain(x, w):
+    # a reduction between pointwise ops splits this into several kernels
+    y = torch.relu(x * 2 + 1)
+    return (torch.sigmoid(y - y.sum(-1, keepdim=True)),)
+
+
+def linear_relu(x, w):
+    return (torch.relu(x @ w + 1),)
+
+
+def mlp(x, w):
+    return (torch.relu(torch.relu(x @ w) @ w) @ w,)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=16)
+    parser.add_argument("--repeat", "-n", type=int, default=1000)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    x = torch.randn(args.size, args.size)
+    w = torch.randn(args.size, args.size)
+    rows = []
+    for fn in (pointwise_chain, linear_relu, mlp):
+        fn_fx = make_fx(fn)(x, w)
+        expected = fn(x, w)
+        row = [fn.__name__]
+        for enabled in (False, True):
+            with patch.object(config.cpp, "wrapper", enabled):
+                compiled = compile_fx_inner(fn_fx, [x, w])
+            assert same(compiled(x, w), expected)
+            row.append(timed(compiled, [x, w], times=args.repeat) / args.repeat * 1e6)
+        row.append(f"{row[1] / row[2]:.2f}x")
+        rows.append(row)
+
+    print(
+        tabulate.tabulate(
+            rows,
+            headers=["graph", "python us", "c++ us", "speedup"],
+            floatfmt=".1f",
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
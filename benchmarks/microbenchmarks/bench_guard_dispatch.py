@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Per-call overhead of a compiled frame as its cache grows, with the linear
+CacheEntry walk and with config.guard_dispatch.
+"""
+import argparse
+import timeit
+from unittest.mock import patch
+
+import tabulate
+import torch
+
+import torchdynamo
+from torchdynamo.utils import disable_cache_limit
+
+
+def fn(a, b):
+    return a + b
+
+
+def measure(cache_size, guard_dispatch, number):
+    torchdynamo.reset()
+    with patch.object(torchdynamo.config, "guard_dispatch", guard_dispatch):
+        with disable_cache_limit():
+            opt_fn = torchdynamo.optimize("eager")(fn)
+            # one recompile per batch size
+            inputs = [
+                (torch.randn(n + 1, 4), torch.randn(4)) for n in range(cache_size)
+            ]
+            for args in inputs:
+                opt_fn(*args)
+            # a linear walk checks the oldest entry last
+            args = inputs[0]
+            opt_fn(*args)
+            seconds = timeit.timeit(lambda: opt_fn(*args), number=number)
+    torchdynamo.reset()
+    return seconds / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", "-s", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64]
+    )
+    parser.add_argument(
+        "--number", "-n", type=int, default=10000, help="calls per measurement"
+    )
+    args = parser.parse_args()
+
+    inputs = (torch.randn(1, 4), torch.randn(4))
+    eager_us = timeit.timeit(lambda: fn(*inputs), number=args.number) / args.number
+    eager_us *= 1e6
+
+    rows = []
+    for size in args.sizes:
+        linear_us = measure(size, False, args.number)
+        dispatch_us = measure(size, True, args.number)
+        rows.append(
+            [
+                size,
+                f"{eager_us:.2f}",
+                f"{linear_us:.2f}",
+                f"{dispatch_us:.2f}",
+                f"{linear_us / dispatch_us:.2f}x",
+            ]
+        )
+
+    print(
+        tabulate.tabulate(
+            rows,
+            headers=["cache size", "eager us", "linear us", "dispatch us", "speedup"],
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
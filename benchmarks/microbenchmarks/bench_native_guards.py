@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Per-call overhead of a compiled frame with many non-tensor guards, with the
+exec'd python guard lambda and with config.native_guards.
+"""
+import argparse
+import timeit
+from unittest.mock import patch
+
+import tabulate
+import torch
+
+import torchdynamo
+
+
+def fn(x, items):
+    # every item is specialized, giving a TYPE_MATCH and an EQUALS_MATCH guard
+    total = 0.0
+    for item in items:
+        total = total + item
+    return x + total
+
+
+def measure(num_items, native_guards, number):
+    torchdynamo.reset()
+    args = (torch.randn(4), [float(i) for i in range(num_items)])
+    with patch.object(torchdynamo.config, "native_guards", native_guards):
+        opt_fn = torchdynamo.optimize("eager")(fn)
+        opt_fn(*args)
+        seconds = timeit.timeit(lambda: opt_fn(*args), number=number)
+    torchdynamo.reset()
+    return seconds / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", "-i", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument(
+        "--number", "-n", type=int, default=10000, help="calls per measurement"
+    )
+    args = parser.parse_args()
+
+    rows = []
+    for num_items in args.items:
+        python_us = measure(num_items, False, args.number)
+        native_us = measure(num_items, True, args.number)
+        rows.append(
+            [
+                num_items,
+                f"{python_us:.2f}",
+                f"{native_us:.2f}",
+                f"{python_us / native_us:.2f}x",
+            ]
+        )
+
+    print(
+        tabulate.tabulate(
+            rows,
+            headers=["list items", "python guards us", "native guards us", "speedup"],
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Time to the first compiled call in a new process: importing torchdynamo
+and converting a small function, which walks torch.* to find the functions
+allowed in graphs.  Run without config.startup_cache, then with it against
+an empty (cold) and a filled (warm) cache directory.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import tabulate
+
+CHILD = """
+import json
+import time
+
+import torch
+
+t0 = time.perf_counter()
+import torchdynamo
+
+t1 = time.perf_counter()
+
+
+def fn(a, b):
+    return torch.nn.functional.relu(a @ b) + a.sin()
+
+
+torchdynamo.optimize("eager")(fn)(torch.randn(8, 8), torch.randn(8, 8))
+t2 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "first_call": t2 - t1}))
+"""
+
+
+def run(env):
+    out = subprocess.check_output([sys.executable, "-c", CHILD], env=env)
+    times = json.loads(out.decode("utf-8").strip().splitlines()[-1])
+    return times["import"] * 1000, times["first_call"] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", "-n", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        base_env = dict(os.environ, TORCHDYNAMO_CACHE_DIR=cache_dir)
+        modes = [
+            ("no cache", dict(base_env, TORCHDYNAMO_STARTUP_CACHE="0")),
+            ("cold cache", dict(base_env, TORCHDYNAMO_STARTUP_CACHE="1")),
+            ("warm cache", dict(base_env, TORCHDYNAMO_STARTUP_CACHE="1")),
+        ]
+        rows = []
+        for name, env in modes:
+            results = []
+            for _ in range(args.repeat):
+                if name == "cold cache":
+                    for root, dirs, files in os.walk(cache_dir):
+                        for filename in files:
+                            os.unlink(os.path.join(root, filename))
+                results.append(run(env))
+            import_ms, first_call_ms = (min(times) for times in zip(*results))
+            rows.append(
+                [
+                    name,
+                    f"{import_ms:.1f}",
+                    f"{first_call_ms:.1f}",
+                    f"{import_ms + first_call_ms:.1f}",
+                ]
+            )
+
+    print(
+        tabulate.tabulate(
+            rows,
+            headers=["mode", "import ms", "first call ms", "total ms"],
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+C++ kernels for transposes and column reductions with and without
+config.cpp.tiling, which runs them in cache-sized tiles.
+"""
+import argparse
+from unittest.mock import patch
+
+import tabulate
+import torch
+from torch.fx.experimental.proxy_tensor import make_fx
+
+from torchdynamo.testing import same
+from torchinductor import config
+from torchinductor.compile_fx import compile_fx_inner
+from torchinductor.utils import timed
+
+
+def transpose_add(x, y):
+    return (x.t() + y,)
+
+
+def permute_relu(x, y):
+    # NCHW -> NHWC
+    nchw = x.view(16, -1, x.size(1) // 16, 16)
+    return (torch.relu(nchw.permute(0, 2, 3, 1).contiguous()),)
+
+
+def column_sum(x, y):
+    return (x.sum(0),)
+
+
+def column_softmax(x, y):
+    return (torch.softmax(x, 0),)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=2048, help="multiple of 16")
+    parser.add_argument("--repeat", "-n", type=int, default=10)
+    args = parser.parse_args()
+
+    x = torch.randn(args.size, args.size)
+    y = torch.randn(args.size, args.size)
+    rows = []
+    for fn in (transpose_add, permute_relu, column_sum, column_softmax):
+        fn_fx = make_fx(fn)(x, y)
+        expected = fn(x, y)
+        row = [fn.__name__]
+        for enabled in (False, True):
+            with patch.object(config.cpp, "tiling", enabled):
+                compiled = compile_fx_inner(fn_fx, [x, y])
+            assert same(compiled(x, y), expected)
+            row.append(timed(compiled, [x, y], times=args.repeat) / args.repeat * 1000)
+        row.append(f"{row[1] / row[2]:.2f}x")
+        rows.append(row)
+
+    print(
+        tabulate.tabulate(
+            rows,
+            headers=["kernel", "untiled ms", "tiled ms", "speedup"],
+            floatfmt=".2f",
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Tracing time of loop-heavy functions (modeled on test_repros.py) as the
+number of iterations grows.  Every list or dict mutation goes through
+InstructionTranslator.replace_all(), so the per iteration time should stay
+roughly flat.
+"""
+import argparse
+import time
+
+import tabulate
+import torch
+
+import torchdynamo
+
+
+class SequentialAppendList(torch.nn.Sequential):
+    """test_repros.test_seq_append_list, from timm/models/vovnet.py"""
+
+    def forward(self, x, concat_list):
+        for i, module in enumerate(self):
+            if i == 0:
+                concat_list.append(module(x))
+            else:
+                concat_list.append(module(concat_list[-1]))
+        x = torch.cat(concat_list, dim=1)
+        return x, concat_list
+
+
+def append_list(x, n):
+    results = []
+    for i in range(n):
+        results.append(x + i)
+    return results
+
+
+def fill_dict(x, n):
+    results = {}
+    for i in range(n):
+        results[i] = x * i
+    return results
+
+
+def slice_into_list(listy, n):
+    """test_repros.test_slice_into_list_mutable"""
+    x = listy[3:5]
+    for i in range(n):
+        x[0] = listy[i % len(listy)] + 1
+    return x
+
+
+def make_cases(n):
+    model = SequentialAppendList(
+        *[torch.nn.Linear(10, 10) if i % 2 == 0 else torch.nn.ReLU() for i in range(n)]
+    )
+    x = torch.randn(4, 10)
+    return {
+        "seq_append_list": (model, (x, [x])),
+        "append_list": (append_list, (x, n)),
+        "fill_dict": (fill_dict, (x, n)),
+        "slice_into_list": (slice_into_list, ([torch.randn(10)] * 10, n)),
+    }
+
+
+def measure(fn, args):
+    torchdynamo.reset()
+    opt_fn = torchdynamo.optimize("eager")(fn)
+    t0 = time.perf_counter()
+    with torch.no_grad():
+        opt_fn(*args)
+    seconds = time.perf_counter() - t0
+    torchdynamo.reset()
+    return seconds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", "-s", type=int, nargs="+", default=[16, 32, 64, 128, 256]
+    )
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        for name, (fn, fn_args) in make_cases(size).items():
+            ms = measure(fn, fn_args)
+            rows.append([name, size, f"{ms:.1f}", f"{ms / size:.3f}"])
+
+    print(
+        tabulate.tabulate(
+            sorted(rows, key=lambda row: row[0]),
+            headers=["case", "iterations", "trace ms", "ms per iteration"],
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env pytest
+import threading
+import unittest
+
+import torch
+
+import torchdynamo
+import torchdynamo.testing
+from torchdynamo.background_compile import BackgroundCompiler
+from torchdynamo.testing import same
+from torchdynamo.utils import counters
+
+
+class BlockingBackend:
+    def __init__(self):
+        self.release = threading.Event()
+        self.compiled_calls = 0
+        self.grad_enabled = []
+
+    def __call__(self, gm, example_inputs):
+        self.release.wait()
+        self.grad_enabled.append(torch.is_grad_enabled())
+
+        def compiled(*args):
+            self.compiled_calls += 1
+            return gm.forward(*args)
+
+        return compiled
+
+
+class BackgroundCompileTests(torchdynamo.testing.TestCase):
+    def test_eager_until_compiled(self):
+        def fn(a, b):
+            return a.sin() + b
+
+        backend = BlockingBackend()
+        opt_fn = torchdynamo.optimize(backend, background_compile=True)(fn)
+        a = torch.randn(10)
+        b = torch.randn(10)
+        with torch.no_grad():
+            self.assertTrue(same(opt_fn(a, b), fn(a, b)))
+            self.assertTrue(same(opt_fn(a, b), fn(a, b)))
+            self.assertEqual(backend.compiled_calls, 0)
+            self.assertEqual(counters["background_compile"]["submitted"], 1)
+
+            backend.release.set()
+            self.assertTrue(BackgroundCompiler.wait(timeout=60))
+            self.assertTrue(same(opt_fn(a, b), fn(a, b)))
+        self.assertEqual(backend.compiled_calls, 1)
+        self.assertEqual(backend.grad_enabled, [False])
+        self.assertEqual(counters["background_compile"]["compiled"], 1)
+        self.assertEqual(
+            len(torchdynamo.utils.compilation_metrics["background_compile_latency"]), 1
+        )
+
+    def test_max_pending(self):
+        def fn(a):
+            return a + 1
+
+        backend = BlockingBackend()
+        backend.release.set()
+        opt_fn = torchdynamo.optimize(backend, background_compile=True)(fn)
+        with unittest.mock.patch.object(
+            torchdynamo.config, "background_compile_max_pending", 0
+        ):
+            a = torch.randn(10)
+            self.assertTrue(same(opt_fn(a), fn(a)))
+        self.assertEqual(backend.compiled_calls, 1)
+        self.assertEqual(counters["background_compile"]["synchronous"], 1)
+
+    def test_synchronous_compile_releases_lock(self):
+        def fn(a):
+            return a - 1
+
+        waited = []
+
+        def backend(gm, example_inputs):
+            # another thread can take the lock while this compiles
+            thread = threading.Thread(
+                target=lambda: waited.append(BackgroundCompiler.wait(timeout=5))
+            )
+            thread.start()
+            thread.join(timeout=10)
+            return gm.forward
+
+        compiler = BackgroundCompiler(backend)
+        opt_fn = torchdynamo.optimize(compiler)(fn)
+        with unittest.mock.patch.object(
+            torchdynamo.config, "background_compile_max_pending", 0
+        ):
+            a = torch.randn(10)
+            self.assertTrue(same(opt_fn(a), fn(a)))
+        self.assertEqual(waited, [True])
+        self.assertTrue(compiler.wait(timeout=60))
+
+    def test_failed_compile(self):
+        def fn(a):
+            return a * 2
+
+        def backend(gm, example_inputs):
+            raise RuntimeError("broken backend")
+
+        opt_fn = torchdynamo.optimize(backend, background_compile=True)(fn)
+        a = torch.randn(10)
+        self.assertTrue(same(opt_fn(a), fn(a)))
+        self.assertTrue(BackgroundCompiler.wait(timeout=60))
+        self.assertTrue(same(opt_fn(a), fn(a)))
+        self.assertEqual(counters["background_compile"]["failed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
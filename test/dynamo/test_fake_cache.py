@@ -0,0 +1,70 @@
+#!/usr/bin/env pytest
+import unittest
+
+import torch
+
+import torchdynamo
+import torchdynamo.testing
+from torchdynamo.testing import CompileCounter
+from torchdynamo.testing import same
+from torchdynamo.utils import counters
+
+
+class FakePropagationCacheTests(torchdynamo.testing.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._exit_stack.enter_context(
+            unittest.mock.patch.object(
+                torchdynamo.config, "fake_propagation_cache", True
+            )
+        )
+
+    def test_repeated_ops(self):
+        def fn(x, w):
+            for _ in range(4):
+                x = torch.relu(x @ w) + 1
+            return x
+
+        x = torch.randn(8, 8)
+        w = torch.randn(8, 8)
+        cnt = CompileCounter()
+        self.assertTrue(same(torchdynamo.optimize(cnt)(fn)(x, w), fn(x, w)))
+        self.assertEqual(cnt.frame_count, 1)
+        self.assertEqual(counters["fake_cache"]["misses"], 3)
+        self.assertEqual(counters["fake_cache"]["hits"], 9)
+
+    def test_views_not_cached(self):
+        def fn(x):
+            a = x.view(-1)
+            b = x.view(-1)
+            c = x.add_(1)
+            d = x.add_(1)
+            return a + 1, b + 1, c, d
+
+        x = torch.randn(8, 8)
+        cnt = CompileCounter()
+        self.assertTrue(same(torchdynamo.optimize(cnt)(fn)(x.clone()), fn(x.clone())))
+        # only b + 1 reuses the metadata of a + 1
+        self.assertEqual(counters["fake_cache"]["misses"], 3)
+        self.assertEqual(counters["fake_cache"]["hits"], 1)
+
+    def test_requires_grad_not_cached(self):
+        lin = torch.nn.Linear(8, 8)
+
+        def fn(x):
+            a = lin(x)
+            b = lin(x)
+            # fails under fake mode if b were a leaf that requires grad
+            b.mul_(2)
+            return a + b
+
+        x = torch.randn(4, 8)
+        cnt = CompileCounter()
+        self.assertTrue(same(torchdynamo.optimize(cnt)(fn)(x), fn(x)))
+        self.assertEqual(cnt.frame_count, 1)
+        self.assertEqual(counters["fake_cache"]["hits"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env pytest
+import unittest
+
+import torch
+
+import torchdynamo
+import torchdynamo.testing
+from torchdynamo.testing import CompileCounter
+from torchdynamo.testing import make_test_cls_with_patches
+from torchdynamo.testing import same
+
+from . import test_functions
+from . import test_misc
+from . import test_repros
+
+
+def make_guard_dispatch_cls(cls):
+    return make_test_cls_with_patches(
+        cls, "GuardDispatch", "_guard_dispatch", ("guard_dispatch", True)
+    )
+
+
+GuardDispatchFunctionTests = make_guard_dispatch_cls(test_functions.FunctionTests)
+GuardDispatchMiscTests = make_guard_dispatch_cls(test_misc.MiscTests)
+GuardDispatchReproTests = make_guard_dispatch_cls(test_repros.ReproTests)
+
+
+class GuardDispatchTests(torchdynamo.testing.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._exit_stack.enter_context(
+            unittest.mock.patch.object(torchdynamo.config, "guard_dispatch", True)
+        )
+        cls._exit_stack.enter_context(
+            unittest.mock.patch.object(torchdynamo.config, "cache_size_limit", 16)
+        )
+
+    def test_revisit_variants(self):
+        def fn(a, b):
+            return a + b
+
+        inputs = [
+            (torch.randn(n, 4, dtype=dtype), torch.randn(4, dtype=dtype))
+            for n in (2, 3)
+            for dtype in (torch.float32, torch.float64)
+        ]
+        # b is not a tensor, so this entry is checked on every lookup
+        inputs.append((torch.randn(3, 4), 1.5))
+
+        counter = CompileCounter()
+        opt_fn = torchdynamo.optimize(counter)(fn)
+        for args in inputs + inputs[::-1]:
+            self.assertTrue(same(opt_fn(*args), fn(*args)))
+        self.assertEqual(counter.frame_count, len(inputs))
+
+    def test_same_key_different_guards(self):
+        def fn(a, n):
+            return a * n
+
+        a = torch.randn(4)
+        counter = CompileCounter()
+        opt_fn = torchdynamo.optimize(counter)(fn)
+        for n in (1, 2, 3, 1, 2, 3):
+            self.assertTrue(same(opt_fn(a, n), fn(a, n)))
+        self.assertEqual(counter.frame_count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
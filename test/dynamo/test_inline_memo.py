@@ -0,0 +1,115 @@
+#!/usr/bin/env pytest
+import unittest
+
+import torch
+
+import torchdynamo
+import torchdynamo.testing
+from torchdynamo.testing import CompileCounter
+from torchdynamo.testing import same
+from torchdynamo.utils import counters
+
+_calls = []
+
+
+def scaled_gelu(x, scale=1.0):
+    return torch.nn.functional.gelu(x) * scale, x.size(-1)
+
+
+def attention_scores(q, k):
+    scores = torch.matmul(q, k.transpose(-1, -2))
+    return scores / (q.size(-1) ** 0.5)
+
+
+def logged_relu(x):
+    _calls.append(1)
+    return torch.relu(x)
+
+
+class Config:
+    scale = 1.0
+
+
+cfg = Config()
+
+
+def cfg_scaled(x):
+    return x * cfg.scale
+
+
+class InlineMemoTests(torchdynamo.testing.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._exit_stack.enter_context(
+            unittest.mock.patch.object(torchdynamo.config, "inline_memoization", True)
+        )
+
+    def test_replay_helper(self):
+        def fn(x, q, k):
+            for _ in range(4):
+                x, n = scaled_gelu(x)
+                x = x + attention_scores(q, k).sum() / n
+            return x
+
+        args = [torch.randn(4, 8) for _ in range(3)]
+        ref = fn(*args)
+        ref_cnt = CompileCounter()
+        with unittest.mock.patch.object(
+            torchdynamo.config, "inline_memoization", False
+        ):
+            torchdynamo.optimize_assert(ref_cnt)(fn)(*args)
+
+        cnt = CompileCounter()
+        opt_fn = torchdynamo.optimize_assert(cnt)(fn)
+        self.assertTrue(same(opt_fn(*args), ref))
+        self.assertEqual(cnt.frame_count, 1)
+        self.assertEqual(cnt.op_count, ref_cnt.op_count)
+        self.assertEqual(counters["inline_memo"]["recorded"], 2)
+        self.assertEqual(counters["inline_memo"]["hits"], 6)
+
+    def test_signature_mismatch(self):
+        def fn(x):
+            a, _ = scaled_gelu(x, 2.0)
+            b, _ = scaled_gelu(x, 3.0)
+            c, _ = scaled_gelu(x.to(torch.float64), 2.0)
+            d, _ = scaled_gelu(x[:2], 2.0)
+            return a, b, c, d
+
+        x = torch.randn(4, 8)
+        opt_fn = torchdynamo.optimize_assert(CompileCounter())(fn)
+        self.assertTrue(same(opt_fn(x), fn(x)))
+        self.assertEqual(counters["inline_memo"]["recorded"], 4)
+        self.assertEqual(counters["inline_memo"]["hits"], 0)
+
+    def test_side_effects_not_memoized(self):
+        def fn(x):
+            return logged_relu(x) + logged_relu(x + 1)
+
+        x = torch.randn(4)
+        opt_fn = torchdynamo.optimize_assert(CompileCounter())(fn)
+        del _calls[:]
+        self.assertTrue(same(opt_fn(x), fn(x)))
+        self.assertEqual(len(_calls), 4)
+        self.assertEqual(counters["inline_memo"]["recorded"], 0)
+
+    def test_mutation_between_calls(self):
+        def fn(x):
+            a = cfg_scaled(x)
+            cfg.scale = 2.0
+            b = cfg_scaled(x)
+            return a, b
+
+        x = torch.randn(4)
+        opt_fn = torchdynamo.optimize_assert(CompileCounter())(fn)
+        try:
+            a, b = opt_fn(x)
+        finally:
+            cfg.scale = 1.0
+        self.assertTrue(same(a, x))
+        self.assertTrue(same(b, x * 2))
+        self.assertEqual(counters["inline_memo"]["hits"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
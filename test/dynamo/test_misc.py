@@ -4,6 +4,7 @@ import copy
 import dataclasses
 import dis
 import enum
+import gc
 import logging
 import math
 import os
@@ -19,10 +20,14 @@ from torch.testing._internal.jit_utils import JitTestCase
 
 import torchdynamo.testing
 from torchdynamo import bytecode_transformation
+from torchdynamo import skipfiles
 from torchdynamo.testing import CompileCounter
 from torchdynamo.testing import requires_static_shapes
 from torchdynamo.testing import same
 from torchdynamo.testing import unsupported
+from torchdynamo.utils import CleanupManager
+from torchdynamo.utils import JournaledSet
+from torchdynamo.utils import UndoLog
 
 mytuple = collections.namedtuple("mytuple", ["a", "b", "ab"])
 
@@ -2654,6 +2659,145 @@ class MiscTests(torchdynamo.testing.TestCase):
                     dist.destroy_process_group()
                 self.assertEqual(res, 1)
 
+    def test_graph_break_rolls_back_inlined_call(self):
+        class Obj:
+            pass
+
+        def helper(x, obj, items):
+            obj.count = obj.count + 1
+            items.append(x)
+            y = x * obj.weight
+            return unsupported(y, y)
+
+        def fn(x, obj, items):
+            x = x + 1
+            return helper(x, obj, items) + 1
+
+        def make_args():
+            obj = Obj()
+            obj.count = 0
+            obj.weight = torch.ones(4) * 2
+            return torch.ones(4), obj, []
+
+        ref_args = make_args()
+        ref = fn(*ref_args)
+        args = make_args()
+        opt_fn = torchdynamo.optimize("eager")(fn)
+        self.assertTrue(same(opt_fn(*args), ref))
+        # the side effects of the failed inline are undone and replayed once
+        self.assertEqual(args[1].count, 1)
+        self.assertEqual(len(args[2]), 1)
+
+    def test_list_mutation_seen_through_containers(self):
+        def fn(x):
+            inner = []
+            other = [x]
+            outer = [inner, other]
+            d = {"outer": outer, "other": other}
+            for i in range(3):
+                inner.append(x + i)
+            other.append(x * 2)
+            return d["outer"][0][2] + d["other"][1], len(outer[0]), len(other)
+
+        x = torch.randn(4)
+        ref = fn(x)
+        cnt = CompileCounter()
+        opt_fn = torchdynamo.optimize_assert(cnt)(fn)
+        self.assertTrue(same(opt_fn(x), ref))
+        self.assertEqual(cnt.frame_count, 1)
+
+    def test_skipfiles_check_cache(self):
+        filename = os.path.join(skipfiles.TORCH_DIR, "_not_a_real_file.py")
+        self.assertTrue(skipfiles.check(filename))
+        self.assertTrue(skipfiles.CHECK_CACHE[filename])
+        with patch.object(
+            skipfiles, "FILENAME_ALLOWLIST", skipfiles._AllowList()
+        ) as allowlist:
+            allowlist.add(filename)
+            self.assertNotIn(filename, skipfiles.CHECK_CACHE)
+            self.assertFalse(skipfiles.check(filename))
+
+    def test_skipped_file_does_not_call_back(self):
+        filename = os.path.join(skipfiles.TORCH_DIR, "_not_a_real_file.py")
+        scope = {}
+        source = "def f(x):\n    return x + 1\n\ndef g(x):\n    return x - 1\n"
+        exec(compile(source, filename, "exec"), scope)
+        cnt = CompileCounter()
+        x = torch.randn(4)
+        with patch.object(skipfiles, "check", wraps=skipfiles.check) as check:
+            torchdynamo.optimize(cnt)(scope["f"])(x)
+            calls = check.call_count
+            torchdynamo.optimize(cnt)(scope["g"])(x)
+            self.assertEqual(check.call_count, calls)
+        self.assertEqual(cnt.frame_count, 0)
+
+    def test_frame_prefilter(self):
+        def pure(n):
+            return unsupported(n, n) + 1
+
+        def fn(x):
+            return x + pure(2)
+
+        x = torch.randn(4)
+        cnt = CompileCounter()
+        with patch.object(torchdynamo.config, "frame_prefilter", True):
+            filtered = torchdynamo.eval_frame.prefilter_stats()["filtered"]
+            self.assertTrue(same(torchdynamo.optimize(cnt)(fn)(x), x + 3))
+            self.assertEqual(
+                torchdynamo.eval_frame.prefilter_stats()["filtered"], filtered + 1
+            )
+            self.assertEqual(
+                [ref() for ref in torchdynamo.eval_frame.prefiltered_code_objects],
+                [pure.__code__],
+            )
+
+        # turned off, the callback sees new frames (and the rejected ones)
+        # again on the next call, without a reset()
+        filtered = torchdynamo.eval_frame.prefilter_stats()["filtered"]
+        self.assertTrue(same(torchdynamo.optimize(cnt)(fn)(x), x + 3))
+        self.assertEqual(torchdynamo.eval_frame.prefilter_stats()["filtered"], filtered)
+        self.assertEqual(torchdynamo.eval_frame.prefiltered_code_objects, [])
+
+    def test_compiled_code_freed_without_gc(self):
+        def live_guards():
+            return sum(
+                isinstance(obj, torchdynamo.guards.GuardValidity)
+                for obj in gc.get_objects()
+            )
+
+        x = torch.randn(4)
+        gc.collect()
+        guards = live_guards()
+        cleanups = CleanupManager.count
+        gc.disable()
+        try:
+            for i in range(1000):
+                scope = {}
+                exec(f"def fn(x):\n    return x + {i}\n", scope)
+                torchdynamo.optimize("eager")(scope["fn"])(x)
+                # the cache entries, guards and __compiled_fn_* go with fn
+                del scope["fn"]
+            self.assertEqual(live_guards(), guards)
+            self.assertEqual(CleanupManager.count, cleanups)
+        finally:
+            gc.enable()
+
+    def test_reset_while_compiling(self):
+        def reset_backend(gm, example_inputs):
+            # frees the cache of fn while its frame is being converted
+            torchdynamo.reset()
+            return gm.forward
+
+        def fn(x):
+            return x + 1
+
+        x = torch.randn(4)
+        opt_fn = torchdynamo.optimize(reset_backend)(fn)
+        for _ in range(3):
+            self.assertTrue(same(opt_fn(x), x + 1))
+            torchdynamo.eval_frame.reset_code(fn.__code__)
+            torchdynamo.eval_frame.reset_code(fn.__code__)
+
 
 class CustomFunc(torch.autograd.Function):
     @staticmethod
@@ -2681,6 +2825,21 @@ class Module2(torch.nn.Module):
     def forward(self, foo):
         return self.fn(foo)
 
+    def test_journaled_set_rollback(self):
+        undo_log = UndoLog()
+        items = JournaledSet(undo_log, [1, 2, 3])
+        marker = undo_log.marker()
+        items.add(4)
+        items.discard(1)
+        items -= {2, 5}
+        items ^= {3, 6}
+        self.assertEqual(items, {4, 6})
+        items.clear()
+        with self.assertRaises(KeyError):
+            items.remove(1)
+        undo_log.rollback(marker)
+        self.assertEqual(items, {1, 2, 3})
+
 
 class TestTracer(JitTestCase):
     def test_jit_save(self):
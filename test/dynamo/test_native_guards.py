@@ -0,0 +1,110 @@
+#!/usr/bin/env pytest
+import unittest
+
+import torch
+
+import torchdynamo
+import torchdynamo.testing
+from torchdynamo.testing import CompileCounter
+from torchdynamo.testing import make_test_cls_with_patches
+from torchdynamo.testing import same
+
+from . import test_functions
+from . import test_misc
+from . import test_modules
+from . import test_repros
+
+
+def make_native_guards_cls(cls):
+    return make_test_cls_with_patches(
+        cls, "NativeGuards", "_native_guards", ("native_guards", True)
+    )
+
+
+NativeGuardsFunctionTests = make_native_guards_cls(test_functions.FunctionTests)
+NativeGuardsMiscTests = make_native_guards_cls(test_misc.MiscTests)
+NativeGuardsNNModuleTests = make_native_guards_cls(test_modules.NNModuleTests)
+NativeGuardsReproTests = make_native_guards_cls(test_repros.ReproTests)
+
+
+class NativeGuardsTests(torchdynamo.testing.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._exit_stack.enter_context(
+            unittest.mock.patch.object(torchdynamo.config, "native_guards", True)
+        )
+
+    def test_constants(self):
+        def fn(x, items, mode):
+            for item in items:
+                x = x + item
+            if mode == "double":
+                x = x * 2
+            return x
+
+        x = torch.randn(4)
+        counter = CompileCounter()
+        opt_fn = torchdynamo.optimize(counter)(fn)
+        for items, mode in [
+            ([1.0, 2.0], "double"),
+            ([1.0, 2.0], "double"),
+            ([1.0, 3.0], "double"),
+            ([1.0, 2.0, 3.0], "double"),
+            ([1.0, 2.0], "single"),
+            ((1.0, 2.0), "double"),
+        ]:
+            self.assertTrue(same(opt_fn(x, items, mode), fn(x, items, mode)))
+        self.assertEqual(counter.frame_count, 5)
+
+    def test_tensors_and_grad_mode(self):
+        def fn(a, b):
+            return a + b
+
+        counter = CompileCounter()
+        opt_fn = torchdynamo.optimize(counter)(fn)
+        a = torch.randn(4)
+        b = torch.randn(4)
+        opt_fn(a, b)
+        opt_fn(a, b)
+        self.assertEqual(counter.frame_count, 1)
+        opt_fn(a, torch.randn(4, dtype=torch.float64))
+        self.assertEqual(counter.frame_count, 2)
+        with torch.no_grad():
+            opt_fn(a, b)
+        self.assertEqual(counter.frame_count, 3)
+
+    def test_module_attributes(self):
+        class MyModule(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.linear = torch.nn.Linear(4, 4)
+                self.scale = 2
+
+            def forward(self, x):
+                return self.linear(x) * self.scale
+
+        mod = MyModule()
+        x = torch.randn(4)
+        counter = CompileCounter()
+        opt_mod = torchdynamo.optimize(counter)(mod)
+        self.assertTrue(same(opt_mod(x), mod(x)))
+        self.assertTrue(same(opt_mod(x), mod(x)))
+        self.assertEqual(counter.frame_count, 1)
+        mod.scale = 3
+        self.assertTrue(same(opt_mod(x), mod(x)))
+        self.assertEqual(counter.frame_count, 2)
+
+    def test_guard_failure_reasons(self):
+        def fn(x, n):
+            return x * n
+
+        opt_fn = torchdynamo.optimize("eager")(fn)
+        x = torch.randn(4)
+        opt_fn(x, 2)
+        opt_fn(x, 3)
+        self.assertEqual(torchdynamo.utils.guard_failures[fn.__code__], [["n == 2"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
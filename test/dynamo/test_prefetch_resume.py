@@ -0,0 +1,119 @@
+#!/usr/bin/env pytest
+import threading
+import unittest
+
+import torch
+
+import torchdynamo
+import torchdynamo.testing
+from torchdynamo.background_compile import BackgroundCompiler
+from torchdynamo.testing import CompileCounter
+from torchdynamo.testing import same
+from torchdynamo.testing import unsupported
+from torchdynamo.utils import counters
+
+
+class PrefetchResumeTests(torchdynamo.testing.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._exit_stack.enter_context(
+            unittest.mock.patch.object(
+                torchdynamo.config, "prefetch_resume_functions", True
+            )
+        )
+
+    def test_prefetch_resume_functions(self):
+        def fn(a, b):
+            x = a.sin() + b
+            unsupported(x, x)
+            y = x.cos() * 2
+            if y.sum() > 0:
+                return y + 1
+            return y - 1
+
+        a = torch.zeros(10)
+        b1 = torch.zeros(10)
+        b2 = torch.full((10,), 2.0)
+        cnt = CompileCounter()
+        opt_fn = torchdynamo.optimize(cnt)(fn)
+        self.assertTrue(same(opt_fn(a, b1), fn(a, b1)))
+        # the code after unsupported() and both branches of the if
+        self.assertEqual(counters["prefetch_resume"]["compiled"], 3)
+        BackgroundCompiler.wait()
+        self.assertEqual(cnt.frame_count, 4)
+
+        self.assertTrue(same(opt_fn(a, b2), fn(a, b2)))
+        self.assertEqual(cnt.frame_count, 4)
+
+    def test_unknown_result(self):
+        def fn(a):
+            x = unsupported(a, a + 1)
+            return x * 2
+
+        a = torch.randn(10)
+        cnt = CompileCounter()
+        opt_fn = torchdynamo.optimize(cnt)(fn)
+        self.assertTrue(same(opt_fn(a), fn(a)))
+        self.assertEqual(counters["prefetch_resume"]["unknown_args"], 1)
+        self.assertEqual(counters["prefetch_resume"]["compiled"], 0)
+        self.assertEqual(cnt.frame_count, 2)
+
+    def test_no_grad(self):
+        def fn(a):
+            x = a * 2
+            unsupported(x, x)
+            return x + 1
+
+        a = torch.randn(10, requires_grad=True)
+        cnt = CompileCounter()
+        opt_fn = torchdynamo.optimize(cnt)(fn)
+        with torch.no_grad():
+            self.assertTrue(same(opt_fn(a), fn(a)))
+        self.assertEqual(counters["prefetch_resume"]["compiled"], 1)
+        self.assertTrue(same(opt_fn(a), fn(a)))
+        # the grad mode guard of the prefetched resume function failed
+        self.assertEqual(cnt.frame_count, 4)
+
+    def test_only_resume_functions_in_background(self):
+        def fn(a):
+            x = a * 2
+            unsupported(x, x)
+            return x + 1
+
+        threads = []
+
+        def backend(gm, example_inputs):
+            threads.append(threading.current_thread())
+            return gm.forward
+
+        a = torch.randn(10)
+        opt_fn = torchdynamo.optimize(backend)(fn)
+        self.assertTrue(same(opt_fn(a), fn(a)))
+        self.assertEqual(counters["prefetch_resume"]["compiled"], 1)
+        BackgroundCompiler.wait()
+        # the frame itself compiles as usual, the resume function on the pool
+        self.assertEqual(len(threads), 2)
+        self.assertIs(threads[0], threading.current_thread())
+        self.assertIsNot(threads[1], threading.current_thread())
+
+    def test_example_bytes_limit(self):
+        def fn(a):
+            x = a * 2
+            unsupported(x, x)
+            return x + 1
+
+        a = torch.randn(10)
+        cnt = CompileCounter()
+        opt_fn = torchdynamo.optimize(cnt)(fn)
+        with unittest.mock.patch.object(
+            torchdynamo.config, "prefetch_resume_example_bytes", 8
+        ):
+            self.assertTrue(same(opt_fn(a), fn(a)))
+        self.assertEqual(counters["prefetch_resume"]["no_example"], 1)
+        self.assertEqual(counters["prefetch_resume"]["compiled"], 0)
+        self.assertEqual(cnt.frame_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,5 @@
 #!/usr/bin/env pytest
+import gc
 import unittest
 import weakref
 
@@ -7,6 +8,7 @@ import torch
 import torchdynamo
 import torchdynamo.config
 import torchdynamo.testing
+from torchdynamo.utils import counters
 
 
 class RecompileUxTests(torchdynamo.testing.TestCase):
@@ -101,6 +103,162 @@ class RecompileUxTests(torchdynamo.testing.TestCase):
             .startswith("torchdynamo hit config.cache_size_limit")
         )
 
+    def test_cache_entry_stats(self):
+        def model(input):
+            return input + 1
+
+        inputs = [torch.randn(n) for n in (2, 3, 4)]
+        with unittest.mock.patch.object(
+            torchdynamo.config, "cache_size_limit", len(inputs)
+        ):
+            opt_model = torchdynamo.optimize("eager")(model)
+            for x in inputs:
+                opt_model(x)
+            for _ in range(5):
+                opt_model(inputs[0])
+
+        stats = torchdynamo.cache_entry_stats(model.__code__)
+        # the hot entry is promoted ahead of the newer ones it used to follow
+        self.assertEqual([(h, m) for _, h, m in stats], [(5, 2), (0, 1), (0, 2)])
+
+    def test_lru_eviction(self):
+        def model(x, i):
+            return x + i
+
+        freed = []
+
+        def compiler(gm, example_inputs):
+            f = gm.forward
+            weakref.finalize(f, freed.append, len(compiled))
+            compiled.append(None)
+            return f
+
+        compiled = []
+        x = torch.randn(2)
+        opt_model = torchdynamo.optimize(compiler)(model)
+        with unittest.mock.patch.object(
+            torchdynamo.config, "cache_eviction_policy", "lru"
+        ), unittest.mock.patch.object(torchdynamo.config, "cache_size_limit", 2):
+            for i in (0, 1, 0, 2, 0, 1):
+                self.assertTrue(torchdynamo.testing.same(opt_model(x, i), x + i))
+
+        # 1 is evicted for 2, then 2 (not the hot 0) is evicted for 1 again
+        gc.collect()
+        self.assertEqual(len(compiled), 4)
+        self.assertEqual(sorted(freed), [1, 2])
+        self.assertEqual(len(torchdynamo.cache_entry_stats(model.__code__)), 2)
+        self.assertEqual(sum(counters["cache_eviction"].values()), 2)
+
+    def test_automatic_dynamic_shapes(self):
+        def model(x):
+            return x * 2
+
+        compile_counter = torchdynamo.testing.CompileCounter()
+        opt_model = torchdynamo.optimize(compile_counter)(model)
+        with unittest.mock.patch.object(
+            torchdynamo.config, "automatic_dynamic_shapes", True
+        ), unittest.mock.patch.object(torchdynamo.config, "cache_size_limit", 64):
+            for n in range(3, 10):
+                x = torch.randn(n, 4)
+                self.assertTrue(torchdynamo.testing.same(opt_model(x), model(x)))
+
+        # two static graphs, then one dynamic graph serves every other size
+        self.assertEqual(compile_counter.frame_count, 3)
+        self.assertEqual(
+            dict(torchdynamo.utils.size_guard_failures[model.__code__]),
+            {("x", 0): 2},
+        )
+        self.assertEqual(sum(counters["automatic_dynamic_shapes"].values()), 1)
+
+    def test_automatic_dynamic_shapes_promoted_once(self):
+        def model(x):
+            return x * 2
+
+        compiled = []
+
+        def backend(gm, example_inputs):
+            compiled.append((torchdynamo.config.dynamic_shapes, gm.dynamic_shapes))
+            return gm.forward
+
+        opt_model = torchdynamo.optimize(backend)(model)
+        with unittest.mock.patch.object(
+            torchdynamo.config, "automatic_dynamic_shapes", True
+        ), unittest.mock.patch.object(torchdynamo.config, "cache_size_limit", 64):
+            for n in range(3, 6):
+                opt_model(torch.randn(n, 4))
+            # recompiles for the dtype, still with dynamic shapes
+            opt_model(torch.randn(6, 4, dtype=torch.float64))
+
+        # the promotion is passed to the graph, config is left alone
+        self.assertEqual(
+            compiled, [(False, False), (False, False), (False, True), (False, True)]
+        )
+        self.assertEqual(sum(counters["automatic_dynamic_shapes"].values()), 1)
+
+    def test_automatic_dynamic_shapes_input_type_change(self):
+        def model(x, y):
+            if isinstance(y, torch.Tensor):
+                return x * y
+            return x * 2
+
+        compile_counter = torchdynamo.testing.CompileCounter()
+        opt_model = torchdynamo.optimize(compile_counter)(model)
+        with unittest.mock.patch.object(
+            torchdynamo.config, "automatic_dynamic_shapes", True
+        ):
+            x = torch.randn(3, 4)
+            opt_model(x, torch.randn(3, 4))
+            # x fails on size first, y is no longer a tensor
+            x = torch.randn(5, 4)
+            self.assertTrue(torchdynamo.testing.same(opt_model(x, None), x * 2))
+
+        self.assertEqual(compile_counter.frame_count, 2)
+
+    def test_lookup_stats(self):
+        def model(input):
+            return input + 1
+
+        a = torch.randn(2)
+        b = torch.randn(3)
+        with unittest.mock.patch.object(
+            torchdynamo.config, "lookup_profile_interval", 1
+        ), unittest.mock.patch.object(torchdynamo.config, "cache_size_limit", 2):
+            opt_model = torchdynamo.optimize("eager")(model)
+            for x in (a, b, a, b):
+                opt_model(x)
+
+        # the first call has no cache to look up
+        stats = torchdynamo.lookup_stats(model.__code__)
+        self.assertEqual(stats["lookups"], 3)
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+        self.assertEqual(stats["recompiles"], 1)
+        self.assertEqual(stats["sampled"], 3)
+        self.assertEqual(stats["sampled_runs"], 2)
+        self.assertIn("TorchDynamo cache lookups", torchdynamo.utils.compile_times())
+
+    def test_profile_lookups_not_overridden(self):
+        def model(input):
+            return input - 1
+
+        x = torch.randn(2)
+        opt_model = torchdynamo.optimize("eager")(model)
+        with torchdynamo.utils.profile_lookups():
+            for _ in range(3):
+                opt_model(x)
+        self.assertEqual(torchdynamo.lookup_stats(model.__code__)["sampled"], 2)
+
+    def test_compile_profiler_lookups(self):
+        def model(input):
+            return input * 2
+
+        prof = torchdynamo.utils.CompileProfiler()
+        opt_model = torchdynamo.optimize(prof)(model)
+        x = torch.randn(2)
+        for _ in range(3):
+            opt_model(x)
+        self.assertEqual(torchdynamo.lookup_stats(model.__code__)["hits"], 2)
+        self.assertIn("Guard us per lookup", prof.report())
+
     @unittest.skipIf(not torch.cuda.is_available(), "requires cuda")
     def test_nvfuser_guards(self):
         # we may want to model dynamo's guards sufficiently after nvfuser's ProfilingExecutor guards
@@ -0,0 +1,96 @@
+#!/usr/bin/env pytest
+import unittest
+
+import torch
+
+import torchdynamo
+import torchdynamo.testing
+from torchdynamo.testing import CompileCounter
+from torchdynamo.testing import same
+from torchdynamo.utils import counters
+
+
+class Block(torch.nn.Module):
+    def __init__(self, dim):
+        super().__init__()
+        self.linear = torch.nn.Linear(dim, dim)
+        self.norm = torch.nn.LayerNorm(dim)
+        self.scale = torch.nn.Parameter(torch.ones(dim))
+
+    def forward(self, x):
+        return x + self.norm(torch.relu(self.linear(x))) * self.scale
+
+
+class Model(torch.nn.Module):
+    def __init__(self, dims):
+        super().__init__()
+        self.embed = torch.nn.Linear(8, dims[0])
+        self.layers = torch.nn.ModuleList([Block(dim) for dim in dims])
+
+    def forward(self, x):
+        x = self.embed(x)
+        for layer in self.layers:
+            x = layer(x)
+        return x.sum(-1)
+
+
+class RepeatedLayersTests(torchdynamo.testing.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._exit_stack.enter_context(
+            unittest.mock.patch.object(torchdynamo.config, "repeated_layers", True)
+        )
+
+    def test_compile_layer_once(self):
+        model = Model([16] * 4)
+        x = torch.randn(2, 8)
+        cnt = CompileCounter()
+        opt_model = torchdynamo.optimize_assert(cnt)(model)
+        self.assertTrue(same(opt_model(x), model(x)))
+        self.assertEqual(counters["repeated_layers"]["layers"], 4)
+        self.assertEqual(counters["repeated_layers"]["blocks"], 1)
+        # the embedding, one block and the final sum
+        self.assertEqual(cnt.frame_count, 3)
+
+    def test_gradients(self):
+        model = Model([16] * 3)
+        x = torch.randn(2, 8)
+        model(x).sum().backward()
+        ref_grads = [p.grad.clone() for p in model.parameters()]
+        model.zero_grad()
+
+        opt_model = torchdynamo.optimize_assert("eager")(model)
+        opt_model(x).sum().backward()
+        for ref, param in zip(ref_grads, model.parameters()):
+            self.assertTrue(same(param.grad, ref))
+
+    def test_different_layers(self):
+        model = Model([16] * 3)
+        for layer in model.layers[1:]:
+            layer.norm.eps = 1e-3
+        x = torch.randn(2, 8)
+        opt_model = torchdynamo.optimize_assert("eager")(model)
+        self.assertTrue(same(opt_model(x), model(x)))
+        self.assertEqual(counters["repeated_layers"]["layers"], 3)
+        self.assertEqual(counters["repeated_layers"]["blocks"], 2)
+
+    def test_numbered_attributes_not_layers(self):
+        class Numbered(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.block_0 = Block(16)
+                self.block_1 = Block(16)
+
+            def forward(self, x):
+                return self.block_1(self.block_0(x))
+
+        model = Numbered()
+        x = torch.randn(2, 16)
+        opt_model = torchdynamo.optimize_assert("eager")(model)
+        self.assertTrue(same(opt_model(x), model(x)))
+        self.assertEqual(counters["repeated_layers"]["layers"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
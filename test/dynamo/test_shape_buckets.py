@@ -0,0 +1,85 @@
+#!/usr/bin/env pytest
+import unittest
+
+import torch
+
+import torchdynamo
+import torchdynamo.testing
+from torchdynamo.shape_buckets import ShapeBuckets
+from torchdynamo.shape_buckets import padding_waste
+from torchdynamo.testing import CompileCounter
+from torchdynamo.testing import same
+from torchdynamo.utils import counters
+
+
+class ShapeBucketsTests(torchdynamo.testing.TestCase):
+    @unittest.skipIf(torchdynamo.config.dynamic_shapes, "compiles once")
+    def test_compile_per_bucket(self):
+        def fn(x, mask):
+            return x * mask.unsqueeze(-1), x.sum(-1)
+
+        counter = CompileCounter()
+        opt_fn = torchdynamo.optimize(counter, shape_buckets={"x": 1, "mask": 1})(fn)
+        for n in range(1, 9):
+            x = torch.randn(2, n, 4)
+            mask = torch.ones(2, n)
+            self.assertTrue(same(opt_fn(x, mask), fn(x, mask)))
+        # buckets 1, 2, 4 and 8
+        self.assertEqual(counter.frame_count, 4)
+        self.assertEqual(counters["shape_buckets"]["calls"], 8)
+
+        # sizes 3, 5, 6 and 7 are padded by 1, 3, 2 and 1 rows
+        padding = (1 + 3 + 2 + 1) * 2 * (4 + 1)
+        self.assertEqual(counters["shape_buckets"]["padding"], padding)
+        elements = (1 + 2 + 4 + 4 + 8 + 8 + 8 + 8) * 2 * (4 + 1)
+        self.assertEqual(counters["shape_buckets"]["elements"], elements)
+        self.assertAlmostEqual(padding_waste(), padding / elements)
+
+    def test_buckets(self):
+        buckets = ShapeBuckets({"x": 0}, buckets=[8, 4])
+        self.assertEqual([buckets.bucket(n) for n in (1, 4, 5, 8, 9)], [4, 4, 8, 8, 9])
+        self.assertEqual(
+            [ShapeBuckets({}).bucket(n) for n in (0, 1, 2, 3, 5, 64, 65)],
+            [0, 1, 2, 4, 8, 64, 128],
+        )
+
+    def test_keyword_and_module(self):
+        class MyModule(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.linear = torch.nn.Linear(4, 4)
+
+            def forward(self, x, scale=None):
+                return self.linear(x) * scale
+
+        mod = MyModule()
+        opt_mod = torchdynamo.optimize(
+            "eager", shape_buckets=ShapeBuckets({"x": -2}, buckets=[16])
+        )(mod)
+        x = torch.randn(3, 4)
+        with torch.no_grad():
+            self.assertTrue(same(opt_mod(x, scale=2.0), mod(x, scale=2.0)))
+            self.assertEqual(opt_mod(x=x, scale=2.0).shape, (3, 4))
+        self.assertEqual(counters["shape_buckets"]["padding"], 2 * 13 * 4)
+
+    def test_unrelated_output_dim_not_narrowed(self):
+        w = torch.randn(4, 64)
+
+        def fn(x):
+            # [B, 64] logits, 64 is also the bucket of the padded seq_len
+            return x.sum(1) @ w, x * 2
+
+        x = torch.randn(64, 50, 4)
+        opt_fn = torchdynamo.optimize("eager", shape_buckets={"x": 1})(fn)
+        logits, y = opt_fn(x)
+        self.assertEqual(logits.shape, (64, 64))
+        self.assertTrue(same(y, x * 2))
+
+        opt_fn = torchdynamo.optimize(
+            "eager", shape_buckets=ShapeBuckets({"x": 1}, output_dims=[1])
+        )(lambda x: x.sum(-1))
+        self.assertEqual(opt_fn(x).shape, (64, 50))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env pytest
+import unittest
+
+import torch
+
+import torchdynamo
+import torchdynamo.testing
+from torchdynamo.testing import CompileCounter
+from torchdynamo.testing import make_test_cls_with_patches
+from torchdynamo.testing import same
+
+from . import test_functions
+from . import test_misc
+
+scale = 2
+
+
+def make_share_guards_cls(cls):
+    return make_test_cls_with_patches(
+        cls, "ShareGuards", "_share_guards", ("share_guards", True)
+    )
+
+
+ShareGuardsFunctionTests = make_share_guards_cls(test_functions.FunctionTests)
+ShareGuardsMiscTests = make_share_guards_cls(test_misc.MiscTests)
+
+
+class ShareGuardsTests(torchdynamo.testing.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._exit_stack.enter_context(
+            unittest.mock.patch.object(torchdynamo.config, "share_guards", True)
+        )
+
+    def test_shared_global_guards(self):
+        global scale
+
+        def fn(x, n):
+            return x * scale + n
+
+        x = torch.randn(4)
+        counter = CompileCounter()
+        opt_fn = torchdynamo.optimize(counter)(fn)
+        for n in (1, 2, 3, 1, 2, 3):
+            self.assertTrue(same(opt_fn(x, n), fn(x, n)))
+        self.assertEqual(counter.frame_count, 3)
+
+        shared_fn = torchdynamo.guards.shared_check_fns[fn.__code__]
+        self.assertIn("scale == 2", shared_fn.code_parts)
+
+        try:
+            scale = 3
+            for n in (1, 2):
+                self.assertTrue(same(opt_fn(x, n), fn(x, n)))
+            self.assertEqual(counter.frame_count, 5)
+        finally:
+            scale = 2
+        self.assertTrue(same(opt_fn(x, 3), fn(x, 3)))
+        self.assertEqual(counter.frame_count, 5)
+
+    def test_grad_mode(self):
+        def fn(x):
+            return x + 1
+
+        x = torch.randn(4)
+        counter = CompileCounter()
+        opt_fn = torchdynamo.optimize(counter)(fn)
+        opt_fn(x)
+        with torch.no_grad():
+            opt_fn(x)
+            opt_fn(x)
+        opt_fn(x)
+        self.assertEqual(counter.frame_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env pytest
+import os
+import shutil
+import tempfile
+import unittest
+
+import torch
+
+import torchdynamo
+import torchdynamo.testing
+from torchdynamo import allowed_functions
+from torchdynamo import skipfiles
+from torchdynamo import startup_cache
+
+
+class StartupCacheTests(torchdynamo.testing.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.cache_dir = tempfile.mkdtemp()
+        cls._exit_stack.callback(shutil.rmtree, cls.cache_dir)
+        cls._exit_stack.enter_context(
+            unittest.mock.patch.object(torchdynamo.config, "startup_cache", True)
+        )
+        cls._exit_stack.enter_context(
+            unittest.mock.patch.object(
+                torchdynamo.config, "startup_cache_dir", cls.cache_dir
+            )
+        )
+
+    def test_lookup_torch_objects(self):
+        expected, index = allowed_functions._find_torch_objects()
+        self.assertEqual(allowed_functions._lookup_torch_objects(index), expected)
+        stale = index + [(("torch", "no_such_function"), "torch.no_such_function")]
+        self.assertIsNone(allowed_functions._lookup_torch_objects(stale))
+
+    def test_allowed_function_ids(self):
+        ids = allowed_functions._allowed_function_ids
+        for _ in range(2):
+            with unittest.mock.patch.object(
+                ids, "function_ids", None
+            ), unittest.mock.patch.object(ids, "function_names", None):
+                self.assertIn(id(torch.add), ids)
+                self.assertNotIn(id(torch.set_rng_state), ids)
+                self.assertEqual(
+                    ids.get_name(id(torch.nn.functional.relu), None),
+                    "torch.nn.functional.relu",
+                )
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.cache_dir, "allowed_functions"))), 1
+        )
+
+    def test_skipfiles(self):
+        dirs = skipfiles._third_party_dirs()
+        self.assertEqual(skipfiles._third_party_dirs(), dirs)
+        self.assertEqual(len(os.listdir(os.path.join(self.cache_dir, "skipfiles"))), 1)
+
+    def test_no_key_when_disabled(self):
+        def key_fn():
+            raise AssertionError("built a key with the startup cache off")
+
+        with unittest.mock.patch.object(torchdynamo.config, "startup_cache", False):
+            self.assertIsNone(startup_cache.key(key_fn))
+            with unittest.mock.patch.object(
+                skipfiles, "_search_path_key", key_fn
+            ), unittest.mock.patch.object(
+                allowed_functions, "_torch_index_key", key_fn
+            ):
+                skipfiles._third_party_dirs()
+                ids = allowed_functions._allowed_function_ids
+                with unittest.mock.patch.object(
+                    ids, "function_ids", None
+                ), unittest.mock.patch.object(ids, "function_names", None):
+                    self.assertIn(id(torch.add), ids)
+
+
+if __name__ == "__main__":
+    unittest.main()
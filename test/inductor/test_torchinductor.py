@@ -3,8 +3,10 @@ import contextlib
 import dataclasses
 import functools
 import importlib
+import os
 import random
 import sys
+import tempfile
 import unittest
 from unittest.mock import patch
 
@@ -3680,6 +3682,191 @@ if HAS_CPU:
         def test_timed_cpu_only(self):
             timed(lambda: torch.randn(10), ())
 
+        @patch.object(config, "persistent_cache", True)
+        def test_persistent_cache(self):
+            from torchinductor.codecache import PyCodeCache
+
+            def fn(x, y):
+                return (x * 2 + y,)
+
+            x = torch.randn(8)
+            y = torch.randn(8)
+            fn_fx = make_fx(fn)(x, y)
+            counters = torchdynamo.utils.counters["inductor"]
+            with tempfile.TemporaryDirectory() as cache_dir:
+                with patch("torchinductor.codecache.cache_dir", lambda: cache_dir):
+                    counters.clear()
+                    cold = compile_fx_inner(fn_fx, [x, y])
+                    # as if in a new process
+                    PyCodeCache.clear()
+                    warm = compile_fx_inner(fn_fx, [x, y])
+                    # different strides
+                    compile_fx_inner(fn_fx, [x, torch.randn(16)[::2]])
+            self.assertEqual(counters["fxgraph_cache_miss"], 2)
+            self.assertEqual(counters["fxgraph_cache_hit"], 1)
+            assert same(cold(x, y), fn(x, y))
+            assert same(warm(x, y), fn(x, y))
+
+        def test_persistent_cache_key(self):
+            from torchinductor.codecache import FxGraphCache
+
+            class AddConstant(torch.nn.Module):
+                def __init__(self, n):
+                    super().__init__()
+                    self.register_buffer("c", torch.randn(n))
+
+                def forward(self, x):
+                    return (x + self.c,)
+
+            x = torch.randn(8)
+            small = torch.fx.symbolic_trace(AddConstant(8))
+            key = FxGraphCache.key(small, [x])
+            # execution only settings don't invalidate entries
+            with patch.object(config, "compile_threads", config.compile_threads + 1):
+                self.assertEqual(FxGraphCache.key(small, [x]), key)
+            small.c.add_(1)
+            self.assertNotEqual(FxGraphCache.key(small, [x]), key)
+
+            n = config.persistent_cache_max_constant_bytes
+            large = torch.fx.symbolic_trace(AddConstant(n))
+            self.assertIsNone(FxGraphCache.key(large, [torch.randn(n)]))
+
+        def test_cpp_compile_same_source_in_threads(self):
+            from concurrent.futures import ThreadPoolExecutor
+
+            from torchinductor.codecache import CppCodeCache
+
+            # a source no earlier run has compiled
+            source = (
+                f"// {os.urandom(8).hex()}\n" 'extern "C" int answer() { return 42; }\n'
+            )
+            with ThreadPoolExecutor(8) as pool:
+                libs = list(pool.map(lambda _: CppCodeCache.load(source), range(8)))
+            self.assertEqual({lib.answer() for lib in libs}, {42})
+
+        @patch.object(config.cpp, "vectorize", True)
+        def test_cpp_vectorize(self):
+            if not torchinductor.codecache.vec_isa_flags():
+                raise unittest.SkipTest("requires AVX2 or AVX512")
+
+            def fn(x, y):
+                a = torch.relu(x * y + 1) / (y.abs() + 2)
+                return (a, a.sum(-1), x.amax(-1), x[:, :5].to(torch.int32) + 1)
+
+            # 37 leaves a tail after the vector loop
+            x = torch.randn(10, 37)
+            y = torch.randn(10, 37)
+            fn_fx = make_fx(fn)(x, y)
+            torchinductor.metrics.reset()
+            compiled = compile_fx_inner(fn_fx, [x, y])
+            assert same(compiled(x, y), fn(x, y))
+            # the int32 kernel stays scalar
+            self.assertGreater(torchinductor.metrics.cpp_vectorized_kernel_count, 0)
+            self.assertLess(
+                torchinductor.metrics.cpp_vectorized_kernel_count,
+                torchinductor.metrics.generated_kernel_count,
+            )
+
+        @patch.object(config.cpp, "tiling", True)
+        def test_cpp_tiling(self):
+            def transpose(x, y):
+                return (x.t() + y,)
+
+            def column_reductions(x, y):
+                return (x.sum(0), (x + 1).amax(0))
+
+            # sizes that don't divide into tiles
+            x = torch.randn(300, 200)
+            y = torch.randn(200, 300)
+            for fn in (transpose, column_reductions):
+                fn_fx = make_fx(fn)(x, y)
+                torchinductor.metrics.reset()
+                compiled = compile_fx_inner(fn_fx, [x, y])
+                assert same(compiled(x, y), fn(x, y))
+                self.assertEqual(torchinductor.metrics.cpp_tiled_kernel_count, 1)
+
+        @patch.object(config.cpp, "single_module", True)
+        def test_cpp_single_module(self):
+            def fn(x, y):
+                # the mm splits this into two kernels
+                return (torch.relu((x + 1) @ y) * 2,)
+
+            x = torch.randn(8, 8)
+            y = torch.randn(8, 8)
+            fn_fx = make_fx(fn)(x, y)
+            CppCodeCache.clear()
+            compiled = compile_fx_inner(fn_fx, [x, y])
+            assert same(compiled(x, y), fn(x, y))
+            self.assertEqual(len(CppCodeCache.cache), 1)
+
+        @patch.object(config.cpp, "precompiled_header", True)
+        def test_cpp_precompiled_header(self):
+            from torchinductor.codegen.cpp import cpp_prefix_path
+
+            if not torchinductor.codecache.is_gcc():
+                raise unittest.SkipTest("requires g++")
+
+            def fn(x, y):
+                return (x * 2 + y,)
+
+            x = torch.randn(8)
+            y = torch.randn(8)
+            fn_fx = make_fx(fn)(x, y)
+            compiled = compile_fx_inner(fn_fx, [x, y])
+            assert same(compiled(x, y), fn(x, y))
+            self.assertGreater(len(os.listdir(f"{cpp_prefix_path()}.gch")), 0)
+
+        @patch.object(config.cpp, "precompiled_header", True)
+        @patch.object(config.cpp, "wrapper", True)
+        def test_cpp_wrapper_precompiled_header(self):
+            from torchinductor.codecache import code_hash
+            from torchinductor.codecache import cpp_compile_command
+            from torchinductor.codegen.cpp import cpp_prefix_path
+
+            if not torchinductor.codecache.is_gcc():
+                raise unittest.SkipTest("requires g++")
+
+            def fn(x, y):
+                return (x * 3 + y,)
+
+            x = torch.randn(8)
+            y = torch.randn(8)
+            fn_fx = make_fx(fn)(x, y)
+            compiled = compile_fx_inner(fn_fx, [x, y])
+            assert same(compiled(x, y), fn(x, y))
+            cmd = cpp_compile_command("i", "o", include_pytorch=True, header=True)
+            key = code_hash(torch.__version__ + cmd)
+            self.assertTrue(
+                os.path.exists(os.path.join(f"{cpp_prefix_path()}.gch", f"{key}.gch"))
+            )
+
+        @patch.object(config.cpp, "wrapper", True)
+        def test_cpp_wrapper(self):
+            from torchinductor.codecache import CppWrapperCodeCache
+
+            def fn(x, y):
+                # two C++ kernels and an aten.mm.out call
+                return (torch.relu((x + 1) @ y) * 2, x.t())
+
+            x = torch.randn(8, 8)
+            y = torch.randn(8, 8)
+            fn_fx = make_fx(fn)(x, y)
+            CppCodeCache.clear()
+            CppWrapperCodeCache.clear()
+            compiled = compile_fx_inner(fn_fx, [x, y])
+            assert same(compiled(x, y), fn(x, y))
+            self.assertEqual(len(CppWrapperCodeCache.cache), 1)
+            self.assertEqual(len(CppCodeCache.cache), 0)
+
+        @patch.object(config.cpp, "wrapper", True)
+        def test_cpp_wrapper_nonfinite_scalar(self):
+            def fn(z, x, y):
+                return (torch.addmm(z, x, y, alpha=float("inf")),)
+
+            args = [torch.rand(8, 8) for _ in range(3)]
+            compiled = compile_fx_inner(make_fx(fn)(*args), args)
+            torch.testing.assert_close(compiled(*args), fn(*args), equal_nan=True)
+
 
 if HAS_CUDA:
 
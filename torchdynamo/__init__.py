@@ -1,23 +1,31 @@
 from . import allowed_functions
 from . import convert_frame
 from . import eval_frame
+from . import guards
 from . import resume_execution
 from .convert_frame import replay
 from .eval_frame import assume_constant_result
+from .eval_frame import cache_entry_stats
 from .eval_frame import disable
 from .eval_frame import explain
 from .eval_frame import export
+from .eval_frame import lookup_stats
 from .eval_frame import optimize
 from .eval_frame import optimize_assert
 from .eval_frame import reset_code
 from .eval_frame import run
 from .eval_frame import skip
+from .shape_buckets import ShapeBuckets
 from .utils import compilation_metrics
+from .utils import dynamic_shape_codes
 from .utils import guard_failures
 from .utils import orig_code_map
+from .utils import size_guard_failures
 
 __all__ = [
     "assume_constant_result",
+    "cache_entry_stats",
+    "lookup_stats",
     "optimize",
     "optimize_assert",
     "export",
@@ -28,6 +36,7 @@ __all__ = [
     "reset",
     "list_backends",
     "skip",
+    "ShapeBuckets",
 ]
 
 
@@ -37,10 +46,20 @@ def reset():
         code = weak_code()
         if code:
             reset_code(code)
+    for weak_code in eval_frame.prefiltered_code_objects:
+        code = weak_code()
+        if code:
+            reset_code(code)
     convert_frame.input_codes.clear()
+    eval_frame.prefiltered_code_objects.clear()
+    convert_frame.update_frame_prefilter()
     convert_frame.output_codes.clear()
     orig_code_map.clear()
     guard_failures.clear()
+    size_guard_failures.clear()
+    dynamic_shape_codes.clear()
+    guards.dispatch_key_fns.clear()
+    guards.shared_check_fns.clear()
     resume_execution.ContinueExecutionCache.cache.clear()
     eval_frame.most_recent_backend = None
     compilation_metrics.clear()
@@ -2,6 +2,7 @@
 #include <Python.h>
 #include <frameobject.h>
 #include <pystate.h>
+#include <stddef.h>
 
 // see https://bugs.python.org/issue35886
 #if PY_VERSION_HEX >= 0x03080000
@@ -55,6 +56,27 @@ static PyObject *noargs = NULL;     /* cached empty tuple */
 static PyObject *dotzerokey = NULL; /* ".0" */
 static PyObject *guard_fail_hook = NULL;
 static PyObject *guard_error_hook = NULL;
+// {filename: bool} of skipfiles.check(), code objects of files it maps to
+// True are skipped the first time they run without calling the callback
+static PyObject *skip_files = NULL;
+
+// What has_tensor_in_frame() needs to reject new frames in C, see
+// set_frame_prefilter.  Disabled while allowed_ids is NULL.
+typedef struct {
+  PyObject *allowed_ids;     // set of id() of allowed_functions.is_allowed objs
+  PyObject *allowed_types;   // tuple, instances of these are allowed too
+  PyObject *tensor_types;    // tuple, (torch.Tensor, torch.nn.Module)
+  PyObject *always_optimize; // dict keyed by id() of always optimized code
+  PyObject *skipped;         // list, weakrefs to the code objects rejected
+  unsigned long checked;
+  unsigned long filtered;
+} FramePrefilter;
+static FramePrefilter prefilter = {NULL, NULL, NULL, NULL, NULL, 0, 0};
+
+// Containers are looked into this many levels deep, and only up to this many
+// items, past that a frame is assumed to have a tensor
+#define PREFILTER_DEPTH 2
+#define PREFILTER_MAX_ITEMS 32
 
 size_t extra_index = -1;
 
@@ -73,7 +95,6 @@ inline static void eval_frame_callback_set(PyObject *obj) {
   PyThread_tss_set(&eval_frame_callback_key, obj);
 }
 
-static void ignored(void *obj) {}
 static PyObject *_custom_eval_frame_shim(PyThreadState *tstate,
                                          PyFrameObject *frame, int throw_flag);
 static PyObject *_custom_eval_frame(PyThreadState *tstate, PyFrameObject *frame,
@@ -147,11 +168,85 @@ typedef struct cache_entry {
   PyObject *check_fn;
   // modified user bytecode (protected by check_fn's guards)
   PyCodeObject *code;
+  // hash of the dispatch key of the locals this entry was compiled for
+  Py_hash_t dispatch_key;
+  // true if this entry lives in a dispatch bucket rather than the wildcards
+  bool indexed;
+  // lambda: <locals of user function>: bool, guards this entry has in common
+  // with other entries of the same code object which check_fn relies on
+  // having passed, or NULL
+  PyObject *shared_check_fn;
+  // number of lookups where check_fn passed / failed
+  unsigned long hits;
+  unsigned long misses;
+  // value of lookup_clock when check_fn last passed (or at creation), the
+  // entry with the smallest one is evicted first
+  unsigned long last_hit;
   // on a cache miss, linked list of next thing to try
   struct cache_entry *next;
+  // next entry in the same dispatch bucket (or in the wildcards list)
+  struct cache_entry *bucket_next;
 } CacheEntry;
 
-static CacheEntry *create_cache_entry(CacheEntry *next,
+// Bumped on every cache hit to order entries by recency
+static unsigned long lookup_clock = 0;
+
+// Number of times check_cache_entry() has run
+static unsigned long entries_checked = 0;
+
+// When nonzero count the lookups of every code object and time one in this
+// many (and the compiled code it selects), see set_lookup_profile_interval
+static long lookup_profile_interval = 0;
+static long lookup_profile_countdown = 0;
+
+// Per code object counters, see lookup_stats
+typedef struct {
+  unsigned long lookups;
+  unsigned long entries_checked;
+  unsigned long hits;
+  unsigned long misses;
+  unsigned long recompiles;
+  // lookups (and the calls of compiled code they selected) that were timed
+  unsigned long sampled;
+  unsigned long sampled_runs;
+  unsigned long long guard_ns;
+  unsigned long long run_ns;
+} LookupStats;
+
+// Must be a power of 2
+#define DISPATCH_BUCKETS 32
+
+typedef struct {
+  // all entries of this code object, most recently created first
+  CacheEntry *cache_entry;
+  // lambda: <locals of user function>: key, shared by all indexed entries
+  PyObject *dispatch_key_fn;
+  // indexed entries, chained through bucket_next
+  CacheEntry *buckets[DISPATCH_BUCKETS];
+  // entries without a dispatch key, checked on every lookup
+  CacheEntry *wildcards;
+  LookupStats stats;
+} ExtraState;
+
+// The shared_check_fn last run in a lookup and its result, so entries with
+// the same one (normally all of them) don't check those guards again
+typedef struct {
+  PyObject *fn;
+  bool passed;
+} SharedResult;
+
+static ExtraState *create_extra_state(void) {
+  ExtraState *state = (ExtraState *)calloc(1, sizeof(ExtraState));
+  NULL_CHECK(state);
+  return state;
+}
+
+inline static CacheEntry **dispatch_bucket(ExtraState *state,
+                                           Py_hash_t dispatch_key) {
+  return &state->buckets[(size_t)dispatch_key & (DISPATCH_BUCKETS - 1)];
+}
+
+static CacheEntry *create_cache_entry(ExtraState *state,
                                       PyObject *guarded_code) {
   CacheEntry *e = (CacheEntry *)malloc(sizeof(CacheEntry));
   DEBUG_NULL_CHECK(e);
@@ -159,20 +254,97 @@ static CacheEntry *create_cache_entry(CacheEntry *next,
   NULL_CHECK(e->check_fn);
   e->code = (PyCodeObject *)PyObject_GetAttrString(guarded_code, "code");
   NULL_CHECK(e->code);
-  e->next = next;
+  e->dispatch_key = 0;
+  e->indexed = false;
+  e->hits = 0;
+  e->misses = 0;
+  e->last_hit = ++lookup_clock;
+
+  PyObject *key_fn = PyObject_GetAttrString(guarded_code, "dispatch_key_fn");
+  NULL_CHECK(key_fn);
+  PyObject *key = PyObject_GetAttrString(guarded_code, "dispatch_key");
+  NULL_CHECK(key);
+  if (key_fn != Py_None && state->dispatch_key_fn == NULL) {
+    Py_INCREF(key_fn);
+    state->dispatch_key_fn = key_fn;
+  }
+  // Only keys produced by the key function shared by this code object can be
+  // compared, anything else must be checked on every lookup
+  if (key != Py_None && key_fn == state->dispatch_key_fn) {
+    e->dispatch_key = PyObject_Hash(key);
+    CHECK(!(e->dispatch_key == -1 && PyErr_Occurred()));
+    e->indexed = true;
+  }
+  Py_DECREF(key);
+  Py_DECREF(key_fn);
+
+  e->shared_check_fn = PyObject_GetAttrString(guarded_code, "shared_check_fn");
+  NULL_CHECK(e->shared_check_fn);
+  if (e->shared_check_fn == Py_None) {
+    Py_CLEAR(e->shared_check_fn);
+  }
+
+  CacheEntry **chain = e->indexed ? dispatch_bucket(state, e->dispatch_key)
+                                  : &state->wildcards;
+  e->bucket_next = *chain;
+  *chain = e;
+  e->next = state->cache_entry;
+  state->cache_entry = e;
   return e;
 }
 
-static void destroy_cache_entry(CacheEntry *e) {
-  if (e == NULL || e == SKIP_CODE) {
-    return;
-  }
+static void free_cache_entry(CacheEntry *e) {
   Py_XDECREF(e->check_fn);
   Py_XDECREF(e->code);
-  destroy_cache_entry(e->next);
+  Py_XDECREF(e->shared_check_fn);
   free(e);
 }
 
+static void destroy_cache_entry(CacheEntry *e) {
+  while (e != NULL) {
+    CacheEntry *next = e->next;
+    free_cache_entry(e);
+    e = next;
+  }
+}
+
+static void evict_lru_cache_entry(ExtraState *state) {
+  // Unlink the least recently hit entry from both the list of all entries and
+  // its dispatch chain, then free it
+  CacheEntry **lru = &state->cache_entry;
+  for (CacheEntry **link = lru; *link != NULL; link = &(*link)->next) {
+    if ((*link)->last_hit < (*lru)->last_hit) {
+      lru = link;
+    }
+  }
+  CacheEntry *e = *lru;
+  *lru = e->next;
+  CacheEntry **chain = e->indexed ? dispatch_bucket(state, e->dispatch_key)
+                                  : &state->wildcards;
+  while (*chain != e) {
+    chain = &(*chain)->bucket_next;
+  }
+  *chain = e->bucket_next;
+  free_cache_entry(e);
+}
+
+static void destroy_extra_state(ExtraState *state) {
+  if (state == NULL || state == SKIP_CODE) {
+    return;
+  }
+  destroy_cache_entry(state->cache_entry);
+  Py_XDECREF(state->dispatch_key_fn);
+  free(state);
+}
+
+// Called when a code object dies or set_extra() replaces its state, frees its
+// cache entries (and so the compiled code and guards) right away.  Anything
+// that calls back into Python may end up here, so a state fetched before such
+// a call must be fetched again with get_extra() afterwards.
+static void free_extra_state(void *obj) {
+  destroy_extra_state((ExtraState *)obj);
+}
+
 #ifdef TORCHDYNAMO_DEBUG
 inline static const char *name(PyFrameObject *frame) {
   DEBUG_CHECK(PyUnicode_Check(frame->f_code->co_name));
@@ -181,10 +353,10 @@ inline static const char *name(PyFrameObject *frame) {
 #endif
 
 static void call_guard_fail_hook(PyObject *hook, CacheEntry *e,
-                                 PyObject *f_locals) {
+                                 PyObject *f_locals, bool last) {
   // call debugging logic when a guard fails
   PyObject *args = PyTuple_Pack(4, e->check_fn, e->code, f_locals,
-                                (e->next == NULL ? Py_True : Py_False));
+                                (last ? Py_True : Py_False));
   NULL_CHECK(args);
   PyObject *result = PyObject_CallObject(hook, args);
   NULL_CHECK(result);
@@ -192,53 +364,203 @@ static void call_guard_fail_hook(PyObject *hook, CacheEntry *e,
   Py_DECREF(args);
 }
 
-static PyCodeObject *lookup(CacheEntry *e, PyObject *f_locals) {
-  if (e == NULL) {
-    return NULL;
-  }
+static PyObject *call_guard_fn(PyObject *fn, PyObject *f_locals) {
   PyObject *dotzero = PyDict_GetItem(f_locals, dotzerokey);
-  PyObject *valid = NULL;
+  PyObject *result = NULL;
   if (unlikely(dotzero != NULL)) {
     // .0 is a special variable name used for implicit args
     PyObject *args = PyTuple_Pack(1, dotzero);
     NULL_CHECK(args);
-    valid = PyObject_Call(e->check_fn, args, f_locals);
+    result = PyObject_Call(fn, args, f_locals);
     Py_DECREF(args);
   } else {
-    valid = PyObject_Call(e->check_fn, noargs, f_locals);
+    result = PyObject_Call(fn, noargs, f_locals);
   }
+  return result;
+}
+
+static bool call_check_fn(PyObject *fn, CacheEntry *e, PyObject *f_locals) {
+  PyObject *valid = call_guard_fn(fn, f_locals);
   if (unlikely(valid == NULL)) {
     PyErr_Print();
     if (guard_error_hook != NULL) {
-      call_guard_fail_hook(guard_error_hook, e, f_locals);
+      call_guard_fail_hook(guard_error_hook, e, f_locals, false);
     }
     NULL_CHECK(valid);
   }
   Py_DECREF(valid);
-  if (valid == Py_True) {
-    return e->code;
+  return valid == Py_True;
+}
+
+static bool check_cache_entry(CacheEntry *e, PyObject *f_locals,
+                              SharedResult *shared) {
+  entries_checked++;
+  if (e->shared_check_fn != NULL && e->shared_check_fn != shared->fn) {
+    shared->fn = e->shared_check_fn;
+    shared->passed = call_check_fn(e->shared_check_fn, e, f_locals);
+  }
+  if ((e->shared_check_fn == NULL || shared->passed) &&
+      call_check_fn(e->check_fn, e, f_locals)) {
+    e->hits++;
+    e->last_hit = ++lookup_clock;
+    return true;
+  }
+  e->misses++;
+  return false;
+}
+
+// Entries are chained through either `next` or `bucket_next`
+inline static CacheEntry **link_of(CacheEntry *e, size_t link) {
+  return (CacheEntry **)((char *)e + link);
+}
+
+static void promote(CacheEntry **head, CacheEntry **link, size_t offset) {
+  // Move the entry at *link ahead of every entry with fewer hits, keeping the
+  // chain ordered by hit count so the variants serving most calls are checked
+  // first.  Unlike move-to-front this does not thrash when callers alternate.
+  CacheEntry *e = *link;
+  CacheEntry **dest = head;
+  while (*dest != e && (*dest)->hits >= e->hits) {
+    dest = link_of(*dest, offset);
   }
-  if (unlikely(guard_fail_hook != NULL)) {
-    call_guard_fail_hook(guard_fail_hook, e, f_locals);
+  if (*dest != e) {
+    *link = *link_of(e, offset);
+    *link_of(e, offset) = *dest;
+    *dest = e;
   }
-  return lookup(e->next, f_locals);
 }
 
-static long cache_size(CacheEntry *e) {
-  if (e == NULL) {
-    return 0;
+static PyCodeObject *lookup_linear(ExtraState *state, PyObject *f_locals,
+                                   SharedResult *shared) {
+  for (CacheEntry **link = &state->cache_entry; *link != NULL;
+       link = &(*link)->next) {
+    CacheEntry *e = *link;
+    if (check_cache_entry(e, f_locals, shared)) {
+      promote(&state->cache_entry, link, offsetof(CacheEntry, next));
+      return e->code;
+    }
+    if (unlikely(guard_fail_hook != NULL)) {
+      call_guard_fail_hook(guard_fail_hook, e, f_locals, e->next == NULL);
+    }
+  }
+  return NULL;
+}
+
+static PyCodeObject *lookup_chain(CacheEntry **head, PyObject *f_locals,
+                                  SharedResult *shared, bool match_key,
+                                  Py_hash_t dispatch_key) {
+  for (CacheEntry **link = head; *link != NULL; link = &(*link)->bucket_next) {
+    CacheEntry *e = *link;
+    if ((!match_key || e->dispatch_key == dispatch_key) &&
+        check_cache_entry(e, f_locals, shared)) {
+      promote(head, link, offsetof(CacheEntry, bucket_next));
+      return e->code;
+    }
   }
-  return 1 + cache_size(e->next);
+  return NULL;
 }
 
-inline static CacheEntry *get_extra(PyCodeObject *code) {
-  CacheEntry *extra = NULL;
+static PyCodeObject *lookup_dispatch(ExtraState *state, PyObject *f_locals,
+                                     SharedResult *shared) {
+  PyObject *key = call_guard_fn(state->dispatch_key_fn, f_locals);
+  Py_hash_t dispatch_key = key == NULL ? -1 : PyObject_Hash(key);
+  Py_XDECREF(key);
+  if (unlikely(dispatch_key == -1 && PyErr_Occurred())) {
+    // the key function is only an accelerator, checking every entry is
+    // always correct
+    PyErr_Clear();
+    return lookup_linear(state, f_locals, shared);
+  }
+  // Only entries whose key matches (plus any hash collisions in the same
+  // bucket) or that have no key at all can possibly pass their guards
+  PyCodeObject *code = lookup_chain(dispatch_bucket(state, dispatch_key),
+                                    f_locals, shared, true, dispatch_key);
+  if (code == NULL) {
+    code = lookup_chain(&state->wildcards, f_locals, shared, false, 0);
+  }
+  if (code == NULL && unlikely(guard_fail_hook != NULL)) {
+    // Every entry is known to fail here: either it was checked above or its
+    // guards imply a different key
+    call_guard_fail_hook(guard_fail_hook, state->cache_entry, f_locals, true);
+  }
+  return code;
+}
+
+static PyCodeObject *lookup_entries(ExtraState *state, PyObject *f_locals) {
+  // Entries mostly differ in their guards on locals, the guards on globals
+  // they have in common are only checked by the first entry that needs them
+  SharedResult shared = {NULL, false};
+  if (state->dispatch_key_fn != NULL) {
+    return lookup_dispatch(state, f_locals, &shared);
+  }
+  return lookup_linear(state, f_locals, &shared);
+}
+
+inline static ExtraState *get_extra(PyCodeObject *code);
+
+static PyCodeObject *lookup_profiled(ExtraState *state, PyFrameObject *frame,
+                                     bool *sampled) {
+  unsigned long checked = entries_checked;
+  _PyTime_t start = 0;
+  if (--lookup_profile_countdown <= 0) {
+    lookup_profile_countdown = lookup_profile_interval;
+    *sampled = true;
+    start = _PyTime_GetPerfCounter();
+  }
+  PyCodeObject *code = lookup_entries(state, frame->f_locals);
+  // the guards may have reset the cache
+  state = get_extra(frame->f_code);
+  if (state == NULL || state == SKIP_CODE) {
+    return code;
+  }
+  LookupStats *stats = &state->stats;
+  if (*sampled) {
+    stats->guard_ns += _PyTime_GetPerfCounter() - start;
+    stats->sampled++;
+  }
+  stats->lookups++;
+  stats->entries_checked += entries_checked - checked;
+  if (code != NULL) {
+    stats->hits++;
+  } else {
+    stats->misses++;
+  }
+  return code;
+}
+
+static PyCodeObject *lookup(ExtraState *state, PyFrameObject *frame,
+                            bool *sampled) {
+  // *sampled is set if this lookup was timed, the caller should time the
+  // code it returns too
+  *sampled = false;
+  if (state == NULL || state->cache_entry == NULL) {
+    return NULL;
+  }
+  if (unlikely(lookup_profile_interval != 0)) {
+    return lookup_profiled(state, frame, sampled);
+  }
+  return lookup_entries(state, frame->f_locals);
+}
+
+static long cache_size(ExtraState *state) {
+  long size = 0;
+  if (state != NULL && state != SKIP_CODE) {
+    for (CacheEntry *e = state->cache_entry; e != NULL; e = e->next) {
+      size++;
+    }
+  }
+  return size;
+}
+
+inline static ExtraState *get_extra(PyCodeObject *code) {
+  ExtraState *extra = NULL;
   _PyCode_GetExtra((PyObject *)code, extra_index, (void *)&extra);
   return extra;
 }
 
-inline static void set_extra(PyCodeObject *code, CacheEntry *extra) {
+inline static void set_extra(PyCodeObject *code, ExtraState *extra) {
   // TODO(jansel): would it be faster to bypass this?
+  // Also calls free_extra_state() on the state being replaced
   _PyCode_SetExtra((PyObject *)code, extra_index, extra);
 }
 
@@ -285,6 +607,140 @@ inline static PyObject *eval_custom_code(PyThreadState *tstate,
   return result;
 }
 
+static PyObject *eval_custom_code_sampled(PyThreadState *tstate,
+                                          PyFrameObject *frame,
+                                          PyCodeObject *code, int throw_flag) {
+  _PyTime_t start = _PyTime_GetPerfCounter();
+  PyObject *result = eval_custom_code(tstate, frame, code, throw_flag);
+  // the code we ran may have reset the cache
+  ExtraState *extra = get_extra(frame->f_code);
+  if (extra != NULL && extra != SKIP_CODE) {
+    extra->stats.run_ns += _PyTime_GetPerfCounter() - start;
+    extra->stats.sampled_runs++;
+  }
+  return result;
+}
+
+// id(obj) in ids, errors count as found
+static bool id_in(PyObject *ids, PyObject *obj) {
+  PyObject *key = PyLong_FromVoidPtr(obj);
+  if (key == NULL) {
+    PyErr_Clear();
+    return true;
+  }
+  int result = PySet_Check(ids) ? PySet_Contains(ids, key)
+                                 : PyDict_Contains(ids, key);
+  Py_DECREF(key);
+  if (result < 0) {
+    PyErr_Clear();
+  }
+  return result != 0;
+}
+
+// isinstance(obj, types), errors count as true
+static bool is_instance(PyObject *obj, PyObject *types) {
+  int result = PyObject_IsInstance(obj, types);
+  if (result < 0) {
+    PyErr_Clear();
+  }
+  return result != 0;
+}
+
+// False only if has_tensor_in_frame()'s has_tensor(obj) is certainly False
+static bool may_have_tensor(PyObject *obj, int depth) {
+  if (obj == NULL || obj == Py_None || PyBool_Check(obj) ||
+      PyLong_CheckExact(obj) || PyFloat_CheckExact(obj) ||
+      PyUnicode_CheckExact(obj)) {
+    return false;
+  }
+  if (depth == 0) {
+    return true;
+  }
+  if (PyList_CheckExact(obj) || PyTuple_CheckExact(obj)) {
+    Py_ssize_t size = PySequence_Fast_GET_SIZE(obj);
+    if (size > PREFILTER_MAX_ITEMS) {
+      return true;
+    }
+    PyObject **items = PySequence_Fast_ITEMS(obj);
+    for (Py_ssize_t i = 0; i < size; i++) {
+      if (may_have_tensor(items[i], depth - 1)) {
+        return true;
+      }
+    }
+    return false;
+  }
+  if (PyDict_CheckExact(obj)) {
+    if (PyDict_GET_SIZE(obj) > PREFILTER_MAX_ITEMS) {
+      return true;
+    }
+    Py_ssize_t pos = 0;
+    PyObject *key = NULL;
+    PyObject *value = NULL;
+    while (PyDict_Next(obj, &pos, &key, &value)) {
+      if (may_have_tensor(value, depth - 1)) {
+        return true;
+      }
+    }
+    return false;
+  }
+  if (PyType_HasFeature(Py_TYPE(obj), Py_TPFLAGS_HEAPTYPE) &&
+      !PyType_Check(obj) && !PyModule_Check(obj)) {
+    // instances of python classes, look at their __dict__
+    if (is_instance(obj, prefilter.tensor_types)) {
+      return true;
+    }
+    PyObject **dictptr = _PyObject_GetDictPtr(obj);
+    if (dictptr == NULL || *dictptr == NULL) {
+      return true;
+    }
+    return may_have_tensor(*dictptr, depth);
+  }
+  return true;
+}
+
+// has_tensor_in_frame(frame) is certainly False
+static bool prefilter_rejects(PyFrameObject *frame) {
+  PyCodeObject *code = frame->f_code;
+  if (code->co_flags & (CO_GENERATOR | CO_COROUTINE | CO_ASYNC_GENERATOR)) {
+    // the callback reports these as unsupported
+    return false;
+  }
+  prefilter.checked++;
+  if (id_in(prefilter.always_optimize, (PyObject *)code)) {
+    return false;
+  }
+
+  // globals of torch.*
+  Py_ssize_t nnames = PyTuple_GET_SIZE(code->co_names);
+  for (Py_ssize_t i = 0; i < nnames; i++) {
+    PyObject *value =
+        PyDict_GetItem(frame->f_globals, PyTuple_GET_ITEM(code->co_names, i));
+    if (value != NULL && (id_in(prefilter.allowed_ids, value) ||
+                          is_instance(value, prefilter.allowed_types))) {
+      return false;
+    }
+  }
+
+  // arguments, and the contents of cells like PyFrame_FastToLocals() does
+  Py_ssize_t nlocals = code->co_nlocals;
+  Py_ssize_t ncells = PyTuple_GET_SIZE(code->co_cellvars);
+  Py_ssize_t nfrees = PyTuple_GET_SIZE(code->co_freevars);
+  PyObject **fastlocals = frame->f_localsplus;
+  for (Py_ssize_t i = 0; i < nlocals; i++) {
+    if (may_have_tensor(fastlocals[i], PREFILTER_DEPTH)) {
+      return false;
+    }
+  }
+  for (Py_ssize_t i = nlocals; i < nlocals + ncells + nfrees; i++) {
+    PyObject *cell = fastlocals[i];
+    if (cell != NULL && PyCell_Check(cell) &&
+        may_have_tensor(PyCell_GET(cell), PREFILTER_DEPTH)) {
+      return false;
+    }
+  }
+  return true;
+}
+
 static PyObject *_custom_eval_frame_shim(PyThreadState *tstate,
                                          PyFrameObject *frame, int throw_flag) {
   // Shims logic into one of three states. Can probably be refactored into a
@@ -306,11 +762,29 @@ static PyObject *_custom_eval_frame(PyThreadState *tstate, PyFrameObject *frame,
   DEBUG_TRACE("begin %s %s %i %i %i %i", name(frame),
               PyUnicode_AsUTF8(frame->f_code->co_filename), frame->f_lineno,
               frame->f_lasti, frame->f_iblock, frame->f_executing);
-  CacheEntry *extra = get_extra(frame->f_code);
+  ExtraState *extra = get_extra(frame->f_code);
   if (extra == SKIP_CODE || (callback == Py_False && extra == NULL)) {
     DEBUG_TRACE("skip %s", name(frame));
     return eval_frame_default(tstate, frame, throw_flag);
   }
+  if (extra == NULL && skip_files != NULL &&
+      PyDict_GetItem(skip_files, frame->f_code->co_filename) == Py_True) {
+    DEBUG_TRACE("skip file %s", name(frame));
+    set_extra(frame->f_code, SKIP_CODE);
+    return eval_frame_default(tstate, frame, throw_flag);
+  }
+  if (extra == NULL && prefilter.allowed_ids != NULL &&
+      prefilter_rejects(frame)) {
+    DEBUG_TRACE("prefilter skip %s", name(frame));
+    prefilter.filtered++;
+    set_extra(frame->f_code, SKIP_CODE);
+    PyObject *ref = PyWeakref_NewRef((PyObject *)frame->f_code, NULL);
+    if (ref == NULL || PyList_Append(prefilter.skipped, ref) < 0) {
+      PyErr_Clear();
+    }
+    Py_XDECREF(ref);
+    return eval_frame_default(tstate, frame, throw_flag);
+  }
 
   // TODO(jansel): investigate directly using the "fast" representation
   if (PyFrame_FastToLocalsWithError(frame) < 0) {
@@ -322,10 +796,14 @@ static PyObject *_custom_eval_frame(PyThreadState *tstate, PyFrameObject *frame,
   // we never compile.
   if (callback == Py_False) {
     DEBUG_TRACE("In run only mode %s", name(frame));
-    PyCodeObject *cached_code = lookup(extra, frame->f_locals);
+    bool sampled = false;
+    PyCodeObject *cached_code = lookup(extra, frame, &sampled);
     if (cached_code != NULL) {
       // used cached version
       DEBUG_TRACE("cache hit %s", name(frame));
+      if (unlikely(sampled)) {
+        return eval_custom_code_sampled(tstate, frame, cached_code, throw_flag);
+      }
       return eval_custom_code(tstate, frame, cached_code, throw_flag);
     } else {
       DEBUG_TRACE("cache miss %s", name(frame));
@@ -341,12 +819,16 @@ static PyObject *_custom_eval_frame(PyThreadState *tstate, PyFrameObject *frame,
   // in the shim.
   eval_frame_callback_set(Py_None);
 
-  PyCodeObject *cached_code = lookup(extra, frame->f_locals);
+  bool sampled = false;
+  PyCodeObject *cached_code = lookup(extra, frame, &sampled);
   if (cached_code != NULL) {
     // used cached version
     DEBUG_TRACE("cache hit %s", name(frame));
     // Re-enable custom behavior
     eval_frame_callback_set(callback);
+    if (unlikely(sampled)) {
+      return eval_custom_code_sampled(tstate, frame, cached_code, throw_flag);
+    }
     return eval_custom_code(tstate, frame, cached_code, throw_flag);
   }
   // cache miss
@@ -358,18 +840,40 @@ static PyObject *_custom_eval_frame(PyThreadState *tstate, PyFrameObject *frame,
     // this is useful for debugging -- but we dont want it to happen outside of
     // testing
     return NULL;
+  }
+  // the callback may have reset or skipped this code object, which frees the
+  // state fetched above
+  extra = get_extra(frame->f_code);
+  if (result != Py_None && extra == SKIP_CODE) {
+    DEBUG_TRACE("run uncached %s", name(frame));
+    PyCodeObject *code =
+        (PyCodeObject *)PyObject_GetAttrString(result, "code");
+    Py_DECREF(result);
+    // Re-enable custom behavior
+    eval_frame_callback_set(callback);
+    if (code == NULL) {
+      return NULL;
+    }
+    PyObject *value = eval_custom_code(tstate, frame, code, throw_flag);
+    Py_DECREF(code);
+    return value;
   } else if (result != Py_None) {
     DEBUG_TRACE("create cache %s", name(frame));
-    extra = create_cache_entry(extra, result);
+    if (extra == NULL) {
+      extra = create_extra_state();
+      set_extra(frame->f_code, extra);
+    } else if (unlikely(lookup_profile_interval != 0)) {
+      extra->stats.recompiles++;
+    }
+    CacheEntry *e = create_cache_entry(extra, result);
     Py_DECREF(result);
-    set_extra(frame->f_code, extra);
     // Re-enable custom behavior
     eval_frame_callback_set(callback);
-    return eval_custom_code(tstate, frame, extra->code, throw_flag);
+    return eval_custom_code(tstate, frame, e->code, throw_flag);
   } else {
     DEBUG_TRACE("create skip %s", name(frame));
     Py_DECREF(result);
-    destroy_cache_entry(extra);
+    // set_extra() frees the old state
     set_extra(frame->f_code, SKIP_CODE);
     // Re-enable custom behavior
     eval_frame_callback_set(callback);
@@ -452,11 +956,137 @@ static PyObject *reset_code(PyObject *dummy, PyObject *args) {
     return NULL;
   }
 
-  destroy_cache_entry(get_extra((PyCodeObject *)code));
+  // set_extra() frees the old state
   set_extra((PyCodeObject *)code, NULL);
   Py_RETURN_NONE;
 }
 
+static PyObject *cache_entry_stats(PyObject *dummy, PyObject *args) {
+  // [(code, hits, misses), ...] for each compiled entry of a code object
+  PyObject *code = NULL;
+  if (!PyArg_ParseTuple(args, "O:code", &code)) {
+    DEBUG_TRACE0("arg error");
+    return NULL;
+  }
+  if (!PyCode_Check(code)) {
+    DEBUG_TRACE0("arg error");
+    PyErr_SetString(PyExc_TypeError, "expected a code object");
+    return NULL;
+  }
+
+  ExtraState *extra = get_extra((PyCodeObject *)code);
+  PyObject *result = PyList_New(0);
+  if (result == NULL || extra == NULL || extra == SKIP_CODE) {
+    return result;
+  }
+  for (CacheEntry *e = extra->cache_entry; e != NULL; e = e->next) {
+    PyObject *item = Py_BuildValue("(Okk)", e->code, e->hits, e->misses);
+    if (item == NULL || PyList_Append(result, item) < 0) {
+      Py_XDECREF(item);
+      Py_DECREF(result);
+      return NULL;
+    }
+    Py_DECREF(item);
+  }
+  return result;
+}
+
+static PyObject *evict_cache_entries(PyObject *dummy, PyObject *args) {
+  // Evict least recently hit entries of a code object until at most `keep`
+  // remain, returns the number evicted
+  PyObject *code = NULL;
+  long keep = 0;
+  if (!PyArg_ParseTuple(args, "Ol:evict_cache_entries", &code, &keep)) {
+    DEBUG_TRACE0("arg error");
+    return NULL;
+  }
+  if (!PyCode_Check(code)) {
+    DEBUG_TRACE0("arg error");
+    PyErr_SetString(PyExc_TypeError, "expected a code object");
+    return NULL;
+  }
+
+  ExtraState *extra = get_extra((PyCodeObject *)code);
+  long evicted = 0;
+  for (long size = cache_size(extra); size > keep && size > 0; size--) {
+    evict_lru_cache_entry(extra);
+    evicted++;
+  }
+  return PyLong_FromLong(evicted);
+}
+
+static PyObject *add_cache_entry(PyObject *dummy, PyObject *args) {
+  // Add a GuardedCode compiled ahead of time to the cache of a code object,
+  // returns False if the code object is skipped
+  PyObject *code = NULL;
+  PyObject *guarded_code = NULL;
+  if (!PyArg_ParseTuple(args, "OO:add_cache_entry", &code, &guarded_code)) {
+    DEBUG_TRACE0("arg error");
+    return NULL;
+  }
+  if (!PyCode_Check(code)) {
+    DEBUG_TRACE0("arg error");
+    PyErr_SetString(PyExc_TypeError, "expected a code object");
+    return NULL;
+  }
+
+  ExtraState *extra = get_extra((PyCodeObject *)code);
+  if (extra == SKIP_CODE) {
+    Py_RETURN_FALSE;
+  }
+  if (extra == NULL) {
+    extra = create_extra_state();
+    set_extra((PyCodeObject *)code, extra);
+  }
+  create_cache_entry(extra, guarded_code);
+  Py_RETURN_TRUE;
+}
+
+static PyObject *set_lookup_profile_interval(PyObject *dummy,
+                                             PyObject *args) {
+  // 0 disables profiling, returns the prior interval
+  long interval = 0;
+  if (!PyArg_ParseTuple(args, "l:set_lookup_profile_interval", &interval)) {
+    return NULL;
+  }
+  if (interval < 0) {
+    PyErr_SetString(PyExc_ValueError, "interval must be >= 0");
+    return NULL;
+  }
+  long prior = lookup_profile_interval;
+  if (interval != prior) {
+    lookup_profile_interval = interval;
+    lookup_profile_countdown = 0;
+  }
+  return PyLong_FromLong(prior);
+}
+
+static PyObject *lookup_stats(PyObject *dummy, PyObject *args) {
+  // dict of the LookupStats of a code object, or None if it has no cache
+  PyObject *code = NULL;
+  if (!PyArg_ParseTuple(args, "O:code", &code)) {
+    DEBUG_TRACE0("arg error");
+    return NULL;
+  }
+  if (!PyCode_Check(code)) {
+    DEBUG_TRACE0("arg error");
+    PyErr_SetString(PyExc_TypeError, "expected a code object");
+    return NULL;
+  }
+
+  ExtraState *extra = get_extra((PyCodeObject *)code);
+  if (extra == NULL || extra == SKIP_CODE) {
+    Py_RETURN_NONE;
+  }
+  LookupStats *stats = &extra->stats;
+  return Py_BuildValue(
+      "{sksksksksksksksKsK}", "lookups", stats->lookups, "entries_checked",
+      stats->entries_checked, "hits", stats->hits, "misses", stats->misses,
+      "recompiles", stats->recompiles, "sampled", stats->sampled,
+      "sampled_runs", stats->sampled_runs, "guard_ns", stats->guard_ns,
+      "run_ns", stats->run_ns);
+}
+
 static PyObject *unsupported(PyObject *dummy, PyObject *args) {
   // a dummy C function used in testing
   PyObject *obj1 = NULL;
@@ -496,6 +1126,62 @@ static PyObject *set_guard_fail_hook(PyObject *dummy, PyObject *args) {
   Py_RETURN_NONE;
 }
 
+static PyObject *set_skip_files(PyObject *dummy, PyObject *args) {
+  PyObject *obj = NULL;
+  if (!PyArg_ParseTuple(args, "O", &obj)) {
+    return NULL;
+  }
+  if (obj != Py_None && !PyDict_Check(obj)) {
+    PyErr_SetString(PyExc_TypeError, "expected a dict");
+    return NULL;
+  }
+  Py_XDECREF(skip_files);
+  if (obj == Py_None) {
+    skip_files = NULL;
+  } else {
+    skip_files = obj;
+    Py_INCREF(skip_files);
+  }
+  Py_RETURN_NONE;
+}
+
+static PyObject *set_frame_prefilter(PyObject *dummy, PyObject *args) {
+  PyObject *allowed_ids = NULL;
+  PyObject *allowed_types = NULL;
+  PyObject *tensor_types = NULL;
+  PyObject *always_optimize = NULL;
+  PyObject *skipped = NULL;
+  if (PyTuple_GET_SIZE(args) == 1 && PyTuple_GET_ITEM(args, 0) == Py_None) {
+    // disable
+  } else if (!PyArg_ParseTuple(args, "O!O!O!O!O!", &PySet_Type, &allowed_ids,
+                               &PyTuple_Type, &allowed_types, &PyTuple_Type,
+                               &tensor_types, &PyDict_Type, &always_optimize,
+                               &PyList_Type, &skipped)) {
+    return NULL;
+  }
+  Py_XINCREF(allowed_ids);
+  Py_XINCREF(allowed_types);
+  Py_XINCREF(tensor_types);
+  Py_XINCREF(always_optimize);
+  Py_XINCREF(skipped);
+  Py_XDECREF(prefilter.allowed_ids);
+  Py_XDECREF(prefilter.allowed_types);
+  Py_XDECREF(prefilter.tensor_types);
+  Py_XDECREF(prefilter.always_optimize);
+  Py_XDECREF(prefilter.skipped);
+  prefilter.allowed_ids = allowed_ids;
+  prefilter.allowed_types = allowed_types;
+  prefilter.tensor_types = tensor_types;
+  prefilter.always_optimize = always_optimize;
+  prefilter.skipped = skipped;
+  Py_RETURN_NONE;
+}
+
+static PyObject *prefilter_stats(PyObject *dummy, PyObject *args) {
+  return Py_BuildValue("{sksk}", "checked", prefilter.checked, "filtered",
+                       prefilter.filtered);
+}
+
 static PyObject *set_guard_error_hook(PyObject *dummy, PyObject *args) {
   PyObject *obj = NULL;
   if (!PyArg_ParseTuple(args, "O", &obj)) {
@@ -514,10 +1200,19 @@ static PyObject *set_guard_error_hook(PyObject *dummy, PyObject *args) {
 static PyMethodDef _methods[] = {
     {"set_eval_frame", set_eval_frame_py, METH_VARARGS, NULL},
     {"reset_code", reset_code, METH_VARARGS, NULL},
+    {"cache_entry_stats", cache_entry_stats, METH_VARARGS, NULL},
+    {"evict_cache_entries", evict_cache_entries, METH_VARARGS, NULL},
+    {"add_cache_entry", add_cache_entry, METH_VARARGS, NULL},
+    {"set_lookup_profile_interval", set_lookup_profile_interval, METH_VARARGS,
+     NULL},
+    {"lookup_stats", lookup_stats, METH_VARARGS, NULL},
     {"unsupported", unsupported, METH_VARARGS, NULL},
     {"skip_code", skip_code, METH_VARARGS, NULL},
     {"set_guard_fail_hook", set_guard_fail_hook, METH_VARARGS, NULL},
     {"set_guard_error_hook", set_guard_error_hook, METH_VARARGS, NULL},
+    {"set_skip_files", set_skip_files, METH_VARARGS, NULL},
+    {"set_frame_prefilter", set_frame_prefilter, METH_VARARGS, NULL},
+    {"prefilter_stats", prefilter_stats, METH_VARARGS, NULL},
     {NULL, NULL, 0, NULL}};
 
 static struct PyModuleDef _module = {
@@ -526,7 +1221,7 @@ static struct PyModuleDef _module = {
 
 PyMODINIT_FUNC PyInit__eval_frame(void) {
   CHECK(sizeof(unsigned long) == sizeof(void *));
-  extra_index = _PyEval_RequestCodeExtraIndex(ignored);
+  extra_index = _PyEval_RequestCodeExtraIndex(free_extra_state);
 
   int result = PyThread_tss_create(&eval_frame_callback_key);
   CHECK(result == 0);
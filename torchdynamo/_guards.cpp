@@ -1,5 +1,6 @@
 #define PY_SSIZE_T_CLEAN
 #include <Python.h>
+#include <c10/util/hash.h>
 #include <sstream>
 #include <torch/extension.h>
 
@@ -289,6 +290,387 @@ static PyTypeObject TensorGuardsType = {
     // NOLINTNEXTLINE
     PyVarObject_HEAD_INIT(NULL, 0)};
 
+// Kinds of checks and attribute accesses in a NativeGuards tree, these must
+// be kept in sync with NativeGuardBuilder in guards.py
+enum class LeafKind : int {
+  TYPE_ID = 0,
+  OBJ_ID = 1,
+  EQUALS = 2,
+  LEN = 3,
+  DICT_KEYS = 4,
+  TENSOR = 5,
+  GRAD_MODE = 6
+};
+
+enum class AccessorKind : int { DICT_ITEM = 0, GETATTR = 1, GETITEM = 2 };
+
+struct GuardLeaf {
+  LeafKind kind;
+  PyObject *value; // owned, expected value for EQUALS/DICT_KEYS
+  uintptr_t id;    // TYPE_ID/OBJ_ID
+  Py_ssize_t n;    // LEN, index into the TensorGuards for TENSOR, GRAD_MODE
+};
+
+class GuardNode {
+public:
+  GuardNode() = default;
+  GuardNode(const GuardNode &) = delete;
+  GuardNode &operator=(const GuardNode &) = delete;
+
+  ~GuardNode() {
+    for (auto &leaf : leaves_) {
+      Py_XDECREF(leaf.value);
+    }
+    for (auto &child : children_) {
+      Py_XDECREF(child.key);
+    }
+  }
+
+  // spec is `([(leaf_kind, value), ...], [(accessor_kind, key, spec), ...])`
+  bool init(PyObject *spec) {
+    PyObject *leaves;
+    PyObject *children;
+    if (!PyArg_ParseTuple(spec, "O!O!", &PyList_Type, &leaves, &PyList_Type,
+                          &children)) {
+      return false;
+    }
+    for (auto i : c10::irange(PyList_GET_SIZE(leaves))) {
+      int kind;
+      PyObject *value;
+      if (!PyArg_ParseTuple(PyList_GET_ITEM(leaves, i), "iO", &kind, &value)) {
+        return false;
+      }
+      GuardLeaf leaf{static_cast<LeafKind>(kind), NULL, 0, 0};
+      switch (leaf.kind) {
+      case LeafKind::TYPE_ID:
+      case LeafKind::OBJ_ID:
+        leaf.id = reinterpret_cast<uintptr_t>(PyLong_AsVoidPtr(value));
+        break;
+      case LeafKind::EQUALS:
+        Py_INCREF(value);
+        leaf.value = value;
+        break;
+      case LeafKind::DICT_KEYS:
+        leaf.value = PyFrozenSet_New(value);
+        if (leaf.value == NULL) {
+          return false;
+        }
+        break;
+      case LeafKind::LEN:
+      case LeafKind::TENSOR:
+        leaf.n = PyLong_AsSsize_t(value);
+        break;
+      case LeafKind::GRAD_MODE:
+        leaf.n = PyObject_IsTrue(value);
+        break;
+      default:
+        PyErr_SetString(PyExc_ValueError, "unknown guard kind");
+        return false;
+      }
+      leaves_.emplace_back(leaf);
+      if (PyErr_Occurred()) {
+        return false;
+      }
+    }
+    for (auto i : c10::irange(PyList_GET_SIZE(children))) {
+      int kind;
+      PyObject *key;
+      PyObject *child_spec;
+      if (!PyArg_ParseTuple(PyList_GET_ITEM(children, i), "iOO!", &kind, &key,
+                            &PyTuple_Type, &child_spec)) {
+        return false;
+      }
+      if (kind < 0 || kind > static_cast<int>(AccessorKind::GETITEM)) {
+        PyErr_SetString(PyExc_ValueError, "unknown accessor kind");
+        return false;
+      }
+      Py_INCREF(key);
+      children_.emplace_back(Child{static_cast<AccessorKind>(kind), key,
+                                   std::make_unique<GuardNode>()});
+      if (!children_.back().node->init(child_spec)) {
+        return false;
+      }
+    }
+    return true;
+  }
+
+  // 1 if all checks pass, 0 if one fails, -1 with an exception set
+  int check(const LocalState &state, ChecksList &tensor_checks,
+            PyObject *value) {
+    for (auto &leaf : leaves_) {
+      switch (leaf.kind) {
+      case LeafKind::TYPE_ID:
+        if (reinterpret_cast<uintptr_t>(Py_TYPE(value)) != leaf.id) {
+          return 0;
+        }
+        break;
+      case LeafKind::OBJ_ID:
+        if (reinterpret_cast<uintptr_t>(value) != leaf.id) {
+          return 0;
+        }
+        break;
+      case LeafKind::EQUALS: {
+        int result = PyObject_RichCompareBool(value, leaf.value, Py_EQ);
+        if (result != 1) {
+          return result;
+        }
+        break;
+      }
+      case LeafKind::LEN: {
+        Py_ssize_t len = PyObject_Length(value);
+        if (len < 0) {
+          PyErr_Clear();
+          return 0;
+        }
+        if (len != leaf.n) {
+          return 0;
+        }
+        break;
+      }
+      case LeafKind::DICT_KEYS: {
+        // same as `set(value.keys()) == expected`
+        if (!PyDict_Check(value) ||
+            PyDict_Size(value) != PySet_GET_SIZE(leaf.value)) {
+          return 0;
+        }
+        Py_ssize_t pos = 0;
+        PyObject *key;
+        PyObject *item;
+        while (PyDict_Next(value, &pos, &key, &item)) {
+          int result = PySet_Contains(leaf.value, key);
+          if (result != 1) {
+            return result;
+          }
+        }
+        break;
+      }
+      case LeafKind::TENSOR: {
+        auto &tensor_check = tensor_checks[leaf.n];
+        if (Py_TYPE(value) != tensor_check.pytype ||
+            !tensor_check.check(state, THPVariable_Unpack(value))) {
+          return 0;
+        }
+        break;
+      }
+      case LeafKind::GRAD_MODE:
+        if (state.grad_mode_enabled != (leaf.n != 0)) {
+          return 0;
+        }
+        break;
+      }
+    }
+    for (auto &child : children_) {
+      PyObject *item = NULL;
+      switch (child.kind) {
+      case AccessorKind::DICT_ITEM:
+        item = PyDict_GetItemWithError(value, child.key);
+        if (item == NULL) {
+          return PyErr_Occurred() ? -1 : 0;
+        }
+        Py_INCREF(item);
+        break;
+      case AccessorKind::GETATTR:
+        item = PyObject_GetAttr(value, child.key);
+        break;
+      case AccessorKind::GETITEM:
+        item = PyObject_GetItem(value, child.key);
+        break;
+      }
+      if (item == NULL) {
+        // The access worked when the guards were built, so whatever changed
+        // means the guards fail rather than error
+        PyErr_Clear();
+        return 0;
+      }
+      int result = child.node->check(state, tensor_checks, item);
+      Py_DECREF(item);
+      if (result != 1) {
+        return result;
+      }
+    }
+    return 1;
+  }
+
+  int traverse(visitproc visit, void *arg) {
+    for (auto &leaf : leaves_) {
+      Py_VISIT(leaf.value);
+    }
+    for (auto &child : children_) {
+      Py_VISIT(child.key);
+      int result = child.node->traverse(visit, arg);
+      if (result != 0) {
+        return result;
+      }
+    }
+    return 0;
+  }
+
+private:
+  struct Child {
+    AccessorKind kind;
+    PyObject *key; // owned
+    std::unique_ptr<GuardNode> node;
+  };
+
+  std::vector<GuardLeaf> leaves_;
+  std::vector<Child> children_;
+};
+
+struct NativeGuardsState {
+  // each root is checked against a fixed scope dict, or the f_locals passed
+  // as **kwargs when the scope is NULL
+  std::vector<std::pair<PyObject *, std::unique_ptr<GuardNode>>> roots;
+  PyObject *tensor_guards = NULL; // TensorGuards referenced by TENSOR leaves
+  PyObject *residual = NULL; // python guard_fn for parts that were not lowered
+
+  ~NativeGuardsState() {
+    for (auto &root : roots) {
+      Py_XDECREF(root.first);
+    }
+    Py_XDECREF(tensor_guards);
+    Py_XDECREF(residual);
+  }
+};
+
+typedef struct {
+  PyObject_HEAD;
+  NativeGuardsState *state;
+  PyObject *dict; // attributes used by guard_fail_hook/guard_error_hook
+} NativeGuards;
+
+static int NativeGuards_traverse(NativeGuards *self, visitproc visit,
+                                 void *arg) {
+  Py_VISIT(self->dict);
+  if (self->state != NULL) {
+    for (auto &root : self->state->roots) {
+      Py_VISIT(root.first);
+      int result = root.second->traverse(visit, arg);
+      if (result != 0) {
+        return result;
+      }
+    }
+    Py_VISIT(self->state->tensor_guards);
+    Py_VISIT(self->state->residual);
+  }
+  return 0;
+}
+
+static int NativeGuards_clear(NativeGuards *self) {
+  Py_CLEAR(self->dict);
+  if (self->state != NULL) {
+    delete self->state;
+    self->state = NULL;
+  }
+  return 0;
+}
+
+static void NativeGuards_dealloc(NativeGuards *self) {
+  PyObject_GC_UnTrack(self);
+  NativeGuards_clear(self);
+  Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static PyObject *NativeGuards_new(PyTypeObject *type, PyObject *args,
+                                  PyObject *kwds) {
+  NativeGuards *self = (NativeGuards *)type->tp_alloc(type, 0);
+  if (self != NULL) {
+    self->state = new NativeGuardsState();
+    self->dict = NULL;
+  }
+  return (PyObject *)self;
+}
+
+static int NativeGuards_init(NativeGuards *self, PyObject *args,
+                             PyObject *kwds) {
+  // NativeGuards([(scope or None, spec), ...], tensor_guards, residual)
+  PyObject *roots;
+  PyObject *tensor_guards;
+  PyObject *residual;
+  if (!PyArg_ParseTuple(args, "O!OO", &PyList_Type, &roots, &tensor_guards,
+                        &residual)) {
+    return -1;
+  }
+  if (tensor_guards != Py_None &&
+      !PyObject_TypeCheck(tensor_guards, &TensorGuardsType)) {
+    PyErr_SetString(PyExc_TypeError, "expected TensorGuards or None");
+    return -1;
+  }
+  if (residual != Py_None && !PyCallable_Check(residual)) {
+    PyErr_SetString(PyExc_TypeError, "expected callable or None");
+    return -1;
+  }
+
+  auto state = std::make_unique<NativeGuardsState>();
+  for (auto i : c10::irange(PyList_GET_SIZE(roots))) {
+    PyObject *scope;
+    PyObject *spec;
+    if (!PyArg_ParseTuple(PyList_GET_ITEM(roots, i), "OO!", &scope,
+                          &PyTuple_Type, &spec)) {
+      return -1;
+    }
+    if (scope != Py_None && !PyDict_Check(scope)) {
+      PyErr_SetString(PyExc_TypeError, "expected dict or None");
+      return -1;
+    }
+    if (scope == Py_None) {
+      scope = NULL;
+    }
+    Py_XINCREF(scope);
+    state->roots.emplace_back(scope, std::make_unique<GuardNode>());
+    if (!state->roots.back().second->init(spec)) {
+      return -1;
+    }
+  }
+  if (tensor_guards != Py_None) {
+    Py_INCREF(tensor_guards);
+    state->tensor_guards = tensor_guards;
+  }
+  if (residual != Py_None) {
+    Py_INCREF(residual);
+    state->residual = residual;
+  }
+  delete self->state;
+  self->state = state.release();
+  return 0;
+}
+
+static PyObject *NativeGuards_call(NativeGuards *self, PyObject *args,
+                                   PyObject *kwargs) {
+  // called like the python guard_fn, with f_locals as **kwargs
+  static ChecksList no_tensor_checks;
+  NativeGuardsState *state = self->state;
+  if (state == NULL) {
+    Py_RETURN_FALSE;
+  }
+  ChecksList &tensor_checks =
+      state->tensor_guards == NULL
+          ? no_tensor_checks
+          : *((TensorGuards *)state->tensor_guards)->checks;
+
+  LocalState local_state;
+  for (auto &root : state->roots) {
+    PyObject *scope = root.first != NULL ? root.first : kwargs;
+    if (scope == NULL) {
+      Py_RETURN_FALSE;
+    }
+    int result = root.second->check(local_state, tensor_checks, scope);
+    if (result < 0) {
+      return NULL;
+    } else if (result == 0) {
+      Py_RETURN_FALSE;
+    }
+  }
+
+  if (state->residual != NULL) {
+    return PyObject_Call(state->residual, args, kwargs);
+  }
+  Py_RETURN_TRUE;
+}
+
+static PyTypeObject NativeGuardsType = {
+    // NOLINTNEXTLINE
+    PyVarObject_HEAD_INIT(NULL, 0)};
+
 static PyObject *check_type_id(PyObject *dummy, PyObject *args) {
   // faster `lambda obj, expected: id(type(obj)) == expected`
   PyObject *obj;
@@ -317,9 +699,43 @@ static PyObject *check_obj_id(PyObject *dummy, PyObject *args) {
   }
 }
 
+static PyObject *dispatch_key(PyObject *dummy, PyObject *args,
+                              PyObject *kwargs) {
+  // Cheap discriminator used by _eval_frame.c to find the cache entries that
+  // could possibly match.  Every property hashed here must also be checked by
+  // TensorCheck, so entries that pass their guards have a matching key.
+  PyObject *dynamic_shapes_py =
+      kwargs == NULL ? NULL : PyDict_GetItemString(kwargs, "dynamic_shapes");
+  if (dynamic_shapes_py == NULL) {
+    PyErr_SetString(PyExc_TypeError, "missing dynamic_shapes=...");
+    return NULL;
+  }
+  bool dynamic_shapes = PyObject_IsTrue(dynamic_shapes_py);
+
+  size_t key = 0;
+  for (auto i : c10::irange(PyTuple_GET_SIZE(args))) {
+    PyObject *item = PyTuple_GET_ITEM(args, i);
+    size_t h = std::hash<PyTypeObject *>()(Py_TYPE(item));
+    if (THPVariable_Check(item)) {
+      const at::Tensor &v = THPVariable_Unpack(item);
+      h = c10::hash_combine(h, c10::get_hash(v.scalar_type(),
+                                             v.device().type(), v.dim()));
+      if (!dynamic_shapes) {
+        for (auto size : v.sizes()) {
+          h = c10::hash_combine(h, std::hash<int64_t>()(size));
+        }
+      }
+    }
+    key = c10::hash_combine(key, h);
+  }
+  return PyLong_FromSize_t(key);
+}
+
 static PyMethodDef _methods[] = {
     {"check_type_id", check_type_id, METH_VARARGS, NULL},
     {"check_obj_id", check_obj_id, METH_VARARGS, NULL},
+    {"dispatch_key", (PyCFunction)(void (*)(void))dispatch_key,
+     METH_VARARGS | METH_KEYWORDS, NULL},
     {NULL, NULL, 0, NULL}};
 
 static struct PyModuleDef _module = {PyModuleDef_HEAD_INIT, "_guards",
@@ -340,9 +756,25 @@ PyMODINIT_FUNC PyInit__guards(void) {
   TensorGuardsType.tp_init = (initproc)TensorGuards_init;
   TensorGuardsType.tp_new = TensorGuards_new;
 
+  // initialize NativeGuardsType
+  NativeGuardsType.tp_name = "torchdynamo._guards.NativeGuards";
+  NativeGuardsType.tp_basicsize = sizeof(NativeGuards);
+  NativeGuardsType.tp_itemsize = 0;
+  NativeGuardsType.tp_dealloc = (destructor)NativeGuards_dealloc;
+  NativeGuardsType.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC;
+  NativeGuardsType.tp_doc = "Tree of guards evaluated without the interpreter";
+  NativeGuardsType.tp_traverse = (traverseproc)NativeGuards_traverse;
+  NativeGuardsType.tp_clear = (inquiry)NativeGuards_clear;
+  NativeGuardsType.tp_call = (ternaryfunc)NativeGuards_call;
+  NativeGuardsType.tp_dictoffset = offsetof(NativeGuards, dict);
+  NativeGuardsType.tp_init = (initproc)NativeGuards_init;
+  NativeGuardsType.tp_new = NativeGuards_new;
+
   PyObject *m;
   if (PyType_Ready(&TensorGuardsType) < 0)
     return NULL;
+  if (PyType_Ready(&NativeGuardsType) < 0)
+    return NULL;
 
   m = PyModule_Create(&_module);
   if (m == NULL)
@@ -356,5 +788,13 @@ PyMODINIT_FUNC PyInit__guards(void) {
     return NULL;
   }
 
+  Py_INCREF(&NativeGuardsType);
+  if (PyModule_AddObject(m, "NativeGuards", (PyObject *)&NativeGuardsType) <
+      0) {
+    Py_DECREF(&NativeGuardsType);
+    Py_DECREF(m);
+    return NULL;
+  }
+
   return m;
 }
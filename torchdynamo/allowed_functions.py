@@ -6,6 +6,7 @@ import inspect
 import itertools
 import math
 import operator
+import sys
 import types
 import warnings
 from typing import Dict
@@ -16,6 +17,7 @@ import numpy
 import torch
 
 from . import config
+from . import startup_cache
 from .utils import is_safe_constant
 
 
@@ -108,13 +110,14 @@ def _disallowed_function_ids():
     return {id(x) for x in remove}
 
 
-@make_function_id_set
-def _allowed_function_ids():
+def _find_torch_objects():
     """
-    Walk torch.* and get the ids of all the stuff in it
+    Walk torch.* and get the ids of all the stuff in it.  Also returns an
+    index of (attribute path, name) of everything found, to look them up
+    again in another process.
     """
-    warnings.filterwarnings("ignore", category=UserWarning, module="torch.distributed")
     torch_object_ids = dict()
+    paths = dict()
 
     def _is_allowed_module_prefix(obj):
         allowed_modules = ("torch", "math")
@@ -136,26 +139,81 @@ def _allowed_function_ids():
 
         return mod_name in allowed_modules or mod_name.startswith(allowed_modules_dot)
 
-    def _find_torch_objects(module):
+    def _find_torch_objects(module, path):
         if any(
             module.__name__.startswith(mod_name)
             for mod_name in config.allowed_functions_module_string_ignorelist
         ):
             return
         torch_object_ids[id(module)] = module.__name__
+        paths.setdefault(id(module), path)
         for name, obj in list(module.__dict__.items()):
             if id(obj) not in torch_object_ids:
                 if isinstance(obj, types.ModuleType):
                     if obj.__name__.startswith("torch."):
                         torch_object_ids[id(obj)] = f"{module.__name__}.{name}"
-                        _find_torch_objects(obj)
+                        paths[id(obj)] = path + (name,)
+                        _find_torch_objects(obj, path + (name,))
                 elif _is_allowed_module_prefix(obj):
                     torch_object_ids[id(obj)] = f"{module.__name__}.{name}"
+                    paths[id(obj)] = path + (name,)
                 elif inspect.getmodule(obj) is None and not is_safe_constant(obj):
                     torch_object_ids[id(obj)] = f"{module.__name__}.{name}"
+                    paths[id(obj)] = path + (name,)
+
+    _find_torch_objects(torch, ("torch",))
+    _find_torch_objects(math, ("math",))
+
+    index = [(paths[idx], name) for idx, name in torch_object_ids.items()]
+    return torch_object_ids, index
+
+
+def _lookup_torch_objects(index):
+    """
+    The ids of the objects in an index made by _find_torch_objects(), or
+    None if one of them is gone
+    """
+    missing = object()
+    modules = {("torch",): torch, ("math",): math}
+    torch_object_ids = dict()
+    for path, name in index:
+        obj = modules.get(path)
+        if obj is None:
+            parent = modules.get(path[:-1])
+            if parent is None:
+                return None
+            obj = parent.__dict__.get(path[-1], missing)
+            if obj is missing:
+                return None
+            if isinstance(obj, types.ModuleType):
+                modules[path] = obj
+        torch_object_ids.setdefault(id(obj), name)
+    return torch_object_ids
+
+
+def _torch_index_key():
+    return [
+        sorted(m for m in sys.modules if m == "torch" or m.startswith("torch.")),
+        sorted(config.allowed_functions_module_string_ignorelist),
+        startup_cache.source_key(__file__),
+    ]
+
 
-    _find_torch_objects(torch)
-    _find_torch_objects(math)
+@make_function_id_set
+def _allowed_function_ids():
+    """
+    Walk torch.* and get the ids of all the stuff in it, or look them up by
+    name in the index saved by an earlier process, see config.startup_cache
+    """
+    warnings.filterwarnings("ignore", category=UserWarning, module="torch.distributed")
+    key = startup_cache.key(_torch_index_key)
+    index = startup_cache.load("allowed_functions", key)
+    torch_object_ids = None
+    if index is not None:
+        torch_object_ids = _lookup_torch_objects(index)
+    if torch_object_ids is None:
+        torch_object_ids, index = _find_torch_objects()
+        startup_cache.save("allowed_functions", key, index)
 
     for idx in _disallowed_function_ids():
         if idx in torch_object_ids:
@@ -0,0 +1,128 @@
+import copy
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from . import config
+from .utils import clone_inputs
+from .utils import compilation_metrics
+from .utils import counters
+
+log = logging.getLogger(__name__)
+
+
+class BackgroundCompiledFn:
+    """
+    Returned to dynamo in place of the compiled graph.  Runs the graph
+    eagerly until the backend has compiled it on a worker thread, or with
+    wait_first=True blocks until it has.
+    """
+
+    def __init__(self, gm: torch.fx.GraphModule, wait_first=False):
+        self.fn = gm.forward
+        self.compiled = False
+        self.wait_first = wait_first
+        # set once the backend has returned (or failed)
+        self.done = threading.Event()
+
+    def __call__(self, *args):
+        if self.wait_first:
+            self.done.wait()
+            self.wait_first = False
+        return self.fn(*args)
+
+    def install(self, fn):
+        # a single attribute store, callers see either the eager or the
+        # compiled fn and never anything in between
+        self.fn = fn
+        self.compiled = True
+
+
+class BackgroundCompiler:
+    """
+    Wraps a backend to compile graphs on worker threads, see
+    optimize(..., background_compile=True).
+
+    Tracing still happens synchronously on the first call since it reads the
+    live frame, only the (much slower) backend compile is deferred.  At most
+    config.background_compile_threads graphs compile at once, and while
+    config.background_compile_max_pending graphs are waiting new ones are
+    compiled synchronously instead.  counters["background_compile"] and
+    compilation_metrics["background_compile_latency"] (seconds from the
+    first call to the compiled graph being installed) track progress.
+
+    With wait_first=True the first call of a graph waits for its compile instead of
+    running it eagerly, so graphs traced ahead of their first call (see
+    config.prefetch_resume_functions) compile in parallel.
+    """
+
+    _pool = None
+    _pending = 0
+    _cond = threading.Condition()
+
+    def __init__(self, compiler_fn, wait_first=False):
+        self.compiler_fn = compiler_fn
+        self.wait_first = wait_first
+
+    @classmethod
+    def pool(cls):
+        with cls._cond:
+            if cls._pool is None:
+                cls._pool = ThreadPoolExecutor(
+                    config.background_compile_threads,
+                    thread_name_prefix="torchdynamo_compile",
+                )
+            return cls._pool
+
+    @classmethod
+    def wait(cls, timeout=None):
+        """Block until every submitted graph is compiled (or failed)"""
+        with cls._cond:
+            return cls._cond.wait_for(lambda: cls._pending == 0, timeout)
+
+    def __call__(self, gm: torch.fx.GraphModule, example_inputs):
+        with self._cond:
+            synchronous = (
+                BackgroundCompiler._pending >= config.background_compile_max_pending
+            )
+            if not synchronous:
+                BackgroundCompiler._pending += 1
+        if synchronous:
+            # outside the lock, workers need it to finish
+            counters["background_compile"]["synchronous"] += 1
+            return self.compiler_fn(gm, example_inputs)
+        counters["background_compile"]["submitted"] += 1
+
+        compiled_fn = BackgroundCompiledFn(gm, self.wait_first)
+        # The caller keeps running the graph and mutating its inputs while we
+        # compile, so give the backend its own graph and inputs
+        gm = torch.fx.GraphModule(gm, copy.deepcopy(gm.graph))
+        example_inputs = clone_inputs(example_inputs)
+        grad_enabled = torch.is_grad_enabled()
+        start = time.time()
+
+        def compile():
+            try:
+                with torch.set_grad_enabled(grad_enabled):
+                    fn = self.compiler_fn(gm, example_inputs)
+                assert callable(fn), "compiler_fn did not return callable"
+                compiled_fn.install(fn)
+                counters["background_compile"]["compiled"] += 1
+            except Exception:
+                log.warning("background compile failed, running eagerly", exc_info=True)
+                counters["background_compile"]["failed"] += 1
+            finally:
+                latency = time.time() - start
+                with self._cond:
+                    compilation_metrics.setdefault(
+                        "background_compile_latency", []
+                    ).append(latency)
+                    BackgroundCompiler._pending -= 1
+                    self._cond.notify_all()
+                compiled_fn.done.set()
+
+        self.pool().submit(compile)
+        return compiled_fn
@@ -43,6 +43,59 @@ dead_code_elimination = True
 # disable (for a function) when cache reaches this size
 cache_size_limit = 64
 
+# What to do when a function reaches cache_size_limit: "disable" stops
+# compiling it and runs it eagerly from then on, "lru" evicts its least
+# recently hit compiled variant to make room, see counters["cache_eviction"]
+cache_eviction_policy = "disable"
+
+# Index the compiled variants of a frame by a cheap key over its tensor
+# arguments (type, dtype, device, rank) so a call only runs the guards of
+# variants with a matching key, rather than every guard in the cache
+guard_dispatch = False
+
+# Evaluate guards with a tree of C++ nodes (NativeGuards in _guards.cpp)
+# instead of an exec'd python lambda.  Guards that can't be lowered are
+# still checked by a python lambda once the native ones pass.
+native_guards = False
+
+# Check the guards on globals that every cache entry of a frame has in common
+# (grad mode, modules, ...) once per call rather than once per entry
+share_guards = False
+
+# Count the cache lookups of every code object in _eval_frame.c and time one
+# in this many of them and the compiled code they run, see
+# utils.lookup_times().  Cheap enough to leave on, 0 disables
+lookup_profile_interval = 0
+
+# optimize(..., background_compile=True): number of graphs compiled at once,
+# and how many may wait before new graphs are compiled synchronously again
+background_compile_threads = 1
+background_compile_max_pending = 16
+
+# When a frame has graph breaks, trace its resume functions right away with
+# locals made from the example values at each break, rather than when they
+# are first called, and compile all their graphs at once on the
+# background_compile_threads pool.  At most prefetch_resume_limit resume
+# functions are traced ahead per frame, see prefetch.py
+prefetch_resume_functions = False
+prefetch_resume_limit = 8
+# Resume functions whose example arguments (tensors like the graph outputs
+# passed to them) take more bytes than this are compiled when first called
+prefetch_resume_example_bytes = 64 * 1024 * 1024
+
+# Reject new frames that has_tensor_in_frame() would reject (no torch.*
+# globals, no tensor in the locals a couple of levels deep) in C, without
+# calling back into python.  Applies to any eval_frame callback once enabled
+frame_prefilter = False
+
+# Keep what is found by walking torch.* at startup (the functions allowed in
+# graphs, by name, and the directories skipfiles skips) in an index on disk,
+# keyed by the torch build and the torch modules imported, so processes
+# after the first one skip the walk, see startup_cache.py
+startup_cache = os.environ.get("TORCHDYNAMO_STARTUP_CACHE", "0") == "1"
+# where, None for /tmp/torchdynamo_$USER, see startup_cache.cache_dir()
+startup_cache_dir = os.environ.get("TORCHDYNAMO_CACHE_DIR")
+
 # specializing int/float by default
 specialize_int_float = True
 
@@ -61,6 +114,23 @@ base_dir = dirname(dirname(abspath(__file__)))
 # don't specialize on shapes and strides and put shape ops in graph
 dynamic_shapes = os.environ.get("TORCHDYNAMO_DYNAMIC_SHAPES") == "1"
 
+# With dynamic_shapes off, recompile a frame with dynamic shapes once the
+# size of one of its tensor inputs in one dimension has made its guards fail
+# automatic_dynamic_shapes_threshold times
+automatic_dynamic_shapes = False
+automatic_dynamic_shapes_threshold = 2
+
+# Replay the graph recorded by inlining a helper function when it is called
+# again with arguments of the same signature (tensor metadata, constants),
+# rather than tracing its bytecode again.  Only for calls that add nothing
+# but graph nodes and guards, see inline_memo.py
+inline_memoization = False
+
+# Compile the structurally identical layers of a graph (e.g. the children of
+# an nn.ModuleList called in a loop) once and call that with the parameters
+# of each layer, instead of compiling one graph that repeats every layer
+repeated_layers = False
+
 # Set this to False to assume nn.Modules() contents are immutable (similar assumption as freezing)
 guard_nn_modules = False
 
@@ -70,6 +140,11 @@ dynamic_propagation = True
 # Run the FX graph with FakeTensors
 fake_tensor_propagation = True
 
+# Reuse the output metadata of an op traced again with inputs of the same
+# shapes/strides/dtypes/devices and constant args, rather than running it
+# with FakeTensors, see fake_cache.py
+fake_propagation_cache = False
+
 # run FX normalization passes in optimizer
 normalize_ir = False
 
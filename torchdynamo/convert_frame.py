@@ -14,6 +14,7 @@ from torch.fx.graph_module import _forward_from_src as original_forward_from_src
 from . import config
 from . import exc
 from . import logging as torchdynamo_logging
+from .allowed_functions import _allowed_function_ids
 from .allowed_functions import is_allowed
 from .bytecode_analysis import remove_dead_code
 from .bytecode_analysis import remove_pointless_jumps
@@ -22,6 +23,10 @@ from .bytecode_transformation import transform_code_object
 from .eval_frame import TorchPatcher
 from .eval_frame import WrapperBackend
 from .eval_frame import always_optimize_code_objects
+from .eval_frame import evict_cache_entries
+from .eval_frame import prefiltered_code_objects
+from .eval_frame import reset_code
+from .eval_frame import set_frame_prefilter
 from .eval_frame import skip_code
 from .exc import BackendCompilerFailed
 from .exc import InternalTorchDynamoError
@@ -30,19 +35,23 @@ from .exc import Unsupported
 from .exc import unimplemented
 from .guards import CheckFunctionManager
 from .guards import GuardedCode
+from .prefetch import prefetch_resume_functions
 from .replay_record import ExecutionRecord
 from .symbolic_convert import InstructionTranslator
 from .utils import CleanupManager
 from .utils import counters
+from .utils import dynamic_shape_codes
 from .utils import dynamo_timed
 from .utils import filter_stack
 from .utils import format_bytecode
+from .utils import format_func_info
 from .utils import gen_record_file_name
 from .utils import guard_failures
 from .utils import init_logging
 from .utils import is_namedtuple
 from .utils import istype
 from .utils import orig_code_map
+from .utils import size_guard_failures
 from .utils import troubleshooting_url
 from .utils import write_record_to_file
 
@@ -126,9 +135,46 @@ def wrap_convert_context(fn):
     return _fn
 
 
+_prefilter_allowed_ids = None
+
+
+def update_frame_prefilter():
+    """Hand what has_tensor_in_frame() checks to _eval_frame.c if
+    config.frame_prefilter is set, so it rejects frames without calling us.
+    Runs on entering an optimize() context, so changes to the config apply
+    from the next call of an optimized function."""
+    global _prefilter_allowed_ids
+    allowed_ids = _allowed_function_ids() if config.frame_prefilter else None
+    if allowed_ids is _prefilter_allowed_ids:
+        return
+    _prefilter_allowed_ids = allowed_ids
+    if allowed_ids is None:
+        set_frame_prefilter(None)
+        # the callback decides about the frames rejected so far again
+        for weak_code in prefiltered_code_objects:
+            code = weak_code()
+            if code:
+                reset_code(code)
+        prefiltered_code_objects.clear()
+    else:
+        set_frame_prefilter(
+            allowed_ids,
+            (
+                torch._ops.OpOverloadPacket,
+                torch._ops.OpOverload,
+                torch._ops._OpNamespace,
+            ),
+            (torch.Tensor, torch.nn.Module),
+            always_optimize_code_objects.values,
+            prefiltered_code_objects,
+        )
+
+
 @TorchPatcher.suppress_torch_distributed_warnings
 def has_tensor_in_frame(frame):
     """Check if the frame has torch.* related bits"""
+    update_frame_prefilter()
+
     # Check if the function was decorated using torchdynamo.optimize
     if frame.f_code in always_optimize_code_objects:
         return True
@@ -310,14 +356,22 @@ def convert_frame_assert(
                 # We could add a verbose mode if needed
                 return f"{str(guard_failures[code][-1])}"
 
-            assert code in guard_failures, "TODO(whc) any other recompile reasons?"
-            log.warning(
-                f"torchdynamo hit config.cache_size_limit ({config.cache_size_limit})\n"
-                + f"   function: {format_func_info(code)}\n"
-                + f"   reasons:  {format_guard_failures(code)}\n"
-                + f"to diagnose recompilation issues, see {troubleshooting_url}."
-            )
-            unimplemented("cache_size_limit reached")
+            if config.cache_eviction_policy == "lru":
+                # make room for the variant about to be compiled
+                evicted = evict_cache_entries(code, config.cache_size_limit - 1)
+                counters["cache_eviction"][format_func_info(code)] += evicted
+                log.debug(
+                    f"evicted {evicted} cache entries of {format_func_info(code)}"
+                )
+            else:
+                assert code in guard_failures, "TODO(whc) any other recompile reasons?"
+                log.warning(
+                    f"torchdynamo hit config.cache_size_limit ({config.cache_size_limit})\n"
+                    + f"   function: {format_func_info(code)}\n"
+                    + f"   reasons:  {format_guard_failures(code)}\n"
+                    + f"to diagnose recompilation issues, see {troubleshooting_url}."
+                )
+                unimplemented("cache_size_limit reached")
 
         if not has_tensor_in_frame(frame):
             return None
@@ -335,12 +389,39 @@ def convert_frame_assert(
             export,
             guard_export_fn,
             frame,
+            dynamic_shapes=config.dynamic_shapes or promote_dynamic_shapes(code),
         )
 
     _convert_frame_assert._torchdynamo_orig_callable = compiler_fn
     return wrap_convert_context(_convert_frame_assert)
 
 
+def promote_dynamic_shapes(code: types.CodeType):
+    """
+    True if code should be compiled with dynamic shapes because the sizes of
+    its inputs keep changing, see config.automatic_dynamic_shapes.  Once
+    promoted, every later compile of code is dynamic too.
+    """
+    if config.dynamic_shapes or not config.automatic_dynamic_shapes:
+        return False
+    if code in dynamic_shape_codes:
+        return True
+    dims = [
+        f"{name}.size({dim})"
+        for (name, dim), count in size_guard_failures.get(code, {}).items()
+        if count >= config.automatic_dynamic_shapes_threshold
+    ]
+    if not dims:
+        return False
+    dynamic_shape_codes.add(code)
+    counters["automatic_dynamic_shapes"][format_func_info(code)] += 1
+    log.info(
+        f"compiling {format_func_info(code)} with dynamic shapes, "
+        f"{', '.join(dims)} changed"
+    )
+    return True
+
+
 def _compile(
     code,
     globals,
@@ -351,7 +432,18 @@ def _compile(
     export,
     guard_export_fn=None,
     frame=None,
+    resume_calls=None,
+    dynamic_shapes=None,
 ):
+    """
+    Convert code to a GuardedCode.  When resume_calls is a list, the code is
+    a resume function being compiled ahead by prefetch_resume_functions():
+    the calls to resume functions of its output are appended to it and
+    errors are left to the caller.  dynamic_shapes overrides
+    config.dynamic_shapes for this compile only.
+    """
+    if dynamic_shapes is None:
+        dynamic_shapes = config.dynamic_shapes
     output = None
 
     # from .utils import print_once;  print_once(code.co_filename)
@@ -367,6 +459,7 @@ def _compile(
             compiler_fn,
             one_graph,
             export,
+            dynamic_shapes,
         )
         tracer.run()
         output = tracer.output
@@ -420,9 +513,17 @@ def _compile(
 
         assert output.guards is not None
         CleanupManager.instance[out_code] = output.cleanups
-        check_fn = CheckFunctionManager(output.guards, locals, globals)
+        check_fn = CheckFunctionManager(
+            output.guards, locals, globals, code, output.dynamic_shapes
+        )
 
-        guarded_code = GuardedCode(out_code, check_fn.check_fn)
+        guarded_code = GuardedCode(
+            out_code,
+            check_fn.check_fn,
+            check_fn.dispatch_key_fn,
+            check_fn.dispatch_key,
+            check_fn.shared_check_fn,
+        )
         guard_str = "GUARDS:\n"
         guard_str += "\n".join([f" - {str(guard)}" for guard in sorted(output.guards)])
 
@@ -431,6 +532,13 @@ def _compile(
         if guard_export_fn is not None:
             guard_export_fn(output.guards)
 
+        if resume_calls is not None:
+            resume_calls.extend(output.resume_calls)
+        elif output.resume_calls:
+            prefetch_resume_functions(
+                output.resume_calls, globals, locals, builtins, compiler_fn
+            )
+
         return guarded_code
     except (
         Unsupported,
@@ -438,10 +546,12 @@ def _compile(
         BackendCompilerFailed,
         AssertionError,
     ) as e:
-        exception_handler(e, code, frame)
+        if resume_calls is None:
+            exception_handler(e, code, frame)
         raise
     except Exception as e:
-        exception_handler(e, code, frame)
+        if resume_calls is None:
+            exception_handler(e, code, frame)
         raise InternalTorchDynamoError()
 
 
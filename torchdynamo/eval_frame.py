@@ -21,9 +21,11 @@ from . import convert_frame
 from . import logging as torchdynamo_logging
 from . import skipfiles
 from . import utils
+from .background_compile import BackgroundCompiler
 from .exc import ResetRequired
 from .mutation_guard import install_generation_tagging_init
 from .optimizations.distributed import DDPOptimizer
+from .shape_buckets import ShapeBuckets
 from .utils import checkpoint_params
 from .utils import clone_inputs
 from .utils import compile_times
@@ -43,11 +45,25 @@ except (ModuleNotFoundError, ImportError):
 
 set_eval_frame = _eval_frame.set_eval_frame
 reset_code = _eval_frame.reset_code
+cache_entry_stats = _eval_frame.cache_entry_stats
+evict_cache_entries = _eval_frame.evict_cache_entries
+add_cache_entry = _eval_frame.add_cache_entry
+set_lookup_profile_interval = _eval_frame.set_lookup_profile_interval
+lookup_stats = _eval_frame.lookup_stats
 unsupported = _eval_frame.unsupported
 skip_code = _eval_frame.skip_code
 set_guard_fail_hook = _eval_frame.set_guard_fail_hook
 set_guard_error_hook = _eval_frame.set_guard_error_hook
+set_skip_files = _eval_frame.set_skip_files
+set_frame_prefilter = _eval_frame.set_frame_prefilter
+prefilter_stats = _eval_frame.prefilter_stats
+
+# new code objects of files skipfiles.check() skips don't call back into python
+set_skip_files(skipfiles.CHECK_CACHE)
+
 always_optimize_code_objects = utils.ExactWeakKeyDictionary()
+# weakrefs to the code objects set_frame_prefilter() skipped, for reset()
+prefiltered_code_objects = []
 null_context = contextlib.nullcontext
 unset = object()
 compile_lock = threading.RLock()
@@ -101,10 +117,12 @@ class _TorchDynamoContext:
         backend_ctx_ctor=null_context,
         patch_fn=nothing,
         first_ctx=False,
+        shape_buckets=None,
     ):
         super().__init__()
         assert callable(callback) or callback is False or callback is None
         self.callback = callback
+        self.shape_buckets = shape_buckets
         self.prior = unset
         self.on_enter = on_enter
         self.extra_ctx_ctor = backend_ctx_ctor
@@ -179,6 +197,9 @@ class _TorchDynamoContext:
                 if self.first_ctx:
                     _step_logger()(logging.INFO, "torchdynamo done tracing")
 
+        if self.shape_buckets is not None:
+            _fn = self.shape_buckets.wrap(_fn)
+
         # hooks to properly handle inlining
         if isinstance(self, DisableContext):
             _fn._torchdynamo_disable = True
@@ -197,8 +218,20 @@ class _TorchDynamoContext:
         return _fn
 
 
+_applied_lookup_profile_interval = 0
+
+
+def update_lookup_profile_interval():
+    """Hand config.lookup_profile_interval to _eval_frame.c when it changed,
+    leaving an interval set by utils.profile_lookups() alone otherwise"""
+    global _applied_lookup_profile_interval
+    if config.lookup_profile_interval != _applied_lookup_profile_interval:
+        _applied_lookup_profile_interval = config.lookup_profile_interval
+        set_lookup_profile_interval(config.lookup_profile_interval)
+
+
 class OptimizeContext(_TorchDynamoContext):
-    def __init__(self, callback, backend_ctx_ctor, first_ctx=False):
+    def __init__(self, callback, backend_ctx_ctor, first_ctx=False, shape_buckets=None):
         def on_enter():
             global most_recent_backend
             if (
@@ -208,6 +241,8 @@ class OptimizeContext(_TorchDynamoContext):
                 raise ResetRequired()
             most_recent_backend = compiler_fn
             install_generation_tagging_init()
+            convert_frame.update_frame_prefilter()
+            update_lookup_profile_interval()
 
         compiler_fn = innermost_fn(callback)
         super().__init__(
@@ -216,6 +251,7 @@ class OptimizeContext(_TorchDynamoContext):
             backend_ctx_ctor=backend_ctx_ctor,
             patch_fn=TorchPatcher.patch,
             first_ctx=first_ctx,
+            shape_buckets=shape_buckets,
         )
 
 
@@ -266,11 +302,14 @@ def catch_errors_wrapper(callback):
     return catch_errors
 
 
-def _optimize_catch_errors(compile_fn, backend_ctx_ctor=null_context):
+def _optimize_catch_errors(
+    compile_fn, backend_ctx_ctor=null_context, shape_buckets=None
+):
     return OptimizeContext(
         catch_errors_wrapper(compile_fn),
         backend_ctx_ctor=backend_ctx_ctor,
         first_ctx=True,
+        shape_buckets=shape_buckets,
     )
 
 
@@ -342,7 +381,13 @@ class _NullDecorator(contextlib.nullcontext):
 
 
 def optimize(
-    backend="inductor", *, nopython=False, guard_export_fn=None, disable=False
+    backend="inductor",
+    *,
+    nopython=False,
+    guard_export_fn=None,
+    disable=False,
+    background_compile=False,
+    shape_buckets=None,
 ):
     """
     The main entrypoint of TorchDynamo.  Do graph capture and call
@@ -360,6 +405,11 @@ def optimize(
         nopython: If True, graph breaks will be errors and there will
             be a single whole-program graph.
         disable: If True, turn this decorator into a no-op
+        background_compile: If True, run new graphs eagerly while backend()
+            compiles them on a worker thread, see BackgroundCompiler.
+        shape_buckets: A ShapeBuckets, or a dict of {argument name: dim(s)}
+            to pad to the next power of two.  Bounds the number of compiled
+            variants for inputs of varying size, see ShapeBuckets.
 
     Example Usage:
 
@@ -375,11 +425,21 @@ def optimize(
     # Find if backend has any extra context manager
     backend_ctx_ctor = getattr(backend, "backend_ctx_ctor", null_context)
 
+    if background_compile:
+        backend = BackgroundCompiler(lookup_backend(backend))
+        backend.backend_ctx_ctor = backend_ctx_ctor
+
+    if isinstance(shape_buckets, dict):
+        shape_buckets = ShapeBuckets(shape_buckets)
+
     if nopython:
-        return optimize_assert(backend, guard_export_fn=guard_export_fn)
+        return optimize_assert(
+            backend, guard_export_fn=guard_export_fn, shape_buckets=shape_buckets
+        )
     return _optimize_catch_errors(
         convert_frame.convert_frame(backend, guard_export_fn=guard_export_fn),
         backend_ctx_ctor,
+        shape_buckets,
     )
 
 
@@ -595,7 +655,7 @@ def assume_constant_result(fn):
     return fn
 
 
-def optimize_assert(backend, *, guard_export_fn=None, export=False):
+def optimize_assert(backend, *, guard_export_fn=None, export=False, shape_buckets=None):
     """
     The same as `torchdynamo.optimize(backend, nopython=True)`
     """
@@ -607,6 +667,7 @@ def optimize_assert(backend, *, guard_export_fn=None, export=False):
     return _optimize_catch_errors(
         convert_frame.convert_frame_assert(backend, guard_export_fn, export=export),
         backend_ctx_ctor,
+        shape_buckets,
     )
 
 
@@ -0,0 +1,134 @@
+import torch
+
+from .utils import counters
+from .utils import fake_tensors_available
+
+if fake_tensors_available:
+    from torch._subclasses import FakeTensor
+
+_constant_types = (
+    int,
+    float,
+    bool,
+    str,
+    type(None),
+    torch.dtype,
+    torch.device,
+    torch.layout,
+    torch.memory_format,
+)
+
+
+def _arg_key(value, tensors):
+    """Hashable stand in for an argument of a proxy node, or None"""
+    if type(value) is FakeTensor:
+        tensors.append(value)
+        return (
+            "tensor",
+            tuple(value.size()),
+            value.stride(),
+            value.storage_offset(),
+            value.dtype,
+            value.device,
+            value.layout,
+            value.requires_grad,
+        )
+    if type(value) in _constant_types:
+        return type(value), value
+    if type(value) in (tuple, list, torch.Size):
+        keys = []
+        for item in value:
+            key = _arg_key(item, tensors)
+            if key is None:
+                return None
+            keys.append(key)
+        return type(value), tuple(keys)
+    if type(value) is dict:
+        keys = []
+        for name, item in value.items():
+            key = _arg_key(item, tensors)
+            if key is None or type(name) is not str:
+                return None
+            keys.append((name, key))
+        return dict, tuple(keys)
+    return None
+
+
+class FakePropagationCache:
+    """
+    Metadata of the FakeTensors computed by TensorVariable.run_example(),
+    keyed by the op and the metadata of its inputs, so an op traced again
+    with the same inputs (every layer of a transformer) gets a fresh
+    FakeTensor from torch.empty_strided() rather than running its meta
+    kernel.  Only ops returning one new (non view, non input) tensor that
+    doesn't require grad are cached, empty_strided() can't make the
+    non-leaf with a grad_fn autograd would return.  See
+    config.fake_propagation_cache.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    @staticmethod
+    def key(node, args, kwargs):
+        """(key, input tensors) for node called with args/kwargs, key is
+        None if the call can't be cached"""
+        if node.op == "call_function":
+            target = node.target
+        elif node.op == "call_method" and not node.target.endswith("_"):
+            target = node.target
+        else:
+            return None, ()
+        if "out" in kwargs:
+            return None, ()
+        tensors = []
+        args_key = _arg_key((tuple(args), dict(kwargs)), tensors)
+        if args_key is None:
+            return None, ()
+        key = (
+            node.op,
+            target,
+            args_key,
+            torch.is_grad_enabled(),
+            torch.get_default_dtype(),
+            torch.is_autocast_enabled(),
+            torch.get_autocast_gpu_dtype(),
+            torch.is_autocast_cpu_enabled(),
+            torch.get_autocast_cpu_dtype(),
+        )
+        try:
+            hash(key)
+        except TypeError:
+            return None, ()
+        return key, tensors
+
+    def get(self, key, context):
+        """A new FakeTensor like the one saved under key, or None"""
+        if key is None:
+            counters["fake_cache"]["uncacheable"] += 1
+            return None
+        meta = self.entries.get(key)
+        if meta is None:
+            counters["fake_cache"]["misses"] += 1
+            return None
+        counters["fake_cache"]["hits"] += 1
+        size, stride, dtype, device = meta
+        with context():
+            return torch.empty_strided(size, stride, dtype=dtype, device=device)
+
+    def put(self, key, inputs, value):
+        if key is None or type(value) is not FakeTensor:
+            return
+        if (
+            value._is_view()
+            or value.requires_grad
+            or value.storage_offset() != 0
+            or any(value is tensor for tensor in inputs)
+        ):
+            return
+        self.entries[key] = (
+            tuple(value.size()),
+            value.stride(),
+            value.dtype,
+            value.device,
+        )
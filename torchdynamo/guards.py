@@ -1,3 +1,4 @@
+import ast
 import collections
 import dataclasses
 import enum
@@ -23,18 +24,22 @@ import torch
 from . import config
 from . import convert_frame
 from . import mutation_guard
+from ._guards import NativeGuards
 from ._guards import TensorGuards
 from ._guards import check_obj_id
 from ._guards import check_type_id
+from ._guards import dispatch_key
 from .eval_frame import set_guard_error_hook
 from .eval_frame import set_guard_fail_hook
 from .exc import unimplemented
+from .utils import ExactWeakKeyDictionary
 from .utils import dict_const_keys
 from .utils import dict_param_key_ids
 from .utils import guard_failures
 from .utils import istype
 from .utils import orig_code_map
 from .utils import rename_implicit
+from .utils import size_guard_failures
 from .utils import tuple_iterator_getitem
 from .utils import tuple_iterator_len
 
@@ -169,9 +174,7 @@ def strip_getattr_getitem(name):
 
 
 class GuardBuilder:
-    def __init__(
-        self, id_ref: Callable, scope: Dict[str, Any], guarded_code, renames=True
-    ):
+    def __init__(self, id_ref: Callable, scope: Dict[str, Any], validity, renames=True):
         self.id_ref = id_ref
         if scope:
             if renames:
@@ -184,7 +187,7 @@ class GuardBuilder:
         self.code: List[str] = []
         self.tensor_check_names = []
         self.tensor_check_examples = []
-        self.guarded_code = guarded_code
+        self.validity = validity
 
     def get(self, name: str):
         return eval(name, self.scope, CLOSURE_VARS)
@@ -403,7 +406,7 @@ class GuardBuilder:
         self._produce_guard_code(guard, code)
 
     def OBJECT_MUTATION(self, guard: Guard):
-        mutation_guard.watch(self.get(guard.name), self.guarded_code)
+        mutation_guard.watch(self.get(guard.name), self.validity)
 
     def GRAD_MODE(self, guard: Guard):
         """Guard on the initial grad state"""
@@ -470,10 +473,230 @@ class GuardBuilder:
         )
 
 
+class NativeGuardNode:
+    """A value reached from a scope, with the checks run on it in order"""
+
+    def __init__(self):
+        self.leaves = []
+        self.children = collections.OrderedDict()
+
+    def child(self, accessor, key):
+        if (accessor, key) not in self.children:
+            self.children[(accessor, key)] = NativeGuardNode()
+        return self.children[(accessor, key)]
+
+    def spec(self):
+        children = [(a, k, node.spec()) for (a, k), node in self.children.items()]
+        return (self.leaves, children)
+
+
+def literal_set(value):
+    return set(ast.literal_eval(value))
+
+
+class NativeGuardBuilder:
+    """
+    Lower guard code parts into a tree of C++ guard nodes, see NativeGuards in
+    _guards.cpp.  Values referenced by more than one guard (e.g. `self` in
+    `self.a` and `self.b`) are only looked up once.  Parts that don't match
+    one of the patterns below stay in a python lambda which is called once
+    the native checks pass.
+    """
+
+    # keep in sync with LeafKind/AccessorKind in _guards.cpp
+    TYPE_ID, OBJ_ID, EQUALS, LEN, DICT_KEYS, TENSOR, GRAD_MODE = range(7)
+    DICT_ITEM, GETATTR, GETITEM = range(3)
+
+    accessor_re = r"\.([a-zA-Z_]\w*)|\[(-?\d+|'[^'\\]*')\]"
+    ref_re = r"[a-zA-Z_]\w*(?:\.[a-zA-Z_]\w*|\[(?:-?\d+|'[^'\\]*')\])*"
+    patterns = [
+        (re.compile(rf"___check_type_id\(({ref_re}), (\d+)\)"), TYPE_ID, int),
+        (re.compile(rf"___check_obj_id\(({ref_re}), (\d+)\)"), OBJ_ID, int),
+        (re.compile(rf"len\(({ref_re})\) == (\d+)"), LEN, int),
+        (re.compile(rf"set\(({ref_re})\.keys\(\)\) == (.+)"), DICT_KEYS, literal_set),
+        (re.compile(rf"({ref_re}) == (.+)"), EQUALS, ast.literal_eval),
+    ]
+
+    def __init__(self, local_builder, global_builder, closure_vars):
+        self.local_builder = local_builder
+        self.global_builder = global_builder
+        self.closure_vars = closure_vars
+        self.closure_root = NativeGuardNode()
+        self.local_root = NativeGuardNode()
+        self.global_root = NativeGuardNode()
+
+    def lookup(self, ref, builder=None):
+        """Find (or add) the node for `ref`, None if it can't be lowered"""
+        if not re.fullmatch(self.ref_re, ref):
+            return None
+        base = strip_getattr_getitem(ref)
+        # same name resolution as the python lambda: args, closure, globals
+        if builder is self.local_builder and base in builder.argnames:
+            node = self.local_root
+            key = ".0" if base == "___implicit0" else base
+        elif base in self.closure_vars:
+            node, key = self.closure_root, base
+        elif builder is self.global_builder and base in builder.scope:
+            node, key = self.global_root, base
+        else:
+            return None
+        node = node.child(self.DICT_ITEM, key)
+        for attr, item in re.findall(self.accessor_re, ref[len(base) :]):
+            if attr:
+                node = node.child(self.GETATTR, attr)
+            else:
+                node = node.child(self.GETITEM, ast.literal_eval(item))
+        return node
+
+    def lower(self, part, builder):
+        """Add `part` to the tree, returns False if it can't be lowered"""
+        if part == "___guarded_code.valid":
+            self.lookup(part).leaves.append((self.EQUALS, True))
+            return True
+        if part in ("___is_grad_enabled()", "not ___is_grad_enabled()"):
+            enabled = part == "___is_grad_enabled()"
+            self.closure_root.leaves.append((self.GRAD_MODE, enabled))
+            return True
+        for pattern, kind, convert in self.patterns:
+            m = pattern.fullmatch(part)
+            if not m:
+                continue
+            ref, value = m.groups()
+            try:
+                value = convert(value)
+            except (ValueError, TypeError, SyntaxError):
+                return False
+            node = self.lookup(ref, builder)
+            if node is None:
+                return False
+            node.leaves.append((kind, value))
+            return True
+        return False
+
+    def lower_tensors(self, names):
+        builders = [self.local_builder] * len(self.local_builder.tensor_check_names)
+        builders += [self.global_builder] * len(self.global_builder.tensor_check_names)
+        nodes = [self.lookup(name, b) for name, b in zip(names, builders)]
+        if None in nodes:
+            return False
+        for index, node in enumerate(nodes):
+            node.leaves.append((self.TENSOR, index))
+        return True
+
+    def roots(self):
+        roots = [
+            (self.closure_vars, self.closure_root),
+            (None, self.local_root),
+            (self.global_builder.scope, self.global_root),
+        ]
+        return [
+            (scope, node.spec()) for scope, node in roots if node.spec() != ([], [])
+        ]
+
+    def compile(self, parts, tensor_guards, make_guard_fn):
+        """NativeGuards for [(part, builder), ...] and tensor_guards"""
+        residual = [part for part, source in parts if not self.lower(part, source)]
+        tensor_check_names = self.closure_vars.get("tensor_check_names")
+        if tensor_check_names and not self.lower_tensors(tensor_check_names):
+            tensor_guards = None
+            residual.append(f"___check_tensors({', '.join(tensor_check_names)})")
+        residual_fn = None
+        if residual:
+            residual_fn = make_guard_fn(" and ".join(unique(residual)))
+        return NativeGuards(self.roots(), tensor_guards, residual_fn)
+
+
 @dataclasses.dataclass
 class GuardedCode:
     code: types.CodeType
     check_fn: Callable
+    # see config.guard_dispatch and _eval_frame.c
+    dispatch_key_fn: Optional[Callable] = None
+    dispatch_key: Optional[int] = None
+    # see config.share_guards, check_fn assumes this has passed
+    shared_check_fn: Optional[Callable] = None
+
+
+def make_lambda(args: str, code: str, closure_vars: Dict[str, Any], scope):
+    py_code = textwrap.dedent(
+        f"""
+        def ___make_guard_fn({','.join(closure_vars.keys())}):
+            return lambda {args}: {code}
+        """
+    )
+    out = dict()
+    exec(py_code, scope, out)
+    return out["___make_guard_fn"](*closure_vars.values())
+
+
+# code object -> guards on globals checked once per call for all the cache
+# entries of that code object which share them, see config.share_guards
+shared_check_fns = ExactWeakKeyDictionary()
+
+
+def make_shared_check_fn(global_builder: GuardBuilder):
+    parts = list(unique(global_builder.code))
+    if not parts:
+        return None
+
+    def make_guard_fn(code):
+        return make_lambda(
+            "**___kwargs_ignored", code, CLOSURE_VARS, global_builder.scope
+        )
+
+    if config.native_guards:
+        builder = NativeGuardBuilder(None, global_builder, CLOSURE_VARS)
+        shared_fn = builder.compile(
+            [(part, global_builder) for part in parts], None, make_guard_fn
+        )
+    else:
+        shared_fn = make_guard_fn(" and ".join(parts))
+    shared_fn.code_parts = parts
+    return shared_fn
+
+
+# code object -> lambda computing the dispatch key of its tensor arguments,
+# shared by every cache entry of that code object
+dispatch_key_fns = ExactWeakKeyDictionary()
+
+
+def make_dispatch_key_fn(
+    f_code: types.CodeType, scope: Dict[str, Any], dynamic_shapes: bool
+):
+    """
+    Build `lambda <tensor args>, **___kwargs_ignored: ___dispatch_key(...)`
+    over the arguments of f_code that hold tensors in scope.
+    """
+    argnames = f_code.co_varnames[: f_code.co_argcount + f_code.co_kwonlyargcount]
+    names = [name for name in argnames if isinstance(scope.get(name), torch.Tensor)]
+    if not names:
+        return None
+    args = ", ".join(names)
+    key_fn = eval(
+        f"lambda {args}, **___kwargs_ignored: "
+        f"___dispatch_key({args}, dynamic_shapes={dynamic_shapes})",
+        {"___dispatch_key": dispatch_key},
+    )
+    key_fn.names = names
+    key_fn.dynamic_shapes = dynamic_shapes
+    return key_fn
+
+
+class GuardValidity:
+    """
+    ___guarded_code in the closure of a check_fn, which fails once this is
+    invalidated by a guarded object dying or a watched nn.Module mutating.
+    It references nothing, so the check_fn (and the weakrefs it keeps in
+    check_fn.weakrefs) are freed by refcounting with their cache entry.
+    """
+
+    __slots__ = ("valid", "__weakref__")
+
+    def __init__(self):
+        self.valid = True
+
+    def invalidate(self, ref=None):
+        self.valid = False
 
 
 # NB: Naively, you'd expect this to only be a function that produces
@@ -482,18 +705,21 @@ class GuardedCode:
 # locals/globals get invalidated, so there's some extra state
 # we have to hold in this manager class.
 #
-# TODO: this object has reference cycle with itself, via check_fn which
-# references back to CheckFunction via ___guarded_code in closure_vars.
-# Ideally, there shouldn't be any ref cycle so that guards are
-# promptly disposed of.
+# check_fn doesn't reference this object, only self.validity, so there is
+# no reference cycle and the guards are promptly disposed of.
 class CheckFunctionManager:
     def __init__(
         self,
         guards: Optional[Set[Guard]] = None,
         f_locals: Optional[Dict] = None,
         f_globals: Optional[Dict] = None,
+        f_code: Optional[types.CodeType] = None,
+        dynamic_shapes: Optional[bool] = None,
     ):
-        self.valid = True
+        if dynamic_shapes is None:
+            dynamic_shapes = config.dynamic_shapes
+        self.dynamic_shapes = dynamic_shapes
+        self.validity = GuardValidity()
         self._weakrefs = []
         self._seen_ids = set()
 
@@ -508,16 +734,59 @@ class CheckFunctionManager:
             return {**left, **right}
 
         local_builder = GuardBuilder(
-            self.id_ref, combine_scopes(f_globals, f_locals), self, renames=True
+            self.id_ref,
+            combine_scopes(f_globals, f_locals),
+            self.validity,
+            renames=True,
+        )
+        global_builder = GuardBuilder(
+            self.id_ref, f_globals, self.validity, renames=False
         )
-        global_builder = GuardBuilder(self.id_ref, f_globals, self, renames=False)
         for guard in sorted(guards or [], key=Guard.sort_key):
             if not config.guard_nn_modules and guard.is_nn_module():
                 continue
             guard.create(local_builder, global_builder)
+        self.shared_check_fn = None
+        self.shared_parts = set()
+        if config.share_guards and f_code is not None:
+            self.compile_shared_check_fn(f_code, global_builder)
         self.check_fn = self.compile_check_fn(local_builder, global_builder)
+        # the weakrefs only invalidate the guards while they are alive
+        self.check_fn.weakrefs = self._weakrefs
+        self.dispatch_key_fn = None
+        self.dispatch_key = None
+        if config.guard_dispatch and f_code is not None:
+            self.compile_dispatch_key(f_code, local_builder)
         self._seen_ids.clear()
 
+    def compile_dispatch_key(self, f_code, local_builder):
+        if f_code not in dispatch_key_fns:
+            dispatch_key_fns[f_code] = make_dispatch_key_fn(
+                f_code, local_builder.scope, self.dynamic_shapes
+            )
+        key_fn = dispatch_key_fns[f_code]
+        if key_fn is None:
+            return
+        self.dispatch_key_fn = key_fn
+        # The key is only a valid index if these guards check every property
+        # it hashes, otherwise this entry must be checked on every call
+        if set(key_fn.names) <= set(local_builder.tensor_check_names) and (
+            key_fn.dynamic_shapes or not self.dynamic_shapes
+        ):
+            self.dispatch_key = key_fn(**local_builder.scope)
+
+    def compile_shared_check_fn(self, f_code, global_builder):
+        if f_code not in shared_check_fns:
+            shared_check_fns[f_code] = make_shared_check_fn(global_builder)
+        shared_fn = shared_check_fns[f_code]
+        if shared_fn is None:
+            return
+        # Entries that check everything the first entry checked on globals
+        # can skip those guards, _eval_frame.c runs shared_fn once for them
+        if set(shared_fn.code_parts) <= set(global_builder.code):
+            self.shared_check_fn = shared_fn
+            self.shared_parts = set(shared_fn.code_parts)
+
     def compile_check_fn(self, local_builder, global_builder):
         assert not (set(local_builder.argnames) & set(global_builder.argnames))
         # see parallel handling of ".0" / "___implicit0" in _eval_frame.c
@@ -537,6 +806,8 @@ class CheckFunctionManager:
         tensor_check_names = (
             local_builder.tensor_check_names + global_builder.tensor_check_names
         )
+        tensor_guards = None
+        tensor_check_sizes = None
         check_tensors_fn = None
         check_tensors_verbose_fn = None
         if tensor_check_names:
@@ -545,8 +816,12 @@ class CheckFunctionManager:
                 + global_builder.tensor_check_examples
             )
             tensor_guards = TensorGuards(
-                *tensor_check_examples, dynamic_shapes=config.dynamic_shapes
+                *tensor_check_examples, dynamic_shapes=self.dynamic_shapes
             )
+            if not self.dynamic_shapes:
+                tensor_check_sizes = [
+                    tuple(example.size()) for example in tensor_check_examples
+                ]
             check_tensors_fn = tensor_guards.check
             check_tensors_verbose_fn = tensor_guards.check_verbose
             code_parts.append(f"___check_tensors({', '.join(tensor_check_names)})")
@@ -555,45 +830,71 @@ class CheckFunctionManager:
             )
             verbose_code_parts.append(f"___check_tensors_verbose({verbose_args})")
 
-        code = " and ".join(unique(code_parts))
+        code = " and ".join(
+            part for part in unique(code_parts) if part not in self.shared_parts
+        )
 
         closure_vars = collections.OrderedDict(
             [
-                ("___guarded_code", self),
+                ("___guarded_code", self.validity),
                 ("___check_tensors", check_tensors_fn),
                 ("___check_tensors_verbose", check_tensors_verbose_fn),
                 ("tensor_check_names", tensor_check_names),
             ]
         )
         closure_vars.update(CLOSURE_VARS)
-        py_code = textwrap.dedent(
-            f"""
-            def ___make_guard_fn({','.join(closure_vars.keys())}):
-                return lambda {args}: {code}
-            """
-        )
+
+        def make_guard_fn(code):
+            return make_lambda(args, code, closure_vars, global_builder.scope)
+
         if os.environ.get("TORCHDYNAMO_PRINT_GUARDS", None) == "1":
             print("GUARDS", code)
         set_guard_fail_hook(guard_fail_hook)
-        out = dict()
-        exec(py_code, global_builder.scope, out)
-        guard_fn = out["___make_guard_fn"](*closure_vars.values())
+        if config.native_guards:
+            guard_fn = self.compile_native_check_fn(
+                local_builder,
+                global_builder,
+                closure_vars,
+                tensor_guards,
+                make_guard_fn,
+            )
+        else:
+            guard_fn = make_guard_fn(code)
         guard_fn.closure_vars = closure_vars
         # TODO(whc) maybe '.code_parts' was only kept around for the guard callback? so we don't need both
         guard_fn.code_parts = code_parts
         guard_fn.verbose_code_parts = verbose_code_parts
         guard_fn.global_scope = global_builder.scope
+        guard_fn.tensor_check_names = tensor_check_names
+        guard_fn.tensor_check_sizes = tensor_check_sizes
         return guard_fn
 
+    def compile_native_check_fn(
+        self, local_builder, global_builder, closure_vars, tensor_guards, make_guard_fn
+    ):
+        parts = [("___guarded_code.valid", None)]
+        parts += [(part, local_builder) for part in local_builder.code]
+        parts += [
+            (part, global_builder)
+            for part in global_builder.code
+            if part not in self.shared_parts
+        ]
+        builder = NativeGuardBuilder(local_builder, global_builder, closure_vars)
+        return builder.compile(parts, tensor_guards, make_guard_fn)
+
+    @property
+    def valid(self):
+        return self.validity.valid
+
     def invalidate(self, ref):
         # A weakref is no longer valid, self.check_fn should return false
-        self.valid = False
+        self.validity.invalidate(ref)
 
     def id_ref(self, obj):
         """add a weakref, return the id"""
         try:
             if id(obj) not in self._seen_ids:
-                self._weakrefs.append(weakref.ref(obj, self.invalidate))
+                self._weakrefs.append(weakref.ref(obj, self.validity.invalidate))
                 self._seen_ids.add(id(obj))
         except TypeError:
             pass  # cannot weakref bool object
@@ -622,6 +923,38 @@ def guard_fail_hook(
             reasons.append(part)
             break
     guard_failures[orig_code_map[code]].append(reasons)
+    if config.automatic_dynamic_shapes and reasons:
+        record_size_guard_failure(guard_fn, orig_code_map[code], scope, reasons[0])
+
+
+size_mismatch_re = re.compile(r"tensor '.*' (size|strides) mismatch at index")
+
+
+def record_size_guard_failure(
+    guard_fn: Callable, code: types.CodeType, scope: Dict[str, Any], reason: str
+):
+    """
+    If the guards failed on the size of a tensor, find every tensor input and
+    dimension that changed size and count it in size_guard_failures.
+    """
+    if not size_mismatch_re.match(reason) or guard_fn.tensor_check_sizes is None:
+        return
+    dims = []
+    for name, sizes in zip(guard_fn.tensor_check_names, guard_fn.tensor_check_sizes):
+        # TensorGuards stops at the first failure, so later inputs may not
+        # be tensors anymore, and this runs inside guard_fail_hook, which
+        # must not raise
+        try:
+            value = eval(name, guard_fn.global_scope, scope)
+        except Exception:
+            continue
+        if isinstance(value, torch.Tensor) and value.ndim == len(sizes):
+            dims.extend(
+                (name, dim)
+                for dim, (expected, actual) in enumerate(zip(sizes, value.size()))
+                if expected != actual
+            )
+    size_guard_failures[code].update(dims)
 
 
 def guard_error_hook(
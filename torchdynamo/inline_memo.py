@@ -0,0 +1,217 @@
+import dataclasses
+from typing import Any
+from typing import Dict
+from typing import List
+
+import torch
+from torch import fx
+
+from .utils import clone_input
+from .utils import counters
+from .utils import fake_tensors_available
+from .utils import istype
+from .utils import preserve_rng_state
+from .variables.base import VariableTracker
+from .variables.constant import ConstantVariable
+from .variables.lists import TupleVariable
+from .variables.tensor import TensorVariable
+
+if fake_tensors_available:
+    from torch._subclasses import FakeTensor
+
+
+@dataclasses.dataclass
+class InlineMemoEntry:
+    """
+    The FX nodes and result recorded while inlining a call to a pure helper,
+    replayed by later calls with arguments of the same signature.
+    """
+
+    f_globals: Dict[str, Any]
+    arg_nodes: List[fx.Node]
+    nodes: List[fx.Node]
+    result: VariableTracker
+
+
+def arg_signature(value: VariableTracker, tensor_args: List[TensorVariable]):
+    """
+    An abstract, hashable description of an argument: the metadata of
+    tensors, the value of constants and the structure of tuples.  Tensors are
+    appended to tensor_args.  Returns None for anything else, as inlining a
+    call with it may depend on more than the signature captures.
+    """
+    if istype(value, TensorVariable):
+        node = value.as_proxy().node
+        for i, arg in enumerate(tensor_args):
+            if arg.as_proxy().node is node:
+                return ("alias", i)
+        if "example_value" not in node.meta:
+            return None
+        tensor_args.append(value)
+        return (
+            "tensor",
+            value.dtype,
+            value.device,
+            value.size,
+            value.stride,
+            value.requires_grad,
+            value.is_quantized,
+            value.is_contiguous,
+            value.is_sparse,
+            value.class_type,
+        )
+    elif istype(value, ConstantVariable):
+        try:
+            hash(value.value)
+        except TypeError:
+            return None
+        return ("constant", type(value.value), value.value)
+    elif istype(value, TupleVariable):
+        items = tuple(arg_signature(item, tensor_args) for item in value.items)
+        if None in items:
+            return None
+        return ("tuple", items)
+    return None
+
+
+def memo_key(code, sub_locals: Dict[str, VariableTracker]):
+    """Key of a call to code with sub_locals, and its tensor arguments"""
+    tensor_args = []
+    signature = []
+    for name, value in sub_locals.items():
+        sig = arg_signature(value, tensor_args)
+        if sig is None:
+            return None, None
+        signature.append((name, sig))
+    key = (
+        code,
+        torch.is_grad_enabled(),
+        torch.is_autocast_enabled(),
+        tuple(signature),
+    )
+    return key, tensor_args
+
+
+def is_memoizable_result(value: VariableTracker):
+    if istype(value, TensorVariable):
+        return "example_value" in value.as_proxy().node.meta
+    elif istype(value, ConstantVariable):
+        return True
+    elif istype(value, TupleVariable):
+        return all(map(is_memoizable_result, value.items))
+    return False
+
+
+def record(output, key, f_globals, state, tensor_args, result):
+    """
+    Memoize an inlined call that started at checkpoint `state` if all it did
+    was add nodes computing `result` and guards: no graph inputs, side
+    effects, nn_modules or mutated containers, which would all show up in the
+    undo log.  The entry is journaled like the nodes it refers to.  As the
+    helper may have read state that is mutated later, SideEffects clears
+    every entry on a mutation.
+    """
+    if len(output.graphargs) != state.num_graphargs:
+        return
+    for _, args in output.undo_log.entries[state.undo_marker :]:
+        if not args or args[0] is not output.guards:
+            return
+    if not is_memoizable_result(result):
+        return
+
+    nodes = []
+    for node in reversed(output.graph.nodes):
+        if node is state.last_node:
+            break
+        if node.op not in ("call_function", "call_method", "call_module", "get_attr"):
+            return
+        if node.op == "get_attr" and "example_value" not in node.meta:
+            return
+        nodes.append(node)
+    nodes.reverse()
+
+    counters["inline_memo"]["recorded"] += 1
+    entry = InlineMemoEntry(
+        f_globals, [arg.as_proxy().node for arg in tensor_args], nodes, result
+    )
+    output.undo_log.setitem(output.inline_memo, key, entry)
+
+
+def replay(tx, entry: InlineMemoEntry, sub_locals, tensor_args):
+    """
+    Copy the nodes of a memoized call, with the recorded tensor arguments
+    replaced by tensor_args, and return its result.  Example values are
+    recomputed from the new arguments, which also checks they are still
+    valid.  Returns None, with the graph rolled back, if that fails.
+    """
+    output = tx.output
+    state = output.copy_graphstate()
+    try:
+        result = _replay(tx, entry, tensor_args)
+    except Exception:
+        output.restore_graphstate(state)
+        counters["inline_memo"]["replay_failed"] += 1
+        return None
+
+    # the recorded guards are already installed, but the arguments of this
+    # call may have come from other sources
+    output.guards.update(VariableTracker.propagate(list(sub_locals.values()))["guards"])
+    counters["inline_memo"]["hits"] += 1
+    return result
+
+
+def _replay(tx, entry: InlineMemoEntry, tensor_args):
+    output = tx.output
+    args_by_node = dict(zip(entry.arg_nodes, tensor_args))
+    proxies = {node: arg.as_proxy() for node, arg in args_by_node.items()}
+    values = {}
+
+    def as_proxy(node):
+        if node in proxies:
+            return proxies[node]
+        return fx.Proxy(node, output)
+
+    def example_value(node):
+        if node in values:
+            return values[node]
+        return node.meta["example_value"]
+
+    for node in entry.nodes:
+        args, kwargs = fx.node.map_arg((node.args, node.kwargs), as_proxy)
+        proxy = output.create_proxy(node.op, node.target, args, kwargs, current_tx=tx)
+        proxies[node] = proxy
+        if node.op == "get_attr":
+            value = node.meta["example_value"]
+        else:
+            args, kwargs = fx.node.map_arg(
+                (proxy.node.args, proxy.node.kwargs), example_value
+            )
+            nnmodule = None
+            if node.op == "call_module":
+                nnmodule = output.nn_modules[node.target]
+            with preserve_rng_state():
+                value = TensorVariable.run_example(tx, proxy, args, kwargs, nnmodule)
+        if isinstance(value, torch.Tensor):
+            if not fake_tensors_available or not isinstance(value, FakeTensor):
+                value = clone_input(value)
+            proxy.node.meta["example_value"] = value
+        values[proxy.node] = value
+
+    def rebuild(var):
+        if istype(var, TensorVariable):
+            node = var.as_proxy().node
+            if node in args_by_node:
+                return args_by_node[node].add_guards(var.guards)
+            if node in proxies:
+                proxy = proxies[node]
+                return var.clone(
+                    proxy=proxy,
+                    **TensorVariable.specialize(
+                        proxy.node.meta["example_value"], output.dynamic_shapes
+                    ),
+                )
+        elif istype(var, TupleVariable):
+            return var.clone(items=[rebuild(item) for item in var.items])
+        return var
+
+    return rebuild(entry.result)
@@ -0,0 +1,315 @@
+import functools
+import itertools
+import logging
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import torch
+from torch import fx
+from torch.fx.passes.split_module import split_module
+from torch.nn.utils.stateless import functional_call
+
+from ..utils import counters
+
+log = logging.getLogger(__name__)
+
+
+def layer_of(node: fx.Node, layer_keys: Dict[str, Tuple[str, int]]):
+    """
+    The outermost item of a ModuleList or Sequential (e.g. self.layers[3])
+    that created node, as (key of the container, index)
+    """
+    for key in node.meta.get("nn_module_stack", ()):
+        if key in layer_keys:
+            return layer_keys[key]
+    return None
+
+
+def fetch_attr(module: torch.nn.Module, target: str):
+    return functools.reduce(getattr, target.split("."), module)
+
+
+def tensor_signature(value: torch.Tensor):
+    return (
+        type(value),
+        tuple(value.size()),
+        value.stride(),
+        value.dtype,
+        value.device,
+        value.requires_grad,
+    )
+
+
+def module_signature(module: torch.nn.Module):
+    config = {k: v for k, v in vars(module).items() if not k.startswith("_")}
+    tensors = [
+        (name, tensor_signature(value))
+        for name, value in itertools.chain(
+            module.named_parameters(), module.named_buffers()
+        )
+    ]
+    return type(module), config, tensors
+
+
+def layer_signature(submod: fx.GraphModule):
+    """
+    Describes the graph of submod with nodes numbered in order and tensors
+    and modules by their metadata, so two layers with an equal signature
+    compute the same function of their inputs and lifted_names().
+    """
+    index = {}
+    signature = []
+    for node in submod.graph.nodes:
+        index[node] = len(index)
+        args = fx.node.map_arg((node.args, node.kwargs), lambda n: ("%", index[n]))
+        if node.op == "placeholder":
+            target = None
+        elif node.op == "get_attr":
+            target = tensor_signature(fetch_attr(submod, node.target))
+        elif node.op == "call_module":
+            target = module_signature(submod.get_submodule(node.target))
+        else:
+            target = node.target
+        signature.append((node.op, target, args))
+    return signature
+
+
+def same_signature(a, b):
+    try:
+        return bool(a == b)
+    except Exception:
+        # e.g. comparing tensors held in a module's config
+        return False
+
+
+def lifted_names(submod: fx.GraphModule):
+    """Qualified names of the tensors submod reads from its own attributes"""
+    names = []
+    for node in submod.graph.nodes:
+        if node.op == "get_attr":
+            names.append(node.target)
+        elif node.op == "call_module":
+            module = submod.get_submodule(node.target)
+            names.extend(
+                f"{node.target}.{name}"
+                for name, _ in itertools.chain(
+                    module.named_parameters(), module.named_buffers()
+                )
+            )
+    return list(dict.fromkeys(names))
+
+
+def lift_tensors(submod: fx.GraphModule):
+    """
+    A copy of submod that takes the tensors named by lifted_names() as extra
+    inputs, so it can be called with the parameters of any layer with the
+    same signature.  Modules are called with functional_call() and the graph
+    always returns a tuple.
+    """
+    graph = fx.Graph()
+    env = {}
+    nodes = list(submod.graph.nodes)
+    for node in nodes:
+        if node.op == "placeholder":
+            env[node] = graph.placeholder(node.target)
+    lifted = {
+        name: graph.placeholder(f"lifted_{i}")
+        for i, name in enumerate(lifted_names(submod))
+    }
+
+    for node in nodes:
+        if node.op == "placeholder":
+            continue
+        elif node.op == "get_attr":
+            env[node] = lifted[node.target]
+        elif node.op == "call_module":
+            module = submod.get_submodule(node.target)
+            tensors = {
+                name: lifted[f"{node.target}.{name}"]
+                for name, _ in itertools.chain(
+                    module.named_parameters(), module.named_buffers()
+                )
+            }
+            args, kwargs = fx.node.map_arg((node.args, node.kwargs), env.__getitem__)
+            env[node] = graph.call_function(
+                functional_call,
+                (graph.get_attr(node.target), tensors, tuple(args), dict(kwargs)),
+            )
+        elif node.op == "output":
+            (result,) = fx.node.map_arg(node.args, env.__getitem__)
+            graph.output(result if isinstance(result, tuple) else (result,))
+        else:
+            env[node] = graph.node_copy(node, env.__getitem__)
+
+    return fx.GraphModule(submod, graph)
+
+
+class CompiledSubmod(torch.nn.Module):
+    """Calls a compiled partition, appending the tensors lifted out of it"""
+
+    def __init__(self, compiled_fn, lifted: List[torch.Tensor], unwrap_singleton):
+        super().__init__()
+        self.compiled_fn = compiled_fn
+        self.lifted = lifted
+        self.unwrap_singleton = unwrap_singleton
+
+    def forward(self, *args):
+        result = self.compiled_fn(*args, *self.lifted)
+        if self.unwrap_singleton and isinstance(result, (tuple, list)):
+            return result[0]
+        return result
+
+
+def returns_tuple(submod: fx.GraphModule):
+    for node in submod.graph.nodes:
+        if node.op == "output":
+            return isinstance(node.args[0], tuple)
+
+
+def has_example_value(node: fx.Node):
+    return node.op in ("placeholder", "get_attr") or isinstance(
+        node.meta.get("example_value"), torch.Tensor
+    )
+
+
+def example_value(gm: fx.GraphModule, node: fx.Node):
+    """A real tensor like the example value of node, see OutputGraph"""
+    if node.op == "get_attr":
+        return fetch_attr(gm, node.target)
+    value = node.meta["example_value"]
+    result = torch.empty_strided(
+        value.size(), value.stride(), dtype=value.dtype, device=value.device
+    ).zero_()
+    return result.requires_grad_(value.requires_grad)
+
+
+def partition_layers(gm: fx.GraphModule, layer_keys: Dict[str, Tuple[str, int]]):
+    """
+    Number the runs of nodes created by the same layer, and the runs between
+    layers, in order.  Returns the partition of each node and the set of
+    layer partitions.
+    """
+    partitions = {}
+    layer_partitions = set()
+    current = None
+    part = -1
+    for node in gm.graph.nodes:
+        if node.op in ("placeholder", "output"):
+            continue
+        layer = layer_of(node, layer_keys)
+        if part < 0 or layer != current:
+            current = layer
+            part += 1
+            if layer is not None:
+                layer_partitions.add(part)
+        partitions[node] = part
+    return partitions, layer_partitions
+
+
+class RepeatedLayerCompiler:
+    """
+    Wraps a backend to compile the calls to structurally identical layers
+    (e.g. the children of an nn.ModuleList that dynamo inlined one after the
+    other) once.  Like DDPOptimizer, the graph is split into one partition
+    per layer and one for the code between layers, each compiled on its own.
+    Layers with the same signature and input metadata share one compiled
+    function that takes the parameters and buffers of the layer as extra
+    inputs.  See config.repeated_layers.
+
+    Only the inputs of the partition being compiled are allocated as example
+    values, so the memory needed is that of the largest partition rather than
+    every activation of the graph.
+    """
+
+    def __init__(self, backend_compile_fn, layer_keys: Dict[str, Tuple[str, int]]):
+        self.backend_compile_fn = backend_compile_fn
+        self.layer_keys = layer_keys
+        # (signature, input signatures, compiled_fn) of each compiled layer
+        self.blocks = []
+
+    def lookup(self, signature, inputs):
+        for block_signature, block_inputs, compiled_fn in self.blocks:
+            if block_inputs == inputs and same_signature(block_signature, signature):
+                return compiled_fn
+        return None
+
+    def __call__(self, gm: fx.GraphModule, example_inputs: List[torch.Tensor]):
+        partitions, layer_partitions = partition_layers(gm, self.layer_keys)
+        if len(layer_partitions) < 2:
+            return self.backend_compile_fn(gm, example_inputs)
+
+        nodes = {node.name: node for node in gm.graph.nodes}
+        placeholders = [node for node in gm.graph.nodes if node.op == "placeholder"]
+        inputs = {node.name: value for node, value in zip(placeholders, example_inputs)}
+
+        def partition_inputs(submod: fx.GraphModule):
+            # the partitions take the nodes of gm they read by name
+            return [
+                nodes[ph.target] for ph in submod.graph.nodes if ph.op == "placeholder"
+            ]
+
+        def example_inputs_of(submod: fx.GraphModule):
+            return [
+                inputs[node.name] if node.name in inputs else example_value(gm, node)
+                for node in partition_inputs(submod)
+            ]
+
+        split_gm = split_module(gm, None, lambda node: partitions[node])
+        layers = []
+        others = []
+        for node in split_gm.graph.nodes:
+            if node.op != "call_module":
+                continue
+            submod = split_gm.get_submodule(node.target)
+            if not all(map(has_example_value, partition_inputs(submod))):
+                log.debug(f"no example value for an input of {node.target}")
+                return self.backend_compile_fn(gm, example_inputs)
+            if int(node.target[len("submod_") :]) in layer_partitions:
+                layers.append((node, submod, layer_signature(submod)))
+            else:
+                others.append((node, submod))
+
+        signatures = [signature for _, _, signature in layers]
+        if not any(
+            same_signature(a, b) for a, b in itertools.combinations(signatures, 2)
+        ):
+            return self.backend_compile_fn(gm, example_inputs)
+
+        for node, submod in others:
+            unwrap_singleton = not returns_tuple(submod)
+            if unwrap_singleton:
+                # AotAutograd based compilers require a tuple output
+                output = next(n for n in submod.graph.nodes if n.op == "output")
+                output.args = (output.args,)
+                submod.recompile()
+            compiled_fn = self.backend_compile_fn(submod, example_inputs_of(submod))
+            self.replace(
+                split_gm, node, CompiledSubmod(compiled_fn, [], unwrap_singleton)
+            )
+
+        for node, submod, signature in layers:
+            lifted = [fetch_attr(submod, name) for name in lifted_names(submod)]
+            args = example_inputs_of(submod)
+            arg_signatures = [tensor_signature(arg) for arg in args]
+            compiled_fn = self.lookup(signature, arg_signatures)
+            if compiled_fn is None:
+                compiled_fn = self.backend_compile_fn(
+                    lift_tensors(submod), args + lifted
+                )
+                self.blocks.append((signature, arg_signatures, compiled_fn))
+                counters["repeated_layers"]["blocks"] += 1
+            # free the examples before allocating those of the next layer
+            del args
+            counters["repeated_layers"]["layers"] += 1
+            compiled = CompiledSubmod(compiled_fn, lifted, not returns_tuple(submod))
+            self.replace(split_gm, node, compiled)
+
+        split_gm.recompile()
+        return split_gm
+
+    @staticmethod
+    def replace(split_gm: fx.GraphModule, node: fx.Node, module: torch.nn.Module):
+        split_gm.delete_submodule(node.target)
+        node.target = "compiled_" + node.target
+        split_gm.add_submodule(node.target, module)
@@ -24,13 +24,17 @@ from .bytecode_transformation import unique_id
 from .codegen import PyCodegen
 from .exc import BackendCompilerFailed
 from .exc import unimplemented
+from .fake_cache import FakePropagationCache
 from .guards import GuardBuilder
 from .mutation_guard import is_dynamic_nn_module
+from .optimizations.repeated_layers import RepeatedLayerCompiler
 from .side_effects import SideEffects
 from .source import ConstantSource
 from .source import LocalSource
 from .source import Source
 from .utils import CleanupHook
+from .utils import JournaledSet
+from .utils import UndoLog
 from .utils import count_calls
 from .utils import counters
 from .utils import fake_tensors_available
@@ -76,6 +80,26 @@ def _step_logger():
     return torchdynamo_logging.get_step_logger(log)
 
 
+@dataclass
+class OutputGraphState:
+    """A checkpoint of OutputGraph, see OutputGraph.copy_graphstate()"""
+
+    num_nodes: int
+    last_node: Optional[fx.Node]
+    num_graphargs: int
+    num_guards: int
+    num_nn_modules: int
+    undo_marker: int
+
+    def is_empty(self):
+        return not (
+            self.num_nodes
+            or self.num_graphargs
+            or self.num_guards
+            or self.num_nn_modules
+        )
+
+
 class OutputGraph(fx.Tracer):
     """
     Wrapper class to hold outputs of InstructionTranslator.  Mainly the
@@ -88,27 +112,41 @@ class OutputGraph(fx.Tracer):
         code_options: Dict[str, Any],
         compiler_fn: Callable,
         root_tx,
+        dynamic_shapes: bool = False,
     ):
         super(OutputGraph, self).__init__()
 
         # Mutable state checkpointed by copy_graphstate()
+        self.undo_log = UndoLog()
         self.graph = torch.fx.Graph()
         self.graphargs = []
-        self.guards = set()
+        self.guards = JournaledSet(self.undo_log)
         self.nn_modules = dict()
-        self.side_effects = SideEffects()
+        # (key of the container, index) of the items of a ModuleList or
+        # Sequential by module key, see repeated_layers.py
+        self.layer_keys = dict()
+        self.side_effects = SideEffects(undo_log=self.undo_log)
+        # inlined calls replayed by later calls, see inline_memo.py
+        self.inline_memo = dict()
+        self.side_effects.invalidated_by_mutation.append(self.inline_memo)
         self.code_options = dict(code_options)
         self.output_instructions = []
 
         # Not checkpointed
         self.compiler_fn = compiler_fn
+        # config.dynamic_shapes, or True if convert_frame promoted this frame
+        # to dynamic shapes, see config.automatic_dynamic_shapes
+        self.dynamic_shapes = dynamic_shapes
         self.root_globals = f_globals
         self.root_tx = root_tx
         self.cleanups = []
         self.should_exit = False
         self.random_values_var = None
         self.initial_random_state = ()
+        # calls to resume functions to compile ahead, see prefetch.py
+        self.resume_calls = []
         self.unspec_variable_map = {}
+        self.fake_propagation_cache = FakePropagationCache()
 
     @property
     def output(self):
@@ -119,33 +157,51 @@ class OutputGraph(fx.Tracer):
         return self.root_tx.fake_mode
 
     def copy_graphstate(self):
-        """Create a checkpoint of the current state by copying everything"""
-        graph_nodes = set(self.graph.nodes)
-        return (
-            graph_nodes,
-            list(self.graphargs),
-            set(self.guards),
-            dict(self.nn_modules),
-            self.side_effects.clone(),
+        """
+        Create a checkpoint of the current state.  Nodes and graphargs are only
+        added while tracing and the guards, nn_modules and side effects record
+        their changes in self.undo_log, so this copies nothing.
+        """
+        return OutputGraphState(
+            num_nodes=len(self.graph.nodes),
+            last_node=next(iter(reversed(self.graph.nodes)), None),
+            num_graphargs=len(self.graphargs),
+            num_guards=len(self.guards),
+            num_nn_modules=len(self.nn_modules),
+            undo_marker=self.undo_log.marker(),
         )
 
     def restore_graphstate(self, state):
         """Restore a checkpoint created by self.copy_graphstate()"""
-        (
-            graph_nodes,
-            self.graphargs,
-            self.guards,
-            self.nn_modules,
-            self.side_effects,
-        ) = state
-        # FX deepcopy doesn't work for a partially created graph, so just remove new nodes
-        for node in reversed(list(self.graph.nodes)):
-            if node not in graph_nodes:
-                # Erasing node alone does not remove the meta information
-                # So, remove the help tensor explicitly
-                if "example_value" in node.meta:
-                    del node.meta["example_value"]
-                self.graph.erase_node(node)
+        self.undo_log.rollback(state.undo_marker)
+        del self.graphargs[state.num_graphargs :]
+        # FX deepcopy doesn't work for a partially created graph, so just remove
+        # new nodes.  They were appended after state.last_node, except for
+        # placeholders which go right after the last placeholder.
+        new_nodes = []
+        for node in reversed(self.graph.nodes):
+            if node is state.last_node:
+                break
+            new_nodes.append(node)
+        else:
+            assert state.last_node is None, "checkpoint's last node was removed"
+        for node in new_nodes:
+            self.remove_node(node)
+        num_placeholders = len(self.graph.nodes) - state.num_nodes
+        assert num_placeholders >= 0, "nodes from before the checkpoint were removed"
+        if num_placeholders:
+            placeholders = list(
+                itertools.takewhile(lambda n: n.op == "placeholder", self.graph.nodes)
+            )
+            for node in reversed(placeholders[-num_placeholders:]):
+                self.remove_node(node)
+
+    def remove_node(self, node):
+        # Erasing node alone does not remove the meta information
+        # So, remove the help tensor explicitly
+        if "example_value" in node.meta:
+            del node.meta["example_value"]
+        self.graph.erase_node(node)
 
     def count_calls(self):
         return count_calls(self.graph)
@@ -242,7 +298,7 @@ class OutputGraph(fx.Tracer):
         base = name
         for i in itertools.count():
             if name not in self.nn_modules:
-                self.nn_modules[name] = mod
+                self.undo_log.setitem(self.nn_modules, name, mod)
                 return wrap_name(name)
             name = f"{base}_{i}"
 
@@ -382,8 +438,8 @@ class OutputGraph(fx.Tracer):
         counters["stats"]["calls_captured"] += ncalls
         counters["stats"]["fusions_possible"] += ncalls - 1
 
-        if config.dynamic_propagation:
-            # free a bit of memory
+        if config.dynamic_propagation and not config.repeated_layers:
+            # free a bit of memory, RepeatedLayerCompiler needs the shapes
             for node in self.graph.nodes:
                 if "example_value" in node.meta:
                     del node.meta["example_value"]
@@ -391,6 +447,7 @@ class OutputGraph(fx.Tracer):
         gm = fx.GraphModule(root, self.graph)
         gm.recompile()
         gm.compile_subgraph_reason = self.compile_subgraph_reason
+        gm.dynamic_shapes = self.dynamic_shapes
         name = unique_id("__compiled_fn")
         compiled_fn = self.call_user_compiler(gm)
         compiled_fn = disable(compiled_fn)
@@ -418,7 +475,10 @@ class OutputGraph(fx.Tracer):
     def call_user_compiler(self, gm):
         try:
             _step_logger()(logging.INFO, "calling compiler function")
-            compiled_fn = self.compiler_fn(gm, self.example_inputs())
+            compiler_fn = self.compiler_fn
+            if config.repeated_layers:
+                compiler_fn = RepeatedLayerCompiler(compiler_fn, self.layer_keys)
+            compiled_fn = compiler_fn(gm, self.example_inputs())
             _step_logger()(logging.INFO, "done compiler function")
             assert callable(compiled_fn), "compiler_fn did not return callable"
         except Exception as e:
@@ -485,6 +545,8 @@ class OutputGraph(fx.Tracer):
         # Note: generated fx graph will hold a reference to the nn_module,
         # So depending on the backend they may not be released
         self.nn_modules = None
+        self.inline_memo.clear()
+        self.undo_log.clear()
 
         # Cleanup graphargs
         for graph_arg in self.graphargs:
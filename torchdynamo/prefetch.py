@@ -0,0 +1,195 @@
+import dataclasses
+import logging
+import types
+from typing import Any
+from typing import Dict
+from typing import List
+
+import torch
+
+from . import config
+from .guards import CLOSURE_VARS
+from .utils import counters
+from .utils import istype
+from .utils import rename_implicit
+from .variables.base import VariableTracker
+from .variables.constant import ConstantVariable
+from .variables.lists import ListVariable
+from .variables.lists import TupleVariable
+from .variables.misc import UnknownVariable
+from .variables.tensor import TensorVariable
+
+log = logging.getLogger(__name__)
+
+
+class NoExampleValue(Exception):
+    """ExampleLocals can't build a value for a variable"""
+
+
+@dataclasses.dataclass
+class ResumeCall:
+    """
+    A call to a resume function made by the output code of a frame, with the
+    variables it passes as arguments and the grad mode it is called with.
+    """
+
+    code: types.CodeType
+    args: Dict[str, VariableTracker]
+    grad_enabled: bool
+
+
+def record_resume_call(tx, inst, code: types.CodeType, argnames):
+    """Called by InstructionTranslator.create_call_resume_at()"""
+    if code.co_freevars:
+        # would need the cells of the frame
+        return
+    args = {f"___stack{i}": value for i, value in enumerate(tx.stack)}
+    args.update((name, tx.symbolic_locals[name]) for name in argnames)
+    if tx.stack and istype(tx.stack[-1], UnknownVariable):
+        # the result of the instruction that broke the graph, only guess it
+        # when it is thrown away
+        if inst.opname != "POP_TOP":
+            counters["prefetch_resume"]["unknown_args"] += 1
+            return
+        args[f"___stack{len(tx.stack) - 1}"] = ConstantVariable(None)
+    tx.output.resume_calls.append(ResumeCall(code, args, torch.is_grad_enabled()))
+
+
+def eval_source(source, f_locals: Dict[str, Any], f_globals: Dict[str, Any]):
+    scope = source.guard_source().select(f_locals, f_globals)
+    scope = {rename_implicit(k): v for k, v in scope.items()}
+    return eval(source.name(), scope, CLOSURE_VARS)
+
+
+class ExampleLocals:
+    """
+    Builds real values like the ones a resume function will be called with
+    from the variables at the graph break: values read from the frame for
+    variables with a source, otherwise constants and zero filled tensors with
+    the metadata of graph outputs.  The tensors of one call may take up to
+    config.prefetch_resume_example_bytes, resume functions needing more are
+    left to be compiled when first called.
+    """
+
+    def __init__(self, f_locals: Dict[str, Any], f_globals: Dict[str, Any]):
+        self.f_locals = f_locals
+        self.f_globals = f_globals
+        # graph outputs passed more than once stay aliased
+        self.tensors = {}
+        self.bytes_left = config.prefetch_resume_example_bytes
+
+    def __call__(self, call: ResumeCall):
+        return {name: self.value(var) for name, var in call.args.items()}
+
+    def value(self, var: VariableTracker):
+        if var.source is not None:
+            try:
+                return eval_source(var.source, self.f_locals, self.f_globals)
+            except Exception as e:
+                raise NoExampleValue(f"reading {var.source.name()}: {e}") from e
+        if istype(var, TensorVariable):
+            node = var.as_proxy().node
+            if node not in self.tensors:
+                self.tensors[node] = self.tensor_like(var)
+            return self.tensors[node]
+        if istype(var, ConstantVariable):
+            return var.value
+        if istype(var, (TupleVariable, ListVariable)):
+            return var.python_type()(self.value(item) for item in var.items)
+        raise NoExampleValue(f"unsupported {var}")
+
+    def tensor_like(self, var: TensorVariable):
+        # the example values are gone by now, but the variable keeps the
+        # metadata the guards check unless shapes are dynamic
+        if (
+            var.size is None
+            or var.stride is None
+            or var.class_type is not torch.Tensor
+            or var.is_quantized
+            or var.is_sparse
+        ):
+            raise NoExampleValue(f"unsupported {var}")
+        nbytes = 0
+        if all(var.size):
+            nbytes = sum((n - 1) * s for n, s in zip(var.size, var.stride)) + 1
+            nbytes *= torch.empty((), dtype=var.dtype).element_size()
+        if nbytes > self.bytes_left:
+            raise NoExampleValue(f"over prefetch_resume_example_bytes: {var}")
+        self.bytes_left -= nbytes
+        result = torch.empty_strided(
+            var.size, var.stride, dtype=var.dtype, device=var.device
+        ).zero_()
+        return result.requires_grad_(var.requires_grad)
+
+
+def prefetch_resume_functions(
+    resume_calls: List[ResumeCall], f_globals, f_locals, f_builtins, compiler_fn
+):
+    """
+    Compile the resume functions of a frame that was just converted before
+    they are first called, see config.prefetch_resume_functions.  The resume
+    functions they call are compiled in turn, up to
+    config.prefetch_resume_limit in total.  Tracing happens here, the graphs
+    are handed to a BackgroundCompiler pool so the fragments of the frame
+    compile in parallel, and each waits for its compile on its first call.
+
+    The guards of a prefetched resume function are built from example values,
+    so when the real call differs (shapes changed by the code that broke the
+    graph, a different branch of a data dependent jump, ...) they fail and it
+    is compiled again as usual.
+    """
+    from . import convert_frame
+    from .background_compile import BackgroundCompiler
+    from .eval_frame import add_cache_entry
+    from .eval_frame import cache_entry_stats
+
+    if not isinstance(compiler_fn, BackgroundCompiler):
+        compiler_fn = BackgroundCompiler(compiler_fn, wait_first=True)
+
+    pending = [(call, ExampleLocals(f_locals, f_globals)) for call in resume_calls]
+    seen = set()
+    prior_grad_mode = torch.is_grad_enabled()
+    initial_grad_state = convert_frame.initial_grad_state
+    try:
+        while pending and len(seen) < config.prefetch_resume_limit:
+            call, example_locals = pending.pop(0)
+            if call.code in seen or cache_entry_stats(call.code):
+                continue
+            seen.add(call.code)
+            try:
+                spec_locals = example_locals(call)
+            except NoExampleValue as e:
+                log.debug(f"not prefetching {call.code.co_name}: {e}")
+                counters["prefetch_resume"]["no_example"] += 1
+                continue
+
+            nested_calls = []
+            # the grad mode guard of the resume function is on this
+            torch._C._set_grad_enabled(call.grad_enabled)
+            convert_frame.initial_grad_state = call.grad_enabled
+            try:
+                convert_frame.input_codes.add(call.code)
+                guarded_code = convert_frame._compile(
+                    call.code,
+                    f_globals,
+                    spec_locals,
+                    f_builtins,
+                    compiler_fn,
+                    one_graph=False,
+                    export=False,
+                    resume_calls=nested_calls,
+                )
+            except Exception:
+                log.debug(f"prefetching {call.code.co_name} failed", exc_info=True)
+                counters["prefetch_resume"]["failed"] += 1
+                continue
+            if guarded_code is None or not add_cache_entry(call.code, guarded_code):
+                continue
+            counters["prefetch_resume"]["compiled"] += 1
+            pending.extend(
+                (nested, ExampleLocals(spec_locals, f_globals))
+                for nested in nested_calls
+            )
+    finally:
+        torch._C._set_grad_enabled(prior_grad_mode)
+        convert_frame.initial_grad_state = initial_grad_state
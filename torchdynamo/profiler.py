@@ -154,6 +154,7 @@ def shapes_of(it):
 def fx_insert_profiling(gm: torch.fx.GraphModule, example_inputs: List[Any]):
     input_shapes = shapes_of(example_inputs)
     output_shapes = None
+    dynamic_shapes = getattr(gm, "dynamic_shapes", config.dynamic_shapes)
 
     def debug_print(extra):
         gm.graph.print_tabular()
@@ -162,15 +163,15 @@ def fx_insert_profiling(gm: torch.fx.GraphModule, example_inputs: List[Any]):
     def _wrapped(*args):
         nonlocal output_shapes
         with torch.profiler.record_function("TORCHDYNAMO"):
-            assert (
-                shapes_of(args) == input_shapes or config.dynamic_shapes
-            ), debug_print(shapes_of(args))
+            assert shapes_of(args) == input_shapes or dynamic_shapes, debug_print(
+                shapes_of(args)
+            )
             result = gm.forward(*args)
             if output_shapes is None:
                 output_shapes = shapes_of(result)
             else:
                 assert (
-                    shapes_of(result) == output_shapes or config.dynamic_shapes
+                    shapes_of(result) == output_shapes or dynamic_shapes
                 ), debug_print(shapes_of(result))
             return result
 
@@ -0,0 +1,120 @@
+import functools
+import inspect
+from typing import Dict
+from typing import Optional
+from typing import Sequence
+from typing import Union
+
+import torch
+import torch.utils._pytree as pytree
+
+from .utils import counters
+
+
+class ShapeBuckets:
+    """
+    See optimize(..., shape_buckets=...).  Pads dims[name] of the tensor
+    argument `name` up to the next size in `buckets` (the next power of two
+    by default) so a frame is compiled once per bucket instead of once per
+    size, then narrows the outputs back to the unpadded size.
+
+    Padding is only correct for functions that treat the padded dims
+    independently (e.g. the sequence dim of a model with an attention mask),
+    anything that reduces over them sees the pad_value elements.  Sizes
+    beyond the largest bucket are left as they are.
+
+    By default an output is narrowed only if it has the padded shape of a
+    padded input, on that input's padded dims.  Other outputs are returned
+    padded unless `output_dims` lists the dims of outputs to narrow, each
+    back to the unpadded size of the input dim with the same index.
+
+    counters["shape_buckets"] counts the calls, the elements passed to the
+    compiled function and how many of those are padding, see padding_waste().
+    """
+
+    def __init__(
+        self,
+        dims: Dict[str, Union[int, Sequence[int]]],
+        buckets: Optional[Sequence[int]] = None,
+        pad_value=0,
+        output_dims: Optional[Sequence[int]] = None,
+    ):
+        self.dims = {
+            name: (dim,) if isinstance(dim, int) else tuple(dim)
+            for name, dim in dims.items()
+        }
+        self.buckets = sorted(buckets) if buckets is not None else None
+        self.pad_value = pad_value
+        self.output_dims = tuple(output_dims) if output_dims is not None else None
+
+    def bucket(self, size: int):
+        if self.buckets is None:
+            return size if size <= 1 else 1 << (size - 1).bit_length()
+        for bucket in self.buckets:
+            if bucket >= size:
+                return bucket
+        return size
+
+    def pad(self, value: torch.Tensor, dims, padded, padded_shapes):
+        pad = [0] * (2 * value.ndim)
+        sizes = {}
+        for dim in dims:
+            size = value.size(dim)
+            bucket = self.bucket(size)
+            pad[2 * (value.ndim - 1 - dim % value.ndim) + 1] = bucket - size
+            sizes[dim % value.ndim] = size
+            # only narrow outputs if every input padded on dim agrees
+            if padded.setdefault(dim, (size, bucket)) != (size, bucket):
+                padded[dim] = None
+        result = value
+        if any(pad):
+            result = torch.nn.functional.pad(value, pad, value=self.pad_value)
+            padded_shapes.append((result.size(), sizes))
+        counters["shape_buckets"]["elements"] += result.numel()
+        counters["shape_buckets"]["padding"] += result.numel() - value.numel()
+        return result
+
+    def narrow(self, value, padded, padded_shapes):
+        if not isinstance(value, torch.Tensor):
+            return value
+        if self.output_dims is None:
+            for shape, sizes in padded_shapes:
+                if value.size() == shape:
+                    for dim, size in sizes.items():
+                        value = value.narrow(dim, 0, size)
+                    break
+            return value
+        for dim in self.output_dims:
+            sizes = padded.get(dim)
+            if sizes is None or not -value.ndim <= dim < value.ndim:
+                continue
+            size, bucket = sizes
+            if size != bucket and value.size(dim) == bucket:
+                value = value.narrow(dim, 0, size)
+        return value
+
+    def wrap(self, fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def _fn(*args, **kwargs):
+            counters["shape_buckets"]["calls"] += 1
+            bound = signature.bind(*args, **kwargs)
+            padded = {}
+            padded_shapes = []
+            for name, dims in self.dims.items():
+                value = bound.arguments.get(name)
+                if isinstance(value, torch.Tensor):
+                    bound.arguments[name] = self.pad(value, dims, padded, padded_shapes)
+            result = fn(*bound.args, **bound.kwargs)
+            return pytree.tree_map(
+                lambda x: self.narrow(x, padded, padded_shapes), result
+            )
+
+        return _fn
+
+
+def padding_waste():
+    """Fraction of the elements passed to bucketed functions that are padding"""
+    stats = counters["shape_buckets"]
+    return stats["padding"] / stats["elements"] if stats["elements"] else 0.0
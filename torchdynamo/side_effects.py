@@ -11,6 +11,7 @@ from .bytecode_transformation import create_instruction
 from .codegen import PyCodegen
 from .source import LocalSource
 from .source import Source
+from .utils import UndoLog
 from .utils import object_new
 from .variables.base import VariableTracker
 
@@ -65,36 +66,49 @@ class SideEffects(object):
     """
     Track side effects (list mutation, setattr, etc) that need to be
     applied after an FX graph is run.
+
+    Every change is recorded in undo_log so OutputGraph can checkpoint and
+    roll back this state without copying it.
     """
 
-    def __init__(self, id_to_variable=None, store_attr_mutations=None, keepalive=None):
+    def __init__(
+        self,
+        id_to_variable=None,
+        store_attr_mutations=None,
+        keepalive=None,
+        undo_log=None,
+    ):
         super(SideEffects, self).__init__()
         self.id_to_variable = id_to_variable or collections.OrderedDict()
         self.store_attr_mutations = store_attr_mutations or collections.OrderedDict()
         self.keepalive = keepalive or []
+        self.undo_log = undo_log or UndoLog()
+        # caches of tracing results that may have read mutated state
+        self.invalidated_by_mutation = []
 
-    def clone(self):
-        """Create a shallow copy"""
-        return self.__class__(
-            id_to_variable=collections.OrderedDict(self.id_to_variable),
-            store_attr_mutations=collections.OrderedDict(
-                (k, collections.OrderedDict(v))
-                for k, v in self.store_attr_mutations.items()
-            ),
-            keepalive=list(self.keepalive),
-        )
+    def mutated(self):
+        for cache in self.invalidated_by_mutation:
+            self.undo_log.clear_dict(cache)
 
-    def apply(self, fn, cache=None):
+    def apply(self, fn, cache=None, skip_fn=None):
         if cache is None:
             cache = dict()
 
-        self.id_to_variable = collections.OrderedDict(
-            (k, VariableTracker.apply(fn, v, cache))
-            for k, v in self.id_to_variable.items()
+        self.undo_log.setattr(
+            self,
+            "id_to_variable",
+            collections.OrderedDict(
+                (k, VariableTracker.apply(fn, v, cache, skip_fn))
+                for k, v in self.id_to_variable.items()
+            ),
         )
-        self.store_attr_mutations = collections.OrderedDict(
-            (k, VariableTracker.apply(fn, v, cache))
-            for k, v in self.store_attr_mutations.items()
+        self.undo_log.setattr(
+            self,
+            "store_attr_mutations",
+            collections.OrderedDict(
+                (k, VariableTracker.apply(fn, v, cache, skip_fn))
+                for k, v in self.store_attr_mutations.items()
+            ),
         )
 
     def __contains__(self, item):
@@ -105,9 +119,16 @@ class SideEffects(object):
 
     def store_attr(self, item: VariableTracker, name: str, value: VariableTracker):
         assert self.is_attribute_mutation(item)
+        self.mutated()
         if item.mutable_local not in self.store_attr_mutations:
-            self.store_attr_mutations[item.mutable_local] = collections.OrderedDict()
-        self.store_attr_mutations[item.mutable_local][name] = value
+            self.undo_log.setitem(
+                self.store_attr_mutations,
+                item.mutable_local,
+                collections.OrderedDict(),
+            )
+        self.undo_log.setitem(
+            self.store_attr_mutations[item.mutable_local], name, value
+        )
 
     def load_attr(self, item, name):
         assert self.is_attribute_mutation(item)
@@ -148,6 +169,11 @@ class SideEffects(object):
             return item.mutable_local in self.store_attr_mutations
         return item.mutable_local.is_modified
 
+    def _track(self, item: Any, variable: VariableTracker):
+        self.mutated()
+        self.undo_log.setitem(self.id_to_variable, id(item), variable)
+        self.undo_log.append(self.keepalive, item)
+
     def _track_obj(
         self,
         source: Source,
@@ -157,8 +183,7 @@ class SideEffects(object):
     ):
         """Start tracking a new variable for mutation"""
         variable = variable.clone(mutable_local=mutable_cls(source), source=source)
-        self.id_to_variable[id(item)] = variable
-        self.keepalive.append(item)
+        self._track(item, variable)
         return variable
 
     track_list = _track_obj
@@ -185,8 +210,7 @@ class SideEffects(object):
         variable = variable_cls(
             obj, mutable_local=AttributeMutationNew(None, cls_source), **options
         )
-        self.id_to_variable[id(obj)] = variable
-        self.keepalive.append(obj)
+        self._track(obj, variable)
         return variable
 
     def track_cell_new(
@@ -196,24 +220,21 @@ class SideEffects(object):
         variable = variables.NewCellVariable(
             mutable_local=AttributeMutationNew(None, None),
         )
-        self.id_to_variable[id(obj)] = variable
-        self.keepalive.append(obj)
+        self._track(obj, variable)
         return variable
 
     def track_cell_existing(self, source: Source, item: Any):
         variable = variables.NewCellVariable(
             mutable_local=AttributeMutationExisting(source),
         )
-        self.id_to_variable[id(item)] = variable
-        self.keepalive.append(item)
+        self._track(item, variable)
         return variable
 
     def track_global_existing(self, source: Source, item: Any):
         variable = variables.NewGlobalVariable(
             mutable_local=AttributeMutationExisting(source),
         )
-        self.id_to_variable[id(item)] = variable
-        self.keepalive.append(item)
+        self._track(item, variable)
         return variable
 
     def prune_dead_object_new(self, tx):
@@ -243,14 +264,23 @@ class SideEffects(object):
         for skip_obj, setattrs in self.store_attr_mutations.items():
             VariableTracker.apply(visit, setattrs)
 
-        self.id_to_variable = collections.OrderedDict(
-            (k, v) for k, v in self.id_to_variable.items() if is_live(v)
+        self.undo_log.setattr(
+            self,
+            "id_to_variable",
+            collections.OrderedDict(
+                (k, v) for k, v in self.id_to_variable.items() if is_live(v)
+            ),
         )
-        self.store_attr_mutations = collections.OrderedDict(
-            (k, v) for k, v in self.store_attr_mutations.items() if is_live(k)
+        self.undo_log.setattr(
+            self,
+            "store_attr_mutations",
+            collections.OrderedDict(
+                (k, v) for k, v in self.store_attr_mutations.items() if is_live(k)
+            ),
         )
 
     def mutation(self, oldvar, newvar):
+        self.mutated()
         return newvar.clone(
             mutable_local=MutableSideEffects(oldvar.mutable_local.source, True)
         )
@@ -18,6 +18,7 @@ import random
 import re
 import selectors
 import signal
+import sys
 import tempfile
 import threading
 import tokenize
@@ -48,6 +49,7 @@ except ImportError:
     HAS_PRIMS_REFS = False
 
 from . import config
+from . import startup_cache
 
 
 def _strip_init_py(s):
@@ -101,9 +103,33 @@ SKIP_DIRS = [
         _weakrefset,
     )
 ]
-FILENAME_ALLOWLIST = {
-    torch.nn.Sequential.__init__.__code__.co_filename,
-}
+# {filename: bool} of check() for files not in FILENAME_ALLOWLIST, also read
+# by _eval_frame.c to skip new code objects of skipped files without calling
+# back into python.  Cleared whenever the answer could change.
+CHECK_CACHE = dict()
+
+
+class _AllowList(set):
+    """A set of filenames that clears CHECK_CACHE when one is added"""
+
+    def add(self, filename):
+        super().add(filename)
+        CHECK_CACHE.clear()
+
+    def update(self, *filenames):
+        super().update(*filenames)
+        CHECK_CACHE.clear()
+
+    def __ior__(self, filenames):
+        self.update(filenames)
+        return self
+
+
+FILENAME_ALLOWLIST = _AllowList(
+    {
+        torch.nn.Sequential.__init__.__code__.co_filename,
+    }
+)
 
 # Include optimizer code for tracing
 FILENAME_ALLOWLIST |= set(
@@ -131,20 +157,23 @@ SKIP_DIRS_RE = None
 def _recompile_re():
     global SKIP_DIRS_RE
     SKIP_DIRS_RE = re.compile(f"^({'|'.join(map(re.escape, SKIP_DIRS))})")
+    CHECK_CACHE.clear()
+
+
+def _find_module_dirs(import_names):
+    dirs = []
+    for import_name in import_names:
+        module_spec = importlib.util.find_spec(import_name)
+        if module_spec and module_spec.origin is not None:
+            dirs.append(_strip_init_py(module_spec.origin))
+    return dirs
 
 
 def add(import_name: str):
     if isinstance(import_name, types.ModuleType):
         return add(import_name.__name__)
     assert isinstance(import_name, str)
-    module_spec = importlib.util.find_spec(import_name)
-    if not module_spec:
-        return
-    origin = module_spec.origin
-    if origin is None:
-        return
-    global SKIP_DIRS_RE
-    SKIP_DIRS.append(_strip_init_py(origin))
+    SKIP_DIRS.extend(_find_module_dirs([import_name]))
     _recompile_re()
 
 
@@ -156,11 +185,15 @@ def check(filename, allow_torch=False):
         return False
     if allow_torch and is_torch(filename):
         return False
-    return bool(SKIP_DIRS_RE.match(filename))
+    try:
+        return CHECK_CACHE[filename]
+    except KeyError:
+        skip = CHECK_CACHE[filename] = bool(SKIP_DIRS_RE.match(filename))
+        return skip
 
 
 # skip common third party libs
-for _name in (
+THIRD_PARTY_MODULES = (
     "functorch",
     "intel_extension_for_pytorch",
     "networkx",
@@ -180,9 +213,30 @@ for _name in (
     "tvm",
     "fx2trt_oss",
     "xarray",
-):
-    add(_name)
+)
+
+
+def _search_path_key():
+    """Changes when a package is installed on (or removed from) sys.path"""
+    key = []
+    for entry in sys.path:
+        try:
+            key.append((entry, os.stat(entry or ".").st_mtime_ns))
+        except OSError:
+            key.append((entry, None))
+    return key
 
+
+def _third_party_dirs():
+    key = startup_cache.key(lambda: [THIRD_PARTY_MODULES, _search_path_key()])
+    dirs = startup_cache.load("skipfiles", key)
+    if dirs is None:
+        dirs = _find_module_dirs(THIRD_PARTY_MODULES)
+        startup_cache.save("skipfiles", key, dirs)
+    return dirs
+
+
+SKIP_DIRS.extend(_third_party_dirs())
 _recompile_re()
 
 
@@ -193,5 +247,8 @@ def is_torch_inline_allowed(filename):
     )
 
 
+TORCH_DIR = _module_dir(torch)
+
+
 def is_torch(filename):
-    return filename.startswith(_module_dir(torch))
+    return filename.startswith(TORCH_DIR)
@@ -0,0 +1,84 @@
+import getpass
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import tempfile
+
+import torch
+
+from . import config
+
+log = logging.getLogger(__name__)
+
+
+def torch_build_key():
+    """Identifies the torch build and interpreter the cached values came from"""
+    return [
+        torch.__version__,
+        getattr(torch.version, "git_version", None),
+        torch.__file__,
+        sys.version,
+    ]
+
+
+def source_key(filename):
+    """Hash of one of our own files, so changing how a value is computed
+    invalidates it"""
+    with open(filename, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def cache_dir():
+    if config.startup_cache_dir is not None:
+        return config.startup_cache_dir
+    return f"/tmp/torchdynamo_{getpass.getuser()}"
+
+
+def key(key_fn):
+    """
+    key_fn(), or None if config.startup_cache is off, so the work of
+    building a key isn't done when nothing is loaded or saved under it
+    """
+    if not config.startup_cache:
+        return None
+    return key_fn()
+
+
+def path(name, key_parts):
+    key = hashlib.sha256(repr(torch_build_key() + key_parts).encode("utf-8"))
+    return os.path.join(cache_dir(), name, f"{key.hexdigest()}.pkl")
+
+
+def load(name, key_parts):
+    """
+    The value saved under name and key_parts by an earlier process, or None
+    if there is none or key_parts is None, see key()
+    """
+    if key_parts is None:
+        return None
+    filename = path(name, key_parts)
+    if not os.path.exists(filename):
+        return None
+    try:
+        with open(filename, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        log.warning("ignoring unreadable startup cache %s", filename, exc_info=True)
+        return None
+
+
+def save(name, key_parts, value):
+    if key_parts is None:
+        return
+    filename = path(name, key_parts)
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        # use a temp file for concurrent writers
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filename))
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(value, f)
+        os.rename(tmp_path, filename)
+    except OSError:
+        log.warning("could not write startup cache %s", filename, exc_info=True)
@@ -22,6 +22,8 @@ import torch
 
 from . import config
 from . import exc
+from . import inline_memo
+from . import prefetch
 from . import side_effects
 from . import skipfiles
 from . import variables
@@ -255,11 +257,19 @@ class InstructionTranslatorBase(object):
                 return newvar
             return v
 
+        def skip(v: VariableTracker):
+            # only rebuild the containers that reach oldvar, and not oldvar
+            # itself as repl() replaces it wholesale
+            return (
+                v.mutable_local is oldvar.mutable_local
+                or oldvar.mutable_local not in v.recursively_contains
+            )
+
         cache = dict()
-        self.output.side_effects.apply(repl, cache)
-        self.stack = [VariableTracker.apply(repl, x, cache) for x in self.stack]
+        self.output.side_effects.apply(repl, cache, skip)
+        self.stack = [VariableTracker.apply(repl, x, cache, skip) for x in self.stack]
         for k, x in self.symbolic_locals.items():
-            self.symbolic_locals[k] = VariableTracker.apply(repl, x, cache)
+            self.symbolic_locals[k] = VariableTracker.apply(repl, x, cache, skip)
 
     def replace_all(self, oldvar: VariableTracker, newvar: VariableTracker):
         if isinstance(oldvar.mutable_local, side_effects.MutableSideEffects):
@@ -1211,7 +1221,10 @@ class InstructionTranslatorBase(object):
     INPLACE_OR = stack_op(operator.ior)
 
     def copy_graphstate(self):
-        """Create a checkpoint of the current state by copying everything"""
+        """
+        Create a checkpoint of the current state.  The frame state is copied,
+        the OutputGraph only records where its undo log is.
+        """
         return (
             self.output.copy_graphstate(),
             collections.OrderedDict(self.symbolic_locals),
@@ -1242,8 +1255,9 @@ class InstructionTranslatorBase(object):
             return True
         output_graphstate = self.checkpoint[1][0]
         graphstate = self.checkpoint[1][1:]
-        state = (*output_graphstate, *graphstate)
-        for obj in state:
+        if not output_graphstate.is_empty():
+            return False
+        for obj in graphstate:
             if isinstance(obj, Iterable):
                 if len(obj) != 0:
                     return False
@@ -1358,9 +1372,12 @@ class InstructionTranslator(InstructionTranslatorBase):
         compiler_fn,
         one_graph,
         export,
+        dynamic_shapes=False,
     ):
         super(InstructionTranslator, self).__init__(
-            output=OutputGraph(f_globals, code_options, compiler_fn, self),
+            output=OutputGraph(
+                f_globals, code_options, compiler_fn, self, dynamic_shapes
+            ),
             instructions=instructions,
             f_locals=f_locals,
             f_globals=f_globals,
@@ -1461,6 +1478,8 @@ class InstructionTranslator(InstructionTranslatorBase):
             argnames,
             tuple(b.resume_fn() for b in self.block_stack),
         )
+        if config.prefetch_resume_functions:
+            prefetch.record_resume_call(self, inst, new_code, argnames)
 
         cg = PyCodegen(self)
 
@@ -1532,6 +1551,25 @@ class InliningInstructionTranslator(InstructionTranslatorBase):
         if code.co_name in ("__setitem__", "__setattr__"):
             unimplemented(f"inline {code.co_name}")
 
+        key = None
+        if (
+            config.inline_memoization
+            and config.dynamic_propagation
+            and not parent.output.dynamic_shapes
+            and istype(func, UserFunctionVariable)
+            and not closure_cells
+            and not is_generator(code)
+        ):
+            key, tensor_args = inline_memo.memo_key(code, sub_locals)
+        if key is not None:
+            entry = parent.output.inline_memo.get(key)
+            if entry is not None and entry.f_globals is func.get_globals():
+                result = inline_memo.replay(parent, entry, sub_locals, tensor_args)
+                if result is not None:
+                    log.debug(f"REPLAYED INLINING {code}")
+                    return result
+            state = parent.output.copy_graphstate()
+
         log.debug(f"INLINING {code} \n {dis.Bytecode(code).dis()} \n")
 
         if is_generator(code):
@@ -1553,6 +1591,16 @@ class InliningInstructionTranslator(InstructionTranslatorBase):
 
         log.debug(f"DONE INLINING {code}")
 
+        if key is not None:
+            inline_memo.record(
+                parent.output,
+                key,
+                func.get_globals(),
+                state,
+                tensor_args,
+                tracer.symbolic_result,
+            )
+
         if is_generator(code):
             assert tracer.symbolic_result.as_python_constant() is None
             return ListIteratorVariable(
@@ -107,6 +107,8 @@ def compile_times(repr="str", aggregate=False):
         ]
         out = "TorchDynamo compilation metrics:\n"
         out += tabulate.tabulate(rows, headers=("Function", "Runtimes (s)"))
+        if lookup_times(repr="csv")[1]:
+            out += "\n\n" + lookup_times()
         return out
     elif repr == "csv":
         values = [
@@ -117,6 +119,64 @@ def compile_times(repr="str", aggregate=False):
         return headers, values
 
 
+def lookup_times(repr="str"):
+    """
+    Get the per code object cache lookup counters kept by _eval_frame.c while
+    config.lookup_profile_interval (or a CompileProfiler) enables them.
+
+    Guard and run times are averaged over the lookups that were timed.
+    repr='str' returns a printable string, 'csv' returns headers, rows.
+    """
+    from ._eval_frame import lookup_stats
+
+    headers = [
+        "Function",
+        "Lookups",
+        "Hits",
+        "Misses",
+        "Recompiles",
+        "Entries checked per lookup",
+        "Guard us per lookup",
+        "Run us per call",
+    ]
+    codes = {id(code): code for code in orig_code_map.values.values()}
+    rows = []
+    for code in codes.values():
+        stats = lookup_stats(code)
+        if not stats or not stats["lookups"]:
+            continue
+        rows.append(
+            [
+                format_func_info(code),
+                stats["lookups"],
+                stats["hits"],
+                stats["misses"],
+                stats["recompiles"],
+                stats["entries_checked"] / stats["lookups"],
+                stats["guard_ns"] / max(stats["sampled"], 1) / 1000,
+                stats["run_ns"] / max(stats["sampled_runs"], 1) / 1000,
+            ]
+        )
+    if repr == "str":
+        out = "TorchDynamo cache lookups:\n"
+        out += tabulate.tabulate(rows, headers=headers, floatfmt=".2f")
+        return out
+    elif repr == "csv":
+        return headers, rows
+
+
+@contextlib.contextmanager
+def profile_lookups(interval=1):
+    """Count and time cache lookups, see lookup_times()"""
+    from ._eval_frame import set_lookup_profile_interval
+
+    prior = set_lookup_profile_interval(interval)
+    try:
+        yield
+    finally:
+        set_lookup_profile_interval(prior)
+
+
 tensortype_to_dtype = {
     torch.FloatTensor: (torch.float32, torch.float),
     torch.DoubleTensor: (torch.float64, torch.double),
@@ -260,6 +320,123 @@ class ExactWeakKeyDictionary:
         self.values.clear()
 
 
+class UndoLog:
+    """
+    Records how to undo each change to some mutable state, so a checkpoint is
+    just a position in the log (O(1) to take) and rolling back to it only
+    undoes what changed since.  See OutputGraph.copy_graphstate().
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def marker(self):
+        return len(self.entries)
+
+    def record(self, undo_fn, *args):
+        self.entries.append((undo_fn, args))
+
+    def rollback(self, marker):
+        assert marker <= len(self.entries), "cannot roll forward"
+        while len(self.entries) > marker:
+            undo_fn, args = self.entries.pop()
+            undo_fn(*args)
+
+    def clear(self):
+        self.entries.clear()
+
+    def setitem(self, container, key, value):
+        if key in container:
+            self.record(container.__setitem__, key, container[key])
+        else:
+            self.record(container.__delitem__, key)
+        container[key] = value
+
+    def setattr(self, obj, name, value):
+        self.record(setattr, obj, name, getattr(obj, name))
+        setattr(obj, name, value)
+
+    def append(self, items, value):
+        items.append(value)
+        self.record(items.pop)
+
+    def clear_dict(self, container):
+        if container:
+            self.record(container.update, dict(container))
+            container.clear()
+
+
+class JournaledSet(set):
+    """A set that records how to undo each change to it in an UndoLog"""
+
+    def __init__(self, undo_log: UndoLog, items=()):
+        super().__init__(items)
+        self.undo_log = undo_log
+
+    def add(self, item):
+        if item not in self:
+            super().add(item)
+            self.undo_log.record(set.discard, self, item)
+
+    def update(self, *others):
+        for other in others:
+            new = set(other).difference(self)
+            if new:
+                super().update(new)
+                self.undo_log.record(set.difference_update, self, new)
+
+    def discard(self, item):
+        if item in self:
+            super().discard(item)
+            self.undo_log.record(set.add, self, item)
+
+    def remove(self, item):
+        if item not in self:
+            raise KeyError(item)
+        self.discard(item)
+
+    def pop(self):
+        item = super().pop()
+        self.undo_log.record(set.add, self, item)
+        return item
+
+    def clear(self):
+        self.difference_update(self)
+
+    def difference_update(self, *others):
+        removed = set()
+        for other in others:
+            removed.update(self.intersection(other))
+        if removed:
+            super().difference_update(removed)
+            self.undo_log.record(set.update, self, removed)
+
+    def intersection_update(self, *others):
+        self.difference_update(set(self).difference(*others))
+
+    def symmetric_difference_update(self, other):
+        other = set(other)
+        added = other.difference(self)
+        self.difference_update(other)
+        self.update(added)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        self.symmetric_difference_update(other)
+        return self
+
+
 def istype(obj, allowed_types):
     """isinstance() without subclasses"""
     if isinstance(allowed_types, (tuple, list, set)):
@@ -843,6 +1020,13 @@ orig_code_map = ExactWeakKeyDictionary()
 # keep a record of code_obj -> list of guard failure reasons for logging
 guard_failures = collections.defaultdict(list)
 
+# code_obj -> Counter of (tensor name, dim) whose size changed when its guards
+# failed, see config.automatic_dynamic_shapes
+size_guard_failures = collections.defaultdict(collections.Counter)
+
+# code objects convert_frame promoted to dynamic shapes
+dynamic_shape_codes = set()
+
 
 class CompileProfiler:
     """Utility for profiling how and what dynamo would compile.
@@ -856,7 +1040,12 @@ class CompileProfiler:
     def __init__(self):
         self.frame_count = 0
         self.op_count = 0
-        self.backend_ctx_ctor = lambda: disable_cache_limit()
+        self.backend_ctx_ctor = self.backend_ctx
+
+    @contextlib.contextmanager
+    def backend_ctx(self):
+        with disable_cache_limit(), profile_lookups():
+            yield
 
     def __call__(self, gm: torch.fx.GraphModule, example_inputs):
         self.frame_count += 1
@@ -918,4 +1107,9 @@ class CompileProfiler:
         else:
             rpt += "No cache-limited recompilations detected.\n"
 
+        if lookup_times(repr="csv")[1]:
+            rpt += "\n"
+            rpt += lookup_times()
+            rpt += "\n"
+
         return rpt
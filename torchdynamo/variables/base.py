@@ -39,7 +39,7 @@ class VariableTracker:
     """
 
     # fields to leave unmodified in apply()
-    _nonvar_fields = ["value"]
+    _nonvar_fields = ["value", "_recursively_contains"]
 
     @staticmethod
     def propagate(*vars: List[List["VariableTracker"]]):
@@ -69,9 +69,38 @@ class VariableTracker:
     def clone(self, **kwargs):
         """Shallow copy with some (optional) changes"""
         args = dict(self.__dict__)
+        args.pop("_recursively_contains", None)
         args.update(kwargs)
         return self.__class__(**args)
 
+    @property
+    def recursively_contains(self) -> Set[MutableLocal]:
+        """
+        The mutable_local of this and of every VariableTracker reachable from
+        it.  Computed on first use, which relies on instances being immutable.
+        """
+        result = self.__dict__.get("_recursively_contains")
+        if result is None:
+            result = set()
+            if self.mutable_local is not None:
+                result.add(self.mutable_local)
+
+            def visit(value):
+                if isinstance(value, VariableTracker):
+                    result.update(value.recursively_contains)
+                elif istype(value, (list, tuple)):
+                    for v in value:
+                        visit(v)
+                elif istype(value, (dict, collections.OrderedDict)):
+                    for v in value.values():
+                        visit(v)
+
+            for key, value in self.__dict__.items():
+                if key not in self._nonvar_fields:
+                    visit(value)
+            self.__dict__["_recursively_contains"] = result
+        return result
+
     @classmethod
     def copy(cls, value):
         """Deeper (but not full) copy, leaving FX and user objects alone"""
@@ -79,11 +108,18 @@ class VariableTracker:
 
     @classmethod
     def apply(
-        cls, fn: Callable[["VariableTracker"], "VariableTracker"], value, cache=None
+        cls,
+        fn: Callable[["VariableTracker"], "VariableTracker"],
+        value,
+        cache=None,
+        skip_fn: Callable[["VariableTracker"], bool] = None,
     ):
         """
         Walk this object and call fn on all the VariableTracker
         instances to produce a new VariableTracker with the results.
+
+        VariableTrackers for which skip_fn returns True are passed to fn
+        as they are, without walking (and copying) their contents.
         """
         if cache is None:
             cache = dict()
@@ -93,21 +129,28 @@ class VariableTracker:
             return cache[idx][0]
 
         if isinstance(value, VariableTracker):
-            updated_dict = dict(value.__dict__)
-            for key in updated_dict.keys():
-                if key not in value._nonvar_fields:
-                    updated_dict[key] = cls.apply(fn, updated_dict[key], cache)
-            result = fn(value.clone(**updated_dict))
+            if skip_fn is not None and skip_fn(value):
+                result = fn(value)
+            else:
+                updated_dict = dict(value.__dict__)
+                for key in updated_dict.keys():
+                    if key not in value._nonvar_fields:
+                        updated_dict[key] = cls.apply(
+                            fn, updated_dict[key], cache, skip_fn
+                        )
+                result = fn(value.clone(**updated_dict))
         elif istype(value, list):
-            result = [cls.apply(fn, v, cache) for v in value]
+            result = [cls.apply(fn, v, cache, skip_fn) for v in value]
         elif istype(value, tuple):
-            result = tuple(cls.apply(fn, v, cache) for v in value)
+            result = tuple(cls.apply(fn, v, cache, skip_fn) for v in value)
         elif istype(value, collections.OrderedDict):
             result = collections.OrderedDict(
-                cls.apply(fn, v, cache) for v in value.items()
+                cls.apply(fn, v, cache, skip_fn) for v in value.items()
             )
         elif istype(value, dict):
-            result = {k: cls.apply(fn, v, cache) for k, v in list(value.items())}
+            result = {
+                k: cls.apply(fn, v, cache, skip_fn) for k, v in list(value.items())
+            }
         else:
             result = value
 
@@ -245,7 +245,7 @@ class BuiltinVariable(VariableTracker):
             and len(args) == 2
             and isinstance(args[1], variables.TensorVariable)
             and args[1].dtype == torch.bool
-            and not config.dynamic_shapes
+            and not tx.output.dynamic_shapes
         ):
             unimplemented("dynamic Tensor.__getitem__(bool[])")
 
@@ -32,7 +32,7 @@ from .user_defined import UserDefinedObjectVariable
 
 
 class NNModuleVariable(VariableTracker):
-    _nonvar_fields = ["module_type", "module_key"]
+    _nonvar_fields = ["module_type", "module_key", "_recursively_contains"]
 
     def __init__(self, module_type: type, module_key: str, **kwargs):
         super(NNModuleVariable, self).__init__(**kwargs)
@@ -46,6 +46,23 @@ class NNModuleVariable(VariableTracker):
     def _wrap_submodule(self, tx, source, submod, *key_extra, **options):
         return
 
+    def wrap_layer(self, tx, idx, submod, names, options):
+        """self[idx] of a ModuleList or Sequential, see OutputGraph.layer_keys"""
+        layer = tx.output.register_attr_or_module(
+            submod,
+            *names,
+            source=NNModuleSource(GetItemSource(self.source, idx)),
+            **options,
+        )
+        if isinstance(layer, NNModuleVariable) and isinstance(
+            tx.output.get_submodule(self.module_key),
+            (torch.nn.ModuleList, torch.nn.Sequential),
+        ):
+            tx.output.undo_log.setitem(
+                tx.output.layer_keys, layer.module_key, (self.module_key, idx)
+            )
+        return layer
+
     def unpack_var_sequence(self, tx):
         # implement list/iter/tuple/etc calls
         base = tx.output.get_submodule(self.module_key)
@@ -57,13 +74,7 @@ class NNModuleVariable(VariableTracker):
         result = []
         for idx, submod in enumerate(base):
             result.append(
-                tx.output.register_attr_or_module(
-                    submod,
-                    self.module_key,
-                    idx,
-                    source=NNModuleSource(GetItemSource(self.source, idx)),
-                    **options,
-                )
+                self.wrap_layer(tx, idx, submod, (self.module_key, idx), options)
             )
         return result
 
@@ -179,12 +190,8 @@ class NNModuleVariable(VariableTracker):
                 (arg,) = args
                 for idx, submod in enumerate(mod):
                     tx.call_function(
-                        tx.output.register_attr_or_module(
-                            submod,
-                            self.module_key,
-                            idx,
-                            source=NNModuleSource(GetItemSource(self.source, idx)),
-                            **options,
+                        self.wrap_layer(
+                            tx, idx, submod, (self.module_key, idx), options
                         ),
                         [arg],
                         {},
@@ -369,19 +376,13 @@ class NNModuleVariable(VariableTracker):
                 keys = list(range(len(module)))[args[0].as_python_constant()]
                 for idx, submod in enumerate(module[args[0].as_python_constant()]):
                     key = keys[idx]
-                    src = NNModuleSource(GetItemSource(self.source, key))
-                    result.append(
-                        tx.output.register_attr_or_module(
-                            submod,
-                            key,
-                            source=src,
-                            **options,
-                        )
-                    )
+                    result.append(self.wrap_layer(tx, key, submod, (key,), options))
                 return TupleVariable(result, **options)
 
             key = args[0].as_python_constant()
             submod = module[key]
+            if isinstance(key, int):
+                return self.wrap_layer(tx, key, submod, (key, key), options)
             return tx.output.register_attr_or_module(
                 submod,
                 key,
@@ -29,6 +29,7 @@ from .. import variables
 from ..exc import TorchRuntimeError
 from ..exc import Unsupported
 from ..exc import unimplemented
+from ..fake_cache import FakePropagationCache
 from ..guards import GuardBuilder
 from ..source import AttrSource
 from ..utils import clone_input
@@ -59,6 +60,7 @@ class TensorVariable(VariableTracker):
         "requires_grad",
         "is_quantized",
         "is_contiguous",
+        "_recursively_contains",
     ]
 
     @staticmethod
@@ -81,16 +83,8 @@ class TensorVariable(VariableTracker):
         assert False, op
 
     @classmethod
-    def create(cls, tx, proxy, example_value=None, nnmodule=None, **options):
-        if "guards" in options and options["guards"] is not None:
-            tx.output.guards.update(options["guards"])
-
-        assert "example_value" not in proxy.node.meta
-        if not config.dynamic_propagation:
-            if isinstance(example_value, torch.Tensor):
-                options.update(cls.specialize(example_value))
-            return cls(proxy, **options)
-
+    def run_example(cls, tx, proxy, args, kwargs, nnmodule=None):
+        """Compute the example value of proxy.node from those of its inputs"""
         use_fake_tensors = fake_tensors_available and config.fake_tensor_propagation
         if use_fake_tensors:
             fake_wrapper = functools.partial(
@@ -103,62 +97,83 @@ class TensorVariable(VariableTracker):
             def wrap_fake_exception(func):
                 return func()
 
-        args = kwargs = None
+        op = proxy.node.op
+        if use_fake_tensors:
+            args = tree_map(fake_wrapper, args)
+            kwargs = tree_map(fake_wrapper, kwargs)
+            if op == "call_module" and not is_lazy_module(nnmodule):
+                nnmodule = deepcopy_to_fake_tensor(nnmodule, tx.fake_mode)
+
+            def context():
+                if hasattr(py_dispatch, "enable_torch_dispatch_mode"):
+                    return py_dispatch.enable_torch_dispatch_mode(tx.fake_mode)
+                else:
+                    return tx.fake_mode
+
+        else:
+            context = contextlib.nullcontext
+            if op == "call_module" and not is_lazy_module(nnmodule):
+                nnmodule = copy.deepcopy(nnmodule)
+
+        if op == "call_module" and is_lazy_module(nnmodule):
+            assert nnmodule is not None
+            # In the case of a lazy module, we want to run
+            # the pre-hooks which initialize it
+            nnmodule(*args, **kwargs)
+
+        cache_key = None
+        if (
+            use_fake_tensors
+            and config.fake_propagation_cache
+            and not tx.output.dynamic_shapes
+        ):
+            cache_key, inputs = FakePropagationCache.key(proxy.node, args, kwargs)
+            cached = tx.output.fake_propagation_cache.get(cache_key, context)
+            if cached is not None:
+                return cached
+        try:
+            with context():
+                example_value = wrap_fake_exception(
+                    lambda: cls.run_proxy(proxy, args, kwargs, nnmodule)
+                )
+        except Unsupported:
+            raise
+        except RuntimeError as e:
+            if use_fake_tensors and isinstance(e, DataDependentOutputException):
+                if config.capture_scalar_outputs and proxy.node.target == "item":
+                    return torch.zeros(size=(), dtype=args[0].dtype).item()
+                else:
+                    unimplemented(f"data dependent operator: {e.func}")
+            elif use_fake_tensors and isinstance(e, DynamicOutputShapeException):
+                unimplemented(f"dynamic shape operator: {e.func}")
+            else:
+                raise TorchRuntimeError() from e
+        if cache_key is not None:
+            tx.output.fake_propagation_cache.put(cache_key, inputs, example_value)
+        return example_value
+
+    @classmethod
+    def create(cls, tx, proxy, example_value=None, nnmodule=None, **options):
+        if "guards" in options and options["guards"] is not None:
+            tx.output.guards.update(options["guards"])
+
+        assert "example_value" not in proxy.node.meta
+        if not config.dynamic_propagation:
+            if isinstance(example_value, torch.Tensor):
+                options.update(cls.specialize(example_value, tx.output.dynamic_shapes))
+            return cls(proxy, **options)
+
+        use_fake_tensors = fake_tensors_available and config.fake_tensor_propagation
         initial_example_value = example_value
 
         with preserve_rng_state():
             if example_value is None:
-                op = proxy.node.op
                 args, kwargs = cls.propagate_args_kwargs(proxy.node)
-                if use_fake_tensors:
-                    args = tree_map(fake_wrapper, args)
-                    kwargs = tree_map(fake_wrapper, kwargs)
-                    if op == "call_module" and not is_lazy_module(nnmodule):
-                        nnmodule = deepcopy_to_fake_tensor(nnmodule, tx.fake_mode)
-
-                    def context():
-                        if hasattr(py_dispatch, "enable_torch_dispatch_mode"):
-                            return py_dispatch.enable_torch_dispatch_mode(tx.fake_mode)
-                        else:
-                            return tx.fake_mode
-
-                else:
-                    context = contextlib.nullcontext
-                    if op == "call_module" and not is_lazy_module(nnmodule):
-                        nnmodule = copy.deepcopy(nnmodule)
-
-                if op == "call_module" and is_lazy_module(nnmodule):
-                    assert nnmodule is not None
-                    # In the case of a lazy module, we want to run
-                    # the pre-hooks which initialize it
-                    example_value = nnmodule(*args, **kwargs)
-                try:
-                    with context():
-                        example_value = wrap_fake_exception(
-                            lambda: cls.run_proxy(proxy, args, kwargs, nnmodule)
-                        )
-                except Unsupported:
-                    raise
-                except RuntimeError as e:
-                    if use_fake_tensors and isinstance(e, DataDependentOutputException):
-                        if (
-                            config.capture_scalar_outputs
-                            and proxy.node.target == "item"
-                        ):
-                            example_value = torch.zeros(
-                                size=(), dtype=args[0].dtype
-                            ).item()
-                        else:
-                            unimplemented(f"data dependent operator: {e.func}")
-                    elif use_fake_tensors and isinstance(
-                        e, DynamicOutputShapeException
-                    ):
-                        unimplemented(f"dynamic shape operator: {e.func}")
-                    else:
-                        raise TorchRuntimeError() from e
-            else:
-                if use_fake_tensors:
-                    example_value = fake_wrapper(example_value)
+                example_value = cls.run_example(tx, proxy, args, kwargs, nnmodule)
+            elif use_fake_tensors:
+                example_value = wrap_to_fake_tensor(
+                    example_value, fake_mode=tx.fake_mode
+                )
 
         if isinstance(example_value, torch.Tensor):
             is_parameter = isinstance(example_value, torch.nn.Parameter)
@@ -169,7 +184,7 @@ class TensorVariable(VariableTracker):
                 # NB: ensure strides are preserved
                 example_value = clone_input(example_value)
             proxy.node.meta["example_value"] = example_value
-            specialized_props = cls.specialize(example_value)
+            specialized_props = cls.specialize(example_value, tx.output.dynamic_shapes)
             if use_fake_tensors and isinstance(example_value, FakeTensor):
                 specialized_props["class_type"] = (
                     torch.nn.Parameter if is_parameter else torch.Tensor
@@ -179,10 +194,10 @@ class TensorVariable(VariableTracker):
 
             options.update(specialized_props)
             return cls(proxy, **options)
-        elif istype(example_value, (int, bool, float)) and config.dynamic_shapes:
+        elif istype(example_value, (int, bool, float)) and tx.output.dynamic_shapes:
             proxy.node.meta["example_value"] = example_value
             return DynamicShapeVariable(proxy, type(example_value), **options)
-        elif istype(example_value, torch.Size) and config.dynamic_shapes:
+        elif istype(example_value, torch.Size) and tx.output.dynamic_shapes:
             proxy.node.meta["example_value"] = example_value
             sizes = []
             for i, v in enumerate(example_value):
@@ -324,7 +339,7 @@ class TensorVariable(VariableTracker):
             return check_type(tensor_type)
 
     @staticmethod
-    def specialize(value: torch.Tensor):
+    def specialize(value: torch.Tensor, dynamic_shapes: bool):
         props = {
             "dtype": value.dtype,
             "device": value.device,
@@ -334,7 +349,7 @@ class TensorVariable(VariableTracker):
             "is_sparse": value.is_sparse,
             "class_type": type(value),
         }
-        if not config.dynamic_shapes:
+        if not dynamic_shapes:
             props["size"] = tuple(value.size())
             props["stride"] = tuple(value.stride())
             props["is_contiguous"] = value.is_contiguous()
@@ -444,12 +459,12 @@ class TensorVariable(VariableTracker):
             and not all(
                 x.is_python_constant() for x in itertools.chain(args, kwargs.values())
             )
-            and not config.dynamic_shapes
+            and not tx.output.dynamic_shapes
         ):
             unimplemented("dynamic Tensor.repeat")
         elif name in ("tolist", "numpy", "backward"):
             unimplemented(f"Tensor.{name}")
-        elif name == "nonzero" and not config.dynamic_shapes:
+        elif name == "nonzero" and not tx.output.dynamic_shapes:
             unimplemented(f"Tensor.{name}")
         elif name == "item":
             if config.capture_scalar_outputs:
@@ -464,7 +479,7 @@ class TensorVariable(VariableTracker):
                 unimplemented(f"Tensor.{name}")
         elif name == "__len__":
             if self.size:
-                assert not config.dynamic_shapes
+                assert not tx.output.dynamic_shapes
                 return ConstantVariable(self.size[0], **options)
             else:
                 return self.__class__.create(
@@ -490,7 +505,7 @@ class TensorVariable(VariableTracker):
                 name == "new"
                 and len(args) == 1
                 and isinstance(args[0], (SizeVariable, ShapeVariable))
-                and not config.dynamic_shapes
+                and not tx.output.dynamic_shapes
             ):
                 name = "new_empty"
 
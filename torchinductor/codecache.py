@@ -2,6 +2,8 @@ import base64
 import functools
 import getpass
 import hashlib
+import importlib.util
+import io
 import logging
 import os
 import re
@@ -9,6 +11,7 @@ import shutil
 import subprocess
 import sysconfig
 import tempfile
+import threading
 import types
 from concurrent.futures import Future
 from concurrent.futures import ThreadPoolExecutor
@@ -21,6 +24,7 @@ from torch.utils import cpp_extension
 
 from . import config
 from . import exc
+from .utils import dynamo_utils
 
 log = logging.getLogger(__name__)
 
@@ -104,11 +108,32 @@ def is_gcc():
     return re.search(r"(gcc|g\+\+)", cpp_compiler())
 
 
-def cpp_compile_command(input, output, include_pytorch=False):
+@functools.lru_cache(None)
+def cpu_capability():
+    """The vector ISA ATen dispatches to on this machine: AVX512, AVX2, ..."""
+    m = re.search(r"CPU capability usage: (\w+)", torch.__config__.show())
+    return m.group(1) if m else "DEFAULT"
+
+
+def vec_isa_flags():
+    """Compile at::vec::Vectorized for the ISA ATen uses, see config.cpp.vectorize"""
+    capability = cpu_capability()
+    if capability == "AVX512":
+        return (
+            "-DCPU_CAPABILITY=AVX512 -DCPU_CAPABILITY_AVX512"
+            " -mavx512f -mavx512dq -mavx512vl -mavx512bw -mfma"
+        )
+    if capability == "AVX2":
+        return "-DCPU_CAPABILITY=AVX2 -DCPU_CAPABILITY_AVX2 -mavx2 -mfma"
+    return ""
+
+
+def cpp_compile_command(input, output, include_pytorch=False, header=False):
     if include_pytorch:
         ipaths = cpp_extension.include_paths() + [sysconfig.get_path("include")]
         lpaths = cpp_extension.library_paths() + [sysconfig.get_config_var("LIBDIR")]
         libs = ["c10", "torch", "torch_cpu", "torch_python", "gomp"]
+        macros = f"-D_GLIBCXX_USE_CXX11_ABI={int(torch._C._GLIBCXX_USE_CXX11_ABI)}"
     else:
         # Note - this is effectively a header only inclusion. Usage of some header files may result in
         # symbol not found, if those header files require a library.
@@ -117,21 +142,99 @@ def cpp_compile_command(input, output, include_pytorch=False):
         ipaths = cpp_extension.include_paths() + [sysconfig.get_path("include")]
         lpaths = []
         libs = ["gomp"]
+        macros = ""
     ipaths = " ".join(["-I" + p for p in ipaths])
     lpaths = " ".join(["-L" + p for p in lpaths])
     libs = " ".join(["-l" + p for p in libs])
+    vec_flags = vec_isa_flags() if config.cpp.vectorize else ""
+    if header:
+        # a precompiled header, nothing to link
+        kind = "-x c++-header"
+        lpaths = libs = ""
+    else:
+        kind = "-shared"
     return re.sub(
         r"[ \n]+",
         " ",
         f"""
-            {cpp_compiler()} -shared -fPIC -Wall -std=c++14 -Wno-unused-variable
-            {ipaths} {lpaths} {libs}
+            {cpp_compiler()} {kind} -fPIC -Wall -std=c++14 -Wno-unused-variable
+            {macros} {ipaths} {lpaths} {libs}
             -march=native -O3 -ffast-math -fno-finite-math-only -fopenmp
-            -o{output} {input}
+            {vec_flags} -o{output} {input}
         """,
     ).strip()
 
 
+def precompile_header(header, include_pytorch=False):
+    """
+    Build a precompiled header that g++ reads in place of parsing header
+    when a kernel starts with `#include "header"`.  g++ picks the variant
+    in header.gch/ matching its flags, so each compiler, flags and torch
+    version gets its own, include_pytorch gives the variant for sources
+    compiled with cpp_compile_command(include_pytorch=True).  See
+    config.cpp.precompiled_header.
+    """
+    if not is_gcc():
+        return
+    cmd = cpp_compile_command("i", "o", include_pytorch=include_pytorch, header=True)
+    key = code_hash(torch.__version__ + cmd)
+    _precompile_header(
+        header, os.path.join(f"{header}.gch", f"{key}.gch"), include_pytorch
+    )
+
+
+@functools.lru_cache(None)
+@dynamo_utils.dynamo_timed
+def _precompile_header(header, output, include_pytorch=False):
+    if os.path.exists(output):
+        return
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    # g++ tries every file in the .gch directory, so build outside of it
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(header))
+    os.close(fd)
+    cmd = cpp_compile_command(
+        input=header, output=tmp_path, include_pytorch=include_pytorch, header=True
+    ).split(" ")
+    try:
+        subprocess.check_output(cmd, stderr=subprocess.STDOUT)
+    except subprocess.CalledProcessError as e:
+        log.warning("could not precompile %s: %s", header, e.output)
+        os.unlink(tmp_path)
+        return
+    os.rename(tmp_path, output)
+
+
+@dynamo_utils.dynamo_timed
+def run_cpp_compile(cmd):
+    subprocess.check_output(cmd, stderr=subprocess.STDOUT)
+
+
+# .so path -> lock held while building it, so threads compiling the same
+# source (e.g. the workers of AsyncCompile) run the compiler once
+compile_locks = dict()
+
+
+def compile_so(input_path, include_pytorch=False):
+    output_path = input_path[:-3] + "so"
+    with compile_locks.setdefault(output_path, threading.Lock()):
+        if os.path.exists(output_path):
+            return output_path
+        # build next to the .so and rename it, so another process never
+        # loads a partially written file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output_path))
+        os.close(fd)
+        cmd = cpp_compile_command(
+            input=input_path, output=tmp_path, include_pytorch=include_pytorch
+        ).split(" ")
+        try:
+            run_cpp_compile(cmd)
+        except subprocess.CalledProcessError as e:
+            os.unlink(tmp_path)
+            raise exc.CppCompileError(cmd, e.output)
+        os.rename(tmp_path, output_path)
+    return output_path
+
+
 class CppCodeCache:
     cache = dict()
     clear = staticmethod(cache.clear)
@@ -140,22 +243,48 @@ class CppCodeCache:
     def load(cls, source_code):
         key, input_path = write(source_code, "cpp", extra=cpp_compile_command("i", "o"))
         if key not in cls.cache:
-            output_path = input_path[:-3] + "so"
-            if not os.path.exists(output_path):
-                cmd = cpp_compile_command(input=input_path, output=output_path).split(
-                    " "
-                )
-                try:
-                    subprocess.check_output(cmd, stderr=subprocess.STDOUT)
-                except subprocess.CalledProcessError as e:
-                    raise exc.CppCompileError(cmd, e.output)
-
-            cls.cache[key] = cdll.LoadLibrary(output_path)
-            cls.cache[key].key = key
+            output_path = compile_so(input_path)
+            lib = cdll.LoadLibrary(output_path)
+            lib.key = key
+            # another thread might set this first
+            cls.cache.setdefault(key, lib)
 
         return cls.cache[key]
 
 
+class CppWrapperCodeCache:
+    """
+    Graphs generated by CppWrapperCodeGen, each built as a Python
+    extension exposing a function that takes and returns lists of tensors
+    """
+
+    cache = dict()
+    clear = staticmethod(cache.clear)
+
+    @classmethod
+    def load(cls, source_code, func_name):
+        # the extension is looked up by its name, which must be unique
+        name = code_hash(source_code)
+        source_code += (
+            f"\nPYBIND11_MODULE({name}, m) {{\n"
+            f'    m.def("{func_name}", &{func_name});\n'
+            "}\n"
+        )
+        key, input_path = write(
+            source_code,
+            "cpp",
+            extra=cpp_compile_command("i", "o", include_pytorch=True),
+        )
+        if key not in cls.cache:
+            output_path = compile_so(input_path, include_pytorch=True)
+            spec = importlib.util.spec_from_file_location(name, output_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            cls.cache.setdefault(key, module)
+
+        return getattr(cls.cache[key], func_name)
+
+
 class PyCodeCache:
     cache = dict()
     clear = staticmethod(cache.clear)
@@ -175,6 +304,159 @@ class PyCodeCache:
         return cls.cache[key]
 
 
+@functools.lru_cache(None)
+def source_hash():
+    """Hash of our own source, so an upgrade invalidates FxGraphCache"""
+    h = hashlib.sha256(torch.__version__.encode("utf-8"))
+    root = os.path.dirname(os.path.abspath(__file__))
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith((".py", ".h")):
+                with open(os.path.join(dirpath, name), "rb") as f:
+                    h.update(f.read())
+    return h.hexdigest()
+
+
+# The settings that can change generated code.  Others, like compile_threads
+# or cpp.cxx, only change how it is produced and must stay out of the
+# FxGraphCache key so it is shared across machines
+codegen_config = (
+    "dce",
+    "dynamic_shapes",
+    "static_weight_shapes",
+    "size_asserts",
+    "pick_loop_orders",
+    "inplace_buffers",
+    "benchmark_harness",
+    "realize_reads_threshold",
+    "realize_bytes_threshold",
+    "fallback_random",
+    "implicit_fallbacks",
+    "prefuse_nodes",
+    "tune_layout",
+    "aggressive_fusion",
+    "max_fusion_size",
+    "unroll_reductions_threshold",
+    "comment_origin",
+    "cpp.dynamic_threads",
+    "cpp.simdlen",
+    "cpp.min_chunk_size",
+    "cpp.vectorize",
+    "cpp.tiling",
+    "cpp.tile_cache_bytes",
+    "cpp.single_module",
+    "cpp.wrapper",
+    "cpp.precompiled_header",
+    "triton.cudagraphs",
+    "triton.convolution",
+    "triton.mm",
+    "triton.dense_indexing",
+    "triton.max_tiles",
+    "triton.autotune",
+    "triton.use_bmm",
+    "triton.tiling_prevents_pointwise_fusion",
+    "triton.tiling_prevents_reduction_fusion",
+    "triton.ordered_kernel_names",
+    "triton.simple_where",
+)
+
+
+def config_repr():
+    values = [
+        f"{name}={functools.reduce(getattr, name.split('.'), config)!r}"
+        for name in codegen_config
+    ]
+    if not config.cpp.dynamic_threads:
+        # C++ kernels are specialized for the number of threads
+        threads = config.cpp.threads
+        if threads < 1:
+            threads = torch.get_num_threads()
+        values.append(f"cpp.threads={threads}")
+    return ",".join(values)
+
+
+def tensor_repr(t):
+    if not isinstance(t, torch.Tensor):
+        return repr(t)
+    return (
+        f"{type(t).__name__}({tuple(t.size())}, {t.stride()}, {t.dtype}, "
+        f"{t.device}, requires_grad={t.requires_grad})"
+    )
+
+
+class FxGraphCache:
+    """
+    Output code of compile_fx_inner() persisted across processes so a warm
+    restart skips lowering and codegen, see config.persistent_cache.  The
+    kernels the output code loads are found in CppCodeCache's .so files and
+    the triton cache directory.  Entries are keyed on the FX code, the
+    inputs, the values of tensors it reads with get_attr, config and
+    versions; there is no eviction, clear cache_dir() to reset.
+    """
+
+    @staticmethod
+    def key(gm: torch.fx.GraphModule, example_inputs, **kwargs):
+        """
+        None if gm can't be cached because it reads a tensor with get_attr
+        larger than config.persistent_cache_max_constant_bytes, whose values
+        (baked into the output code) would be too expensive to hash
+        """
+        parts = [source_hash(), config_repr(), gm.code, repr(sorted(kwargs.items()))]
+        parts.extend(tensor_repr(x) for x in example_inputs)
+        for node in gm.graph.nodes:
+            if node.op != "get_attr":
+                continue
+            value = functools.reduce(getattr, node.target.split("."), gm)
+            parts.append(f"{node.target}={tensor_repr(value)}")
+            if isinstance(value, torch.Tensor):
+                nbytes = value.storage().nbytes()
+                if nbytes > config.persistent_cache_max_constant_bytes:
+                    return None
+                buffer = io.BytesIO()
+                torch.save(value, buffer)
+                parts.append(hashlib.sha256(buffer.getvalue()).hexdigest())
+        return code_hash("\n".join(parts))
+
+    @staticmethod
+    def path(key):
+        return os.path.join(cache_dir(), "fxgraph", key[1:3], f"{key}.pt")
+
+    @classmethod
+    def load(cls, key):
+        """Returns (module, device_types, mutated_inputs) or None"""
+        path = cls.path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            entry = torch.load(path)
+        except Exception:
+            log.warning("ignoring unreadable cache entry %s", path, exc_info=True)
+            return None
+        mod = PyCodeCache.load(entry["source_code"])
+        for name, value in entry["constants"].items():
+            setattr(mod, name, value)
+        return mod, entry["device_types"], entry["mutated_inputs"]
+
+    @classmethod
+    def save(cls, key, mod, graph):
+        path = cls.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(mod.__file__) as f:
+            source_code = f.read()
+        entry = {
+            "source_code": source_code,
+            "constants": graph.constants,
+            "device_types": set(graph.device_types),
+            "mutated_inputs": set(graph.mutated_inputs),
+        }
+        # use a temp file for thread safety
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            torch.save(entry, f)
+        os.rename(tmp_path, path)
+
+
 @functools.lru_cache(None)
 def patch_triton_dir():
     os.environ["TRITON_CACHE_DIR"] = os.environ.get(
@@ -235,6 +517,32 @@ class AsyncCompile:
 
         return self.submit(task)
 
+    def cpp_module(self, source_code, names):
+        """
+        The C++ kernels `names` of a graph compiled as one .so, see
+        config.cpp.single_module
+        """
+        if config.compile_threads <= 1:
+            lib = CppCodeCache.load(source_code)
+            return [getattr(lib, name) for name in names]
+
+        futures = [Future() for _ in names]
+
+        def done(lib_future):
+            try:
+                lib = lib_future.result()
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                return
+            for name, future in zip(names, futures):
+                future.set_result(getattr(lib, name))
+
+        self.submit(
+            functools.partial(CppCodeCache.load, source_code)
+        ).add_done_callback(done)
+        return futures
+
     def wait(self, scope: Dict[str, Any]):
         if config.compile_threads > 1:
             for key, result in list(scope.items()):
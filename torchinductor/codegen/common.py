@@ -323,6 +323,12 @@ class KernelArgs:
     def cpp_argdefs(self):
         from .cpp import DTYPE_TO_CPP
         from .cpp import INDEX_TYPE
+        from .cpp import cexpr
+
+        def pointer(name, dtype):
+            if V.graph.cpp_wrapper:
+                return f"({DTYPE_TO_CPP[dtype]}*)({name}.data_ptr())"
+            return f"c_void_p({name}.data_ptr())"
 
         # TODO(jansel): replace this with data from scheduler
         buffer_types = {x.get_name(): x.get_dtype() for x in V.graph.buffers}
@@ -341,22 +347,25 @@ class KernelArgs:
             dtype = buffer_types[outer]
             arg_defs.append(f"{DTYPE_TO_CPP[dtype]}* __restrict__ {inner}")
             name = inplaced.other_names[-1]
-            call_args.append(f"c_void_p({name}.data_ptr())")
+            call_args.append(pointer(name, dtype))
         for outer, inner in self.input_buffers.items():
             if outer in self.inplace_buffers:
                 continue
             dtype = buffer_types[outer]
             arg_defs.append(f"const {DTYPE_TO_CPP[dtype]}* __restrict__ {inner}")
-            call_args.append(f"c_void_p({outer}.data_ptr())")
+            call_args.append(pointer(outer, dtype))
         for outer, inner in self.output_buffers.items():
             if outer in self.inplace_buffers or inner == "REMOVED":
                 continue
             dtype = buffer_types[outer]
             arg_defs.append(f"{DTYPE_TO_CPP[dtype]}* __restrict__ {inner}")
-            call_args.append(f"c_void_p({outer}.data_ptr())")
+            call_args.append(pointer(outer, dtype))
         for outer, inner in self.sizevars.items():
             arg_defs.append(f"const {INDEX_TYPE} {inner}")
-            call_args.append(f"c_long({outer})")
+            if V.graph.cpp_wrapper:
+                call_args.append(cexpr(outer))
+            else:
+                call_args.append(f"c_long({outer})")
         return arg_defs, call_args
 
     def python_argdefs(self):
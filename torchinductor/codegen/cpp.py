@@ -1,6 +1,7 @@
 import contextlib
 import dataclasses
 import functools
+import logging
 from pathlib import Path
 from typing import Dict
 from typing import List
@@ -11,10 +12,15 @@ from torch._prims_common import is_float_dtype
 
 from .. import codecache
 from .. import config
+from .. import metrics
+from ..ir import IndexingDiv
+from ..utils import free_symbol_startswith
 from ..utils import sympy_product
+from ..utils import sympy_subs
 from ..virtualized import V
 from ..virtualized import ops
 from .common import BracesBuffer
+from .common import CodeGen
 from .common import DeferredIndentedBuffer
 from .common import ExprPrinter
 from .common import IndentedBuffer
@@ -22,6 +28,8 @@ from .common import Kernel
 from .common import KernelArgs
 from .common import OpOverrides
 
+log = logging.getLogger(__name__)
+
 DTYPE_TO_CPP = {
     torch.float32: "float",
     torch.float64: "double",
@@ -34,7 +42,20 @@ DTYPE_TO_CPP = {
     torch.bool: "bool",
     torch.bfloat16: "bfloat16",
 }
+DTYPE_TO_ATEN = {
+    torch.float32: "at::kFloat",
+    torch.float64: "at::kDouble",
+    torch.float16: "at::kHalf",
+    torch.int64: "at::kLong",
+    torch.int32: "at::kInt",
+    torch.int16: "at::kShort",
+    torch.int8: "at::kChar",
+    torch.uint8: "at::kByte",
+    torch.bool: "at::kBool",
+    torch.bfloat16: "at::kBFloat16",
+}
 INDEX_TYPE = "long"
+VEC_FLOAT = "at::vec::Vectorized<float>"
 
 RTYPE_TO_CPP = {
     "sum": "+",
@@ -64,6 +85,19 @@ def reduction_init(reduction_type, dtype):
     assert False, reduction_type
 
 
+# reductions CppVecKernel vectorizes, the combine of two Vectorized values
+VEC_REDUCTIONS = {
+    "sum": "{} + {}",
+    "max": "at::vec::maximum({}, {})",
+    "min": "at::vec::minimum({}, {})",
+}
+
+
+def vec_width():
+    """Elements in an at::vec::Vectorized<float>: 64 bytes with AVX512, else 32"""
+    return 16 if codecache.cpu_capability() == "AVX512" else 8
+
+
 def reduction_combine(reduction_type, var, next_value):
     if reduction_type == "sum":
         return f"{var} += {next_value}"
@@ -121,13 +155,21 @@ def float16_reduction_prefix(rtype):
 
 
 @functools.lru_cache()
-def cpp_prefix():
+def cpp_prefix_path():
     path = Path(__file__).parent / "cpp_prefix.h"
     with path.open() as f:
         _, filename = codecache.write(
             f.read(),
             "h",
         )
+    return filename
+
+
+def cpp_prefix():
+    filename = cpp_prefix_path()
+    if config.cpp.precompiled_header:
+        # the C++ wrapper builds with the torch flags, see CppWrapperCodeCache
+        codecache.precompile_header(filename, include_pytorch=V.graph.cpp_wrapper)
     return f'#include "{filename}"'
 
 
@@ -147,6 +189,12 @@ class CppPrinter(ExprPrinter):
         div = self.paren(self.doprint(div))
         return f"({x} / {div})"
 
+    def _print_Min(self, expr):
+        args = ", ".join(map(self._print, expr.args))
+        if len(expr.args) > 2:
+            args = f"{{{args}}}"
+        return f"std::min<{INDEX_TYPE}>({args})"
+
 
 cexpr = CppPrinter().doprint
 
@@ -308,6 +356,145 @@ class CppOverrides(OpOverrides):
         return f"static_cast<{DTYPE_TO_CPP[dtype]}>(randn_cpu({seed}, {offset}));"
 
 
+def vec_unsupported(name):
+    """An op CppVecOverrides can't vectorize"""
+
+    def inner(*args, **kwargs):
+        V.kernel.disable_vec(f"op {name}")
+        return "0"
+
+    return inner
+
+
+class CppVecOverrides(OpOverrides):
+    """
+    Map element-wise ops to at::vec::Vectorized<float>, see CppVecKernel.
+    Any op not defined here makes the kernel fall back to scalar code,
+    including to_dtype() as the comparisons produce bit masks, not 0/1.
+    """
+
+    def __getattr__(self, item):
+        return vec_unsupported(item)
+
+    @staticmethod
+    def add(a, b):
+        return f"{a} + {b}"
+
+    @staticmethod
+    def sub(a, b):
+        return f"{a} - {b}"
+
+    @staticmethod
+    def mul(a, b):
+        return f"{a} * {b}"
+
+    @staticmethod
+    def truediv(a, b):
+        return f"{a} / {b}"
+
+    div = truediv
+
+    @staticmethod
+    def neg(x):
+        return f"{x}.neg()"
+
+    @staticmethod
+    def abs(x):
+        return f"{x}.abs()"
+
+    @staticmethod
+    def sqrt(x):
+        return f"{x}.sqrt()"
+
+    @staticmethod
+    def rsqrt(x):
+        return f"{x}.rsqrt()"
+
+    @staticmethod
+    def reciprocal(x):
+        return f"{x}.reciprocal()"
+
+    @staticmethod
+    def floor(x):
+        return f"{x}.floor()"
+
+    @staticmethod
+    def ceil(x):
+        return f"{x}.ceil()"
+
+    @staticmethod
+    def trunc(x):
+        return f"{x}.trunc()"
+
+    @staticmethod
+    def round(x):
+        return f"{x}.round()"
+
+    @staticmethod
+    def relu(x):
+        return f"at::vec::maximum({x}, {VEC_FLOAT}(0))"
+
+    @staticmethod
+    def minimum(a, b):
+        return f"at::vec::minimum({a}, {b})"
+
+    @staticmethod
+    def maximum(a, b):
+        return f"at::vec::maximum({a}, {b})"
+
+    @staticmethod
+    def eq(a, b):
+        return f"{a} == {b}"
+
+    @staticmethod
+    def ne(a, b):
+        return f"{a} != {b}"
+
+    @staticmethod
+    def lt(a, b):
+        return f"{a} < {b}"
+
+    @staticmethod
+    def gt(a, b):
+        return f"{a} > {b}"
+
+    @staticmethod
+    def le(a, b):
+        return f"{a} <= {b}"
+
+    @staticmethod
+    def ge(a, b):
+        return f"{a} >= {b}"
+
+    @staticmethod
+    def where(a, b, c):
+        # a is a mask from one of the comparisons above
+        return f"{VEC_FLOAT}::blendv({c}, {b}, {a})"
+
+    @staticmethod
+    def constant(val, dtype):
+        if dtype != torch.float32:
+            V.kernel.disable_vec(f"constant of {dtype}")
+        if val == float("inf"):
+            val = "std::numeric_limits<float>::infinity()"
+        elif val == float("-inf"):
+            val = "-std::numeric_limits<float>::infinity()"
+        elif val != val:
+            val = "std::numeric_limits<float>::quiet_NaN()"
+        else:
+            val = f"static_cast<float>({float(val)!r})"
+        return f"{VEC_FLOAT}({val})"
+
+    # OpOverrides writes these in terms of integer/bool ops
+    sign = staticmethod(vec_unsupported("sign"))
+    logical_not = staticmethod(vec_unsupported("logical_not"))
+    bitwise_not = staticmethod(vec_unsupported("bitwise_not"))
+    bitwise_and = staticmethod(vec_unsupported("bitwise_and"))
+    bitwise_or = staticmethod(vec_unsupported("bitwise_or"))
+    bitwise_xor = staticmethod(vec_unsupported("bitwise_xor"))
+    remainder = staticmethod(vec_unsupported("remainder"))
+
+
 class CppKernel(Kernel):
     overrides = CppOverrides
     sexpr = cexpr
@@ -324,9 +511,13 @@ class CppKernel(Kernel):
         self.reduction_suffix = DeferredIndentedBuffer()
         self.reduction_vars = {}
         self.num_threads = num_threads  # num_threads the kernel specialized for
+        self.vec_kernel = None  # CppVecKernel for the innermost loop, if any
+        self.accesses = []  # (index, dtype) of loads and stores, see decide_tiling()
+        self.reduction_inits = {}  # tmpvar -> (dtype, init) of simple reductions
 
     def load(self, name: str, index: sympy.Expr):
         var = self.args.input(name)
+        self.accesses.append((index, V.graph.get_dtype(name)))
         index = self.rename_indexing(index)
         line = f"{var}[{cexpr(index)}]"
         if V.graph.get_dtype(name) in (torch.float16, torch.bfloat16):
@@ -336,6 +527,7 @@ class CppKernel(Kernel):
     def store(self, name, index, value, mode=None):
         assert "buf" in name
         var = self.args.output(name)
+        self.accesses.append((index, V.graph.get_dtype(name)))
         index = self.rename_indexing(index)
         if mode is None:
             line = f"{var}[{cexpr(index)}] = {value};"
@@ -373,6 +565,11 @@ class CppKernel(Kernel):
                 self.reduction_prefix.writelines(
                     float16_reduction_prefix(reduction_type)
                 )
+            else:
+                self.reduction_inits[tmpvar] = (
+                    dtype,
+                    reduction_init(reduction_type, dtype),
+                )
             self.reduction_prefix.writeline(
                 f"{DTYPE_TO_CPP[dtype]} {tmpvar} = {reduction_init(reduction_type, dtype)};"
             )
@@ -418,13 +615,6 @@ class CppKernel(Kernel):
         )
         reductions.mark_reduction(self.reduction_vars)
 
-        if config.cpp.simdlen:
-            # TODO(jansel): detect stride-1 dimension and vectorize that
-            if reductions:
-                reductions.loops[-1].simd = True
-            else:
-                loops.loops[-1].simd = True
-
         par_depth = 0
         reduction_par_depth = 0
         if loops:
@@ -436,6 +626,38 @@ class CppKernel(Kernel):
                 self.call_ranges[self.reduction_depth :], threads
             )
 
+        if reduction_par_depth:
+            # the vector accumulators are not in the omp reduction clause
+            self.vec_kernel = None
+        vec_kernel = self.vec_kernel
+
+        tile = None
+        tile_inner = None
+        if not vec_kernel and not reduction_par_depth:
+            tile = self.decide_tiling(threads)
+        if tile:
+            metrics.cpp_tiled_kernel_count += 1
+        if tile and reductions:
+            # reduce a tile of columns at once, each tmpvar becomes an array
+            loops.loops[-1], tile_inner = loops.loops[-1].tile(tile)
+            reductions.loops.append(tile_inner)
+        elif tile:
+            outer, inner = loops.loops[-2:]
+            outer_tile, outer_inner = outer.tile(tile)
+            inner_tile, inner_inner = inner.tile(tile)
+            loops.loops[-2:] = [outer_tile, inner_tile, outer_inner, inner_inner]
+
+        if config.cpp.simdlen and not vec_kernel:
+            # TODO(jansel): detect stride-1 dimension and vectorize that
+            if reductions:
+                reductions.loops[-1].simd = True
+            else:
+                loops.loops[-1].simd = True
+
+        if vec_kernel and not reductions and par_depth == len(loops.loops) > 1:
+            # the split innermost loop can't be collapsed into the omp for
+            par_depth -= 1
+
         with contextlib.ExitStack() as stack:
             if par_depth:
                 worksharing.parallel(threads)
@@ -448,18 +670,40 @@ class CppKernel(Kernel):
                 if worksharing.single():
                     stack.enter_context(code.indent())
 
+            if vec_kernel:
+                # innermost loop becomes a vector loop and a scalar tail loop
+                innermost = (reductions or loops).loops.pop()
+                vec_loop, tail_loop = innermost.split(vec_kernel.width)
+
             loops.codegen(code, stack)
 
             with contextlib.ExitStack() as stack_outer:
-                if self.reduction_prefix:
+                if self.reduction_prefix or (
+                    vec_kernel and vec_kernel.reduction_prefix
+                ):
                     stack_outer.enter_context(code.indent())
-                code.splice(self.reduction_prefix)
+                if tile_inner:
+                    code.writelines(self.tiled_reduction_prefix(tile))
+                else:
+                    code.splice(self.reduction_prefix)
+                if vec_kernel:
+                    code.splice(vec_kernel.reduction_prefix)
 
                 if reduction_par_depth:
                     worksharing.parallel(threads)
 
                 with contextlib.ExitStack() as stack:
                     reductions.codegen(code, stack)
+                    if tile_inner:
+                        code.writelines(self.tiled_reduction_vars(tile_inner))
+                    if vec_kernel:
+                        code.writelines(vec_loop.lines())
+                        with code.indent():
+                            code.splice(vec_kernel.loads)
+                            code.splice(vec_kernel.compute)
+                            code.splice(vec_kernel.stores)
+                        code.writelines(tail_loop.lines())
+                        stack.enter_context(code.indent())
                     code.splice(self.loads)
                     code.splice(self.compute)
                     code.splice(self.stores)
@@ -467,7 +711,83 @@ class CppKernel(Kernel):
                 if reduction_par_depth:
                     worksharing.close()
 
-                code.splice(self.reduction_suffix)
+                if vec_kernel:
+                    code.splice(vec_kernel.reduction_suffix)
+                if tile_inner:
+                    code.writelines(tile_inner.lines())
+                    with code.indent():
+                        code.writelines(self.tiled_reduction_vars(tile_inner))
+                        code.splice(self.reduction_suffix)
+                else:
+                    code.splice(self.reduction_suffix)
+
+    def decide_tiling(self, threads):
+        """
+        Edge of the tiles to run the last two loops in, or None.  Used when
+        some accesses are contiguous along the innermost loop and others
+        along the loop outside it (transposes), or when a reduction reads
+        contiguously along the last non-reduction loop (column reductions).
+        A tile of each access, and the accumulators, should fit in
+        config.cpp.tile_cache_bytes.
+        """
+        if not config.cpp.tiling or len(self.itervars) < 2 or self.reduction_depth < 1:
+            return None
+        if self.reduction_vars:
+            if len(self.reduction_inits) != len(self.reduction_vars):
+                # argmax/argmin or float16, see tiled_reduction_prefix()
+                return None
+            outer_depth = self.reduction_depth - 1
+            dims = 1
+        elif self.reduction_depth == len(self.itervars):
+            outer_depth = len(self.itervars) - 2
+            dims = 2
+        else:
+            return None
+        outer = self.itervars[outer_depth]
+        inner = self.itervars[-1]
+
+        sizevars = V.graph.sizevars
+        along_outer = along_inner = False
+        nbytes = sum(
+            torch.empty((), dtype=dtype).element_size()
+            for dtype, _ in self.reduction_inits.values()
+        )
+        for index, dtype in self.accesses:
+            strides = dict(
+                zip(self.itervars, sizevars.stride_hints(index, self.itervars))
+            )
+            if strides[outer] == 1 and abs(strides[inner]) > 1:
+                along_outer = True
+            elif strides[inner] == 1:
+                along_inner = True
+            nbytes += torch.empty((), dtype=dtype).element_size()
+        if not along_outer or (dims == 2 and not along_inner):
+            return None
+
+        elements = config.cpp.tile_cache_bytes // nbytes
+        tile = 1 << ((elements.bit_length() - 1) // dims)
+        outer_size = sizevars.size_hint(self.call_ranges[outer_depth])
+        inner_size = sizevars.size_hint(self.call_ranges[-1])
+        # leave a tile for every thread
+        while tile > 16 and outer_size < tile * threads:
+            tile //= 2
+        if tile < 8 or (dims == 2 and max(outer_size, inner_size) <= tile):
+            return None
+        return tile
+
+    def tiled_reduction_prefix(self, tile):
+        lines = []
+        for tmpvar, (dtype, init) in self.reduction_inits.items():
+            lines.append(f"{DTYPE_TO_CPP[dtype]} {tmpvar}_tile[{tile}];")
+            lines.append(f"std::fill_n({tmpvar}_tile, {tile}, {init});")
+        return lines
+
+    def tiled_reduction_vars(self, tile_inner):
+        """Point each tmpvar at its element of the tile for this iteration"""
+        return [
+            f"auto& {tmpvar} = {tmpvar}_tile[{tile_inner.var} - {cexpr(tile_inner.offset)}];"
+            for tmpvar in self.reduction_inits
+        ]
 
     def decide_parallel_depth(self, ranges, threads):
         seq = self.size_hint()
@@ -504,6 +824,95 @@ class CppKernel(Kernel):
         (self.loads, self.compute, self.stores, self.cse) = prior
 
 
+class CppVecKernel(CppKernel):
+    """
+    The body of a CppKernel again with at::vec::Vectorized<float> values,
+    run over the innermost loop `width` elements at a time by
+    CppKernel.codegen_loops().  Codegen calls disable_vec() for anything it
+    can't vectorize (other dtypes, non-contiguous or indirect indexing, ops
+    missing from CppVecOverrides), in which case the kernel stays scalar.
+    """
+
+    overrides = CppVecOverrides
+
+    def __init__(self, scalar_kernel):
+        super(CppVecKernel, self).__init__(
+            scalar_kernel.args, scalar_kernel.num_threads
+        )
+        # this is a second body for scalar_kernel, not a kernel of its own
+        metrics.generated_kernel_count -= 1
+        self.scalar_kernel = scalar_kernel
+        self.width = vec_width()
+        self.vec_unsupported = None
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # scalar_kernel already removed its local buffers
+        CodeGen.__exit__(self, exc_type, exc_val, exc_tb)
+
+    def disable_vec(self, reason):
+        if self.vec_unsupported is None:
+            log.debug("not vectorizing: %s", reason)
+            self.vec_unsupported = reason
+
+    def vec_stride(self, index: sympy.Expr):
+        """Stride of index along the innermost loop if it is 0 or 1, else None"""
+        if free_symbol_startswith(index, "tmp"):
+            return None
+        var = self.itervars[-1]
+        stride = sympy.expand(sympy_subs(index, {var: var + 1}) - index)
+        if stride in (0, 1):
+            return stride
+        return None
+
+    def load(self, name: str, index: sympy.Expr):
+        var = self.args.input(name)
+        index = self.rename_indexing(index)
+        stride = self.vec_stride(index)
+        if V.graph.get_dtype(name) != torch.float32 or stride is None:
+            self.disable_vec(f"load {name}[{index}]")
+            return "0"
+        if stride == 0:
+            line = f"{VEC_FLOAT}({var}[{cexpr(index)}])"
+        else:
+            line = f"{VEC_FLOAT}::loadu({var} + {cexpr(index)})"
+        return self.cse.generate(self.loads, line)
+
+    def store(self, name, index, value, mode=None):
+        assert "buf" in name
+        var = self.args.output(name)
+        index = self.rename_indexing(index)
+        if (
+            mode is not None
+            or V.graph.get_dtype(name) != torch.float32
+            or self.vec_stride(index) != 1
+        ):
+            self.disable_vec(f"store {name}[{index}] mode={mode}")
+            return
+        self.stores.writeline(name, f"{value}.store({var} + {cexpr(index)});")
+
+    def reduction(self, name, dtype, src_dtype, reduction_type, index, value):
+        if reduction_type not in VEC_REDUCTIONS or dtype != torch.float32:
+            self.disable_vec(f"{reduction_type} reduction of {dtype}")
+            return
+        # accumulate in a vector, then fold into the scalar kernel's result
+        tmpvar = self.scalar_kernel.cse.store_cache[name]
+        acc = f"{tmpvar}_vec"
+        combine = VEC_REDUCTIONS[reduction_type]
+        self.reduction_prefix.writeline(
+            f"auto {acc} = {VEC_FLOAT}({reduction_init(reduction_type, dtype)});"
+        )
+        self.stores.writeline(None, f"{acc} = {combine.format(acc, value)};")
+        reduce_all = (
+            f"at::vec::vec_reduce_all<float>("
+            f"[]({VEC_FLOAT}& x, {VEC_FLOAT}& y) {{ return {combine.format('x', 'y')}; }}, "
+            f"{acc})"
+        )
+        self.reduction_suffix.writeline(
+            None, f"{reduction_combine(reduction_type, tmpvar, reduce_all)};"
+        )
+        self.cse.store_cache[name] = acc
+
+
 class CppScheduling:
     def __init__(self, scheduler):
         self.scheduler = scheduler
@@ -558,8 +967,33 @@ class CppScheduling:
                     with kernel.write_to_suffix():
                         node.run(vars, ())
 
+        if config.cpp.vectorize and codecache.vec_isa_flags():
+            kernel.vec_kernel = self.codegen_vec_kernel(
+                nodes, kernel, group, reduction_group
+            )
+
         kernel_group.finalize_kernel(kernel, scheduler)
 
+    def codegen_vec_kernel(self, nodes, kernel, group, reduction_group):
+        """
+        A CppVecKernel for the innermost loop of kernel, or None if some
+        part of its body can't be vectorized.  The suffix of a reduction
+        runs once per output, so it stays scalar.
+        """
+        if not kernel.itervars:
+            return None
+        with CppVecKernel(kernel) as vec_kernel:
+            vars, reduction_vars = vec_kernel.set_ranges(group, reduction_group)
+            for node in nodes:
+                if node.group[1] in [
+                    (group, reduction_group),
+                    (group + reduction_group, ()),
+                ]:
+                    node.codegen((vars, reduction_vars))
+        if vec_kernel.vec_unsupported:
+            return None
+        return vec_kernel
+
     def flush(self):
         self.kernel_group.codegen_define_and_call(V.graph.wrapper_code)
         self.kernel_group = KernelGroup()
@@ -574,6 +1008,7 @@ class KernelGroup:
         self.stack = contextlib.ExitStack()
         self.stack.enter_context(self.ws)
         self.count = 0
+        self.vectorized = False
 
     def new_kernel(self):
         return CppKernel(self.args, self.ws.num_threads)
@@ -583,6 +1018,9 @@ class KernelGroup:
         code = self.loops_code
         ws = self.ws
         new_kernel.codegen_loops(code, ws)
+        if new_kernel.vec_kernel:
+            self.vectorized = True
+            metrics.cpp_vectorized_kernel_count += 1
 
     def codegen_define_and_call(self, wrapper):
         self.stack.close()
@@ -591,29 +1029,40 @@ class KernelGroup:
 
         arg_defs, call_args = self.args.cpp_argdefs()
         arg_defs = ",\n".ljust(25).join(arg_defs)
+        headers = [cpp_prefix()]
+        if self.vectorized:
+            headers.append("#include <ATen/cpu/vec/functional.h>")
+            headers.append("#include <ATen/cpu/vec/vec.h>")
+        kernel_name = wrapper.next_kernel_name()
+        # the C++ wrapper is built together with the kernels it calls
+        single_module = config.cpp.single_module or V.graph.cpp_wrapper
         code = BracesBuffer()
-        code.writelines([cpp_prefix(), "" f'extern "C" void kernel({arg_defs})'])
+        if single_module:
+            code.writeline(f'extern "C" void {kernel_name}({arg_defs})')
+        else:
+            code.writelines(headers)
+            code.writeline(f'extern "C" void kernel({arg_defs})')
         with code.indent():
             for old, new in self.args.aliases():
                 code.writeline(f"auto {old} = {new};")
             code.splice(self.loops_code)
 
-        codecache_def = IndentedBuffer()
-        codecache_def.writeline("async_compile.cpp('''")
-        codecache_def.splice(code)
-        codecache_def.writeline("''')")
+        if single_module:
+            wrapper.define_cpp_kernel(kernel_name, code.getvalue(), headers)
+        else:
+            codecache_def = IndentedBuffer()
+            codecache_def.writeline("async_compile.cpp('''")
+            codecache_def.splice(code)
+            codecache_def.writeline("''')")
 
-        kernel_name = wrapper.next_kernel_name()
-        codecache_str = codecache_def.getvalue()
-        # TODO(voz): Ostensibly, we should not need this. But there are cases where C++ codegen does
-        # not use BracesBuffer, so we have no good indicator of a C++ buffer atm.
-        codecache_str = codecache_str.replace("#pragma CMT", "//")
-        wrapper.define_kernel(kernel_name, codecache_str)
+            codecache_str = codecache_def.getvalue()
+            # TODO(voz): Ostensibly, we should not need this. But there are cases where C++ codegen does
+            # not use BracesBuffer, so we have no good indicator of a C++ buffer atm.
+            codecache_str = codecache_str.replace("#pragma CMT", "//")
+            wrapper.define_kernel(kernel_name, codecache_str)
 
         # generate the code to call this
-        wrapper.writeline(
-            "{}({})".format(kernel_name, ", ".join(call_args)),
-        )
+        wrapper.generate_kernel_call(kernel_name, call_args)
 
 
 class WorkSharing:
@@ -661,6 +1110,8 @@ class LoopLevel:
     simd: bool = False
     collapsed: bool = False
     reduction_vars: Dict[str, str] = None
+    offset: sympy.Expr = sympy.Integer(0)
+    steps: int = 1
 
     def lines(self):
         if self.reduction_vars:
@@ -684,11 +1135,32 @@ class LoopLevel:
             line1 = "#pragma GCC ivdep"
         else:
             line1 = ""
-        line2 = f"for({INDEX_TYPE} {self.var}=0; {self.var}<{cexpr(self.size)}; ++{self.var})"
+        if self.steps == 1:
+            step = f"++{self.var}"
+        else:
+            step = f"{self.var}+={self.steps}"
+        line2 = f"for({INDEX_TYPE} {self.var}={cexpr(self.offset)}; {self.var}<{cexpr(self.size)}; {step})"
         if self.collapsed or not line1:
             return [line2]
         return [line1, line2]
 
+    def tile(self, size):
+        """This loop as one over tiles of `size` iterations and one within a tile"""
+        outer = dataclasses.replace(
+            self, var=sympy.Symbol(f"{self.var}_tile"), steps=size
+        )
+        inner = dataclasses.replace(
+            self, offset=outer.var, size=sympy.Min(outer.var + size, self.size)
+        )
+        return outer, inner
+
+    def split(self, steps):
+        """This loop as one taking `steps` iterations at a time and a tail loop"""
+        main_size = IndexingDiv(self.size, steps) * steps
+        main = dataclasses.replace(self, size=main_size, steps=steps, simd=False)
+        tail = dataclasses.replace(self, offset=main_size, simd=False)
+        return main, tail
+
 
 @dataclasses.dataclass
 class LoopNest:
@@ -37,31 +37,6 @@ def buffer_reuse_key(node: ir.Buffer):
     )
 
 
-def make_buffer_reuse(old, new):
-    assert old.get_dtype() == new.get_dtype()
-    if old.get_size() == new.get_size() and old.get_stride() == new.get_stride():
-        return f"{new.get_name()} = {old.get_name()}; del {old.get_name()}"
-
-    return (
-        f"{new.get_name()} = as_strided({old.get_name()}, "
-        f"{V.graph.sizevars.codegen_shape_tuple(new.get_size())}, "
-        f"{V.graph.sizevars.codegen_shape_tuple(new.get_stride())}); del {old.get_name()}"
-    )
-
-
-def make_buffer_allocation(buffer):
-    device = buffer.get_device()
-    dtype = buffer.get_dtype()
-    shape = tuple(buffer.get_size())
-    stride = tuple(buffer.get_stride())
-    return (
-        f"{buffer.get_name()} = empty_strided("
-        f"{V.graph.sizevars.codegen_shape_tuple(shape)}, "
-        f"{V.graph.sizevars.codegen_shape_tuple(stride)}, "
-        f"device='{device.type}', dtype={dtype})"
-    )
-
-
 class MemoryPlanningState:
     def __init__(self):
         super().__init__()
@@ -82,7 +57,10 @@ class MemoryPlanningState:
         self.reuse_pool[key].append(item)
 
 
+@dataclasses.dataclass
 class MemoryPlanningLine:
+    wrapper: "WrapperCodeGen"
+
     def plan(self, state: MemoryPlanningState) -> "MemoryPlanningLine":
         """First pass to find reuse"""
         return self
@@ -98,20 +76,20 @@ class AllocateLine(MemoryPlanningLine):
 
     def plan(self, state: MemoryPlanningState):
         if self.node.get_name() in V.graph.removed_buffers:
-            return NullLine()
+            return NullLine(self.wrapper)
 
         # try to reuse a recently freed buffer
         key = buffer_reuse_key(self.node)
         if key in state:
             free_line = state.pop(key)
             free_line.is_reused = True
-            return ReuseLine(free_line.node, self.node)
+            return ReuseLine(self.wrapper, free_line.node, self.node)
 
         return self
 
     def codegen(self, code: IndentedBuffer):
         assert self.node.get_name() not in V.graph.removed_buffers
-        code.writeline(make_buffer_allocation(self.node))
+        code.writeline(self.wrapper.make_buffer_allocation(self.node))
 
 
 @dataclasses.dataclass
@@ -122,14 +100,14 @@ class FreeIfNotReusedLine(MemoryPlanningLine):
     def plan(self, state: MemoryPlanningState):
         assert not self.is_reused
         if self.node.get_name() in V.graph.removed_buffers:
-            return NullLine()
+            return NullLine(self.wrapper)
         state.push(buffer_reuse_key(self.node), self)
         return self
 
     def codegen(self, code: IndentedBuffer):
         assert self.node.get_name() not in V.graph.removed_buffers
         if not self.is_reused:
-            code.writeline(f"del {self.node.get_name()}")
+            code.writeline(self.wrapper.make_buffer_free(self.node))
 
 
 @dataclasses.dataclass
@@ -140,14 +118,17 @@ class ReuseLine(MemoryPlanningLine):
     def plan(self, state: MemoryPlanningState):
         if self.reused_as.get_name() in V.graph.removed_buffers:
             # we hit this case only for inplace buffers
-            return FreeLine(self.node).plan(state)
+            return FreeLine(self.wrapper, self.node).plan(state)
         assert self.node.get_name() not in V.graph.removed_buffers
         return self
 
     def codegen(self, code: IndentedBuffer):
         assert self.node.get_name() not in V.graph.removed_buffers
         assert self.reused_as.get_name() not in V.graph.removed_buffers
-        code.writeline(make_buffer_reuse(self.node, self.reused_as) + "  # reuse")
+        code.writeline(
+            self.wrapper.make_buffer_reuse(self.node, self.reused_as)
+            + f"  {self.wrapper.comment} reuse"
+        )
 
 
 @dataclasses.dataclass
@@ -156,12 +137,12 @@ class FreeLine(MemoryPlanningLine):
 
     def plan(self, state: MemoryPlanningState):
         if self.node.get_name() in V.graph.removed_buffers:
-            return NullLine()
+            return NullLine(self.wrapper)
         return self
 
     def codegen(self, code: IndentedBuffer):
         assert self.node.get_name() not in V.graph.removed_buffers
-        code.writeline(f"del {self.node.get_name()}")
+        code.writeline(self.wrapper.make_buffer_free(self.node))
 
 
 class NullLine(MemoryPlanningLine):
@@ -180,6 +161,22 @@ class WrapperCodeGen(CodeGen):
         self.prefix = IndentedBuffer()
         self.kernels = {}
         self.lines = []
+        # see define_cpp_kernel()
+        self.cpp_headers = {}
+        self.cpp_kernels = {}
+        self.declare = ""
+        self.ending = ""
+        self.comment = "#"
+        self.write_header()
+        self.write_prefix()
+
+        self.allocated = set()
+        self.freed = set()
+        self.write_get_cuda_stream = functools.lru_cache(None)(
+            self.write_get_cuda_stream
+        )
+
+    def write_header(self):
         self.header.splice(
             f"""
                 from ctypes import c_void_p, c_long
@@ -226,6 +223,15 @@ class WrapperCodeGen(CodeGen):
                     f"from {config.inductor_import}.triton_ops.batched_matmul import bmm_out as triton_bmm_out"
                 )
 
+        self.write_constants()
+
+    def write_constants(self):
+        for name, value in V.graph.constants.items():
+            # include a hash so our code cache gives different constants different files
+            hashed = hashlib.sha256(repr(value).encode("utf-8")).hexdigest()
+            self.header.writeline(f"{name} = None  # {hashed}")
+
+    def write_prefix(self):
         self.prefix.splice(
             f"""
 
@@ -242,17 +248,6 @@ class WrapperCodeGen(CodeGen):
                 )
             V.graph.sizevars.codegen(self.prefix, V.graph.graph_inputs)
 
-        for name, value in V.graph.constants.items():
-            # include a hash so our code cache gives different constants different files
-            hashed = hashlib.sha256(repr(value).encode("utf-8")).hexdigest()
-            self.header.writeline(f"{name} = None  # {hashed}")
-
-        self.allocated = set()
-        self.freed = set()
-        self.write_get_cuda_stream = functools.lru_cache(None)(
-            self.write_get_cuda_stream
-        )
-
     def write_get_cuda_stream(self, index):
         name = f"stream{index}"
         self.writeline(f"{name} = get_cuda_stream({index})")
@@ -261,6 +256,49 @@ class WrapperCodeGen(CodeGen):
     def next_kernel_name(self):
         return f"kernel{next(self._names_iter)}"
 
+    def codegen_sizevar(self, x):
+        return V.graph.sizevars.codegen_sizevar(x)
+
+    def codegen_shape_tuple(self, shape):
+        return V.graph.sizevars.codegen_shape_tuple(shape)
+
+    def codegen_as_strided(self, name, size, stride, offset=0):
+        size = self.codegen_shape_tuple(size)
+        stride = self.codegen_shape_tuple(stride)
+        offset = self.codegen_sizevar(offset)
+        if offset != "0":
+            return f"as_strided({name}, {size}, {stride}, {offset})"
+        return f"as_strided({name}, {size}, {stride})"
+
+    def val_to_str(self, value):
+        return repr(value)
+
+    def make_buffer_allocation(self, buffer):
+        device = buffer.get_device()
+        dtype = buffer.get_dtype()
+        shape = tuple(buffer.get_size())
+        stride = tuple(buffer.get_stride())
+        return (
+            f"{buffer.get_name()} = empty_strided("
+            f"{self.codegen_shape_tuple(shape)}, "
+            f"{self.codegen_shape_tuple(stride)}, "
+            f"device='{device.type}', dtype={dtype})"
+        )
+
+    def make_buffer_free(self, buffer):
+        return f"del {buffer.get_name()}"
+
+    def make_buffer_reuse(self, old, new):
+        assert old.get_dtype() == new.get_dtype()
+        if old.get_size() == new.get_size() and old.get_stride() == new.get_stride():
+            return f"{new.get_name()} = {old.get_name()}; del {old.get_name()}"
+
+        return (
+            f"{new.get_name()} = "
+            f"{self.codegen_as_strided(old.get_name(), new.get_size(), new.get_stride())}"
+            f"; del {old.get_name()}"
+        )
+
     def codegen_allocation(self, buffer):
         name = buffer.get_name()
         if name in V.graph.removed_buffers or name in self.allocated:
@@ -276,12 +314,14 @@ class WrapperCodeGen(CodeGen):
                 V.graph.unaligned_buffers.add(name)
             self.codegen_allocation(layout.view.data)
             allocation = DeferredLine(
-                name, f"{name} = {layout.view.codegen_reference()}  # alias"
+                name,
+                f"{self.declare}{name} = {layout.view.codegen_reference()}"
+                f"{self.ending}  {self.comment} alias",
             )
             self.writeline(allocation)
             return
 
-        self.writeline(AllocateLine(buffer))
+        self.writeline(AllocateLine(self, buffer))
 
     def codegen_free(self, buffer):
         name = buffer.get_name()
@@ -291,10 +331,10 @@ class WrapperCodeGen(CodeGen):
 
         layout = buffer.get_layout()
         if isinstance(layout, (ir.AliasedLayout, ir.MultiOutputLayout)):
-            self.writeline(f"del {name}")
+            self.writeline(self.make_buffer_free(buffer))
             return
 
-        self.writeline(FreeIfNotReusedLine(buffer))
+        self.writeline(FreeIfNotReusedLine(self, buffer))
 
     def can_reuse(self, buffer):
         name = buffer.get_name()
@@ -312,12 +352,13 @@ class WrapperCodeGen(CodeGen):
         self.codegen_allocation(input_buffer)
         self.freed.add(input_buffer.get_name())
         self.allocated.add(output_buffer.get_name())
-        self.writeline(ReuseLine(input_buffer, output_buffer))
+        self.writeline(ReuseLine(self, input_buffer, output_buffer))
 
     @dynamo_utils.dynamo_timed
     def generate(self):
         result = IndentedBuffer()
         result.splice(self.header)
+        self.codegen_cpp_module(result)
         result.splice(self.prefix)
 
         out_names = V.graph.get_output_names()
@@ -343,15 +384,22 @@ class WrapperCodeGen(CodeGen):
                     result.writeline(line)
 
             output_refs = [x.codegen_reference() for x in V.graph.graph_outputs]
-            if output_refs:
-                result.writeline("return (" + ", ".join(output_refs) + ", )")
-            else:
-                result.writeline("return ()")
+            self.generate_return(result, output_refs)
 
+        self.generate_end(result)
         self.add_benchmark_harness(result)
 
         return result.getvalue()
 
+    def generate_return(self, output, output_refs):
+        if output_refs:
+            output.writeline("return (" + ", ".join(output_refs) + ", )")
+        else:
+            output.writeline("return ()")
+
+    def generate_end(self, output):
+        return
+
     def add_benchmark_harness(self, output):
         """
         Append a benchmark harness to generated code for debugging
@@ -396,6 +444,36 @@ class WrapperCodeGen(CodeGen):
     def define_kernel(self, name: str, kernel: str):
         self.header.splice(f"\n\n{name} = {kernel}")
 
+    def define_cpp_kernel(self, name: str, kernel: str, headers: List[str]):
+        """Add a C++ kernel to the module of this graph, see config.cpp.single_module"""
+        for header in headers:
+            self.cpp_headers[header] = None
+        self.cpp_kernels[name] = kernel
+
+    def codegen_cpp_module(self, output):
+        if not self.cpp_kernels:
+            return
+        names = list(self.cpp_kernels.keys())
+        code = IndentedBuffer()
+        code.writeline(f"{', '.join(names)}, = async_compile.cpp_module('''")
+        code.writelines(self.cpp_headers.keys())
+        for kernel in self.cpp_kernels.values():
+            code.writeline("")
+            code.splice(kernel)
+        code.writeline(f"''', {names!r})")
+        # TODO(voz): see KernelGroup.codegen_define_and_call()
+        output.splice("\n\n" + code.getvalue().replace("#pragma CMT", "//"))
+
+    def generate_kernel_call(self, name, call_args):
+        self.writeline(f"{name}({', '.join(call_args)}){self.ending}")
+
+    def generate_extern_kernel_out(self, output_view, codegen_reference, args, kernel):
+        if output_view:
+            args.append(f"out={output_view.codegen_reference()}")
+        else:
+            args.append(f"out={codegen_reference}")
+        self.writeline(f"{kernel}({', '.join(args)})")
+
     def call_kernel(self, name: str, kernel: Kernel):
         tmp = IndentedBuffer()
         kernel.call_kernel(self, tmp, name)
@@ -406,3 +484,126 @@ class WrapperCodeGen(CodeGen):
 
     def writeline(self, line):
         self.lines.append(line)
+
+
+class CppWrapperCodeGen(WrapperCodeGen):
+    """
+    Generates call() as a C++ function taking and returning at::Tensors,
+    built into a Python extension together with the C++ kernels it calls,
+    so a graph costs one call from Python.  See config.cpp.wrapper.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.declare = "auto "
+        self.ending = ";"
+        self.comment = "//"
+
+    def write_header(self):
+        self.header.splice(
+            f"""
+                import torch
+                from {codecache.__name__} import CppWrapperCodeCache
+
+            """
+        )
+        self.write_constants()
+
+    def write_prefix(self):
+        self.prefix.splice(
+            """
+
+            std::vector<at::Tensor> call(std::vector<at::Tensor> args) {
+            """
+        )
+        with self.prefix.indent():
+            arg_names = [*V.graph.graph_inputs.keys(), *V.graph.constants.keys()]
+            for i, name in enumerate(arg_names):
+                self.prefix.writeline(f"auto {name} = args[{i}];")
+            V.graph.sizevars.codegen(self.prefix, V.graph.graph_inputs, cpp=True)
+
+    def codegen_sizevar(self, x):
+        from .cpp import cexpr
+
+        return cexpr(V.graph.sizevars.simplify(x))
+
+    def codegen_shape_tuple(self, shape):
+        return "{" + ", ".join(map(self.codegen_sizevar, shape)) + "}"
+
+    def codegen_as_strided(self, name, size, stride, offset=0):
+        size = self.codegen_shape_tuple(size)
+        stride = self.codegen_shape_tuple(stride)
+        offset = self.codegen_sizevar(offset)
+        return f"at::as_strided({name}, {size}, {stride}, {offset})"
+
+    def val_to_str(self, value):
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if value == float("inf"):
+            return "std::numeric_limits<double>::infinity()"
+        if value == float("-inf"):
+            return "-std::numeric_limits<double>::infinity()"
+        if value != value:
+            return "std::numeric_limits<double>::quiet_NaN()"
+        return repr(value)
+
+    def make_buffer_allocation(self, buffer):
+        from .cpp import DTYPE_TO_ATEN
+
+        return (
+            f"auto {buffer.get_name()} = at::empty_strided("
+            f"{self.codegen_shape_tuple(buffer.get_size())}, "
+            f"{self.codegen_shape_tuple(buffer.get_stride())}, "
+            f"at::TensorOptions({DTYPE_TO_ATEN[buffer.get_dtype()]}));"
+        )
+
+    def make_buffer_free(self, buffer):
+        return f"{buffer.get_name()}.reset();"
+
+    def make_buffer_reuse(self, old, new):
+        assert old.get_dtype() == new.get_dtype()
+        if old.get_size() == new.get_size() and old.get_stride() == new.get_stride():
+            return f"auto {new.get_name()} = std::move({old.get_name()});"
+
+        return (
+            f"auto {new.get_name()} = "
+            f"{self.codegen_as_strided(old.get_name(), new.get_size(), new.get_stride())}"
+            f"; {old.get_name()}.reset();"
+        )
+
+    def generate_return(self, output, output_refs):
+        output.writeline("return {" + ", ".join(output_refs) + "};")
+
+    def generate_end(self, output):
+        args = [*V.graph.graph_inputs.keys(), *V.graph.constants.keys()]
+        output.writeline("}")
+        output.writeline("''', 'call')")
+        output.splice(
+            f"""
+
+            def call({', '.join(V.graph.graph_inputs.keys())}):
+                return tuple(call_cpp([{', '.join(args)}]))
+            """
+        )
+
+    def generate_extern_kernel_out(self, output_view, codegen_reference, args, kernel):
+        # aten.mm.out becomes at::mm_out(out, ...), which needs an lvalue out
+        op = kernel.split(".")[1]
+        if output_view:
+            self.writeline(
+                f"{{ auto out = {output_view.codegen_reference()}; "
+                f"at::{op}_out({', '.join(['out', *args])}); }}"
+            )
+        else:
+            self.writeline(f"at::{op}_out({', '.join([codegen_reference, *args])});")
+
+    def codegen_cpp_module(self, output):
+        code = IndentedBuffer()
+        code.writeline("call_cpp = CppWrapperCodeCache.load('''")
+        # first, g++ only uses a precompiled cpp_prefix.h ahead of other code
+        code.writelines(self.cpp_headers.keys())
+        code.writeline("#include <torch/extension.h>")
+        for kernel in self.cpp_kernels.values():
+            code.writeline("")
+            code.splice(kernel)
+        output.splice("\n\n" + code.getvalue().replace("#pragma CMT", "//"))
@@ -12,6 +12,7 @@ from torch.utils._mode_utils import no_dispatch
 
 from . import config
 from . import overrides
+from .codecache import FxGraphCache
 from .debug import DebugContext
 from .decomposition import select_decomp_table
 from .graph import GraphLowering
@@ -97,10 +98,31 @@ def compile_fx_inner(
     if cudagraphs is None:
         cudagraphs = config.triton.cudagraphs
 
-    graph = GraphLowering(gm, num_dynamic_inputs=len(example_inputs))
-    with V.set_graph_handler(graph):
-        graph.run(*example_inputs)
-        compiled_fn = graph.compile_to_fn()
+    cache_key = None
+    cached = None
+    if config.persistent_cache:
+        cache_key = FxGraphCache.key(
+            gm, example_inputs, num_fixed=num_fixed, is_backward=is_backward
+        )
+        if cache_key is None:
+            dynamo_utils.counters["inductor"]["fxgraph_cache_bypass"] += 1
+        else:
+            cached = FxGraphCache.load(cache_key)
+            dynamo_utils.counters["inductor"][
+                "fxgraph_cache_hit" if cached else "fxgraph_cache_miss"
+            ] += 1
+
+    if cached:
+        mod, device_types, mutated_inputs = cached
+    else:
+        graph = GraphLowering(gm, num_dynamic_inputs=len(example_inputs))
+        with V.set_graph_handler(graph):
+            graph.run(*example_inputs)
+            mod = graph.compile_to_module()
+        device_types, mutated_inputs = graph.device_types, graph.mutated_inputs
+        if cache_key:
+            FxGraphCache.save(cache_key, mod, graph)
+    compiled_fn = mod.call
 
     complex_memory_overlap_inputs = any(
         complex_memory_overlap(t) for t in example_inputs
@@ -108,8 +130,8 @@ def compile_fx_inner(
 
     if (
         cudagraphs
-        and set(graph.device_types) == {"cuda"}
-        and not graph.mutated_inputs
+        and set(device_types) == {"cuda"}
+        and not mutated_inputs
         and not has_incompatible_cudagraph_ops(gm)
         and not complex_memory_overlap_inputs
     ):
@@ -119,10 +141,10 @@ def compile_fx_inner(
     elif cudagraphs:
         BoxedBool.disable(cudagraphs)
 
-        if len(set(graph.device_types)) > 1:
+        if len(set(device_types)) > 1:
             log.warning("skipping cudagraphs due to multiple devices")
-        elif set(graph.device_types) == {"cuda"}:
-            if graph.mutated_inputs:
+        elif set(device_types) == {"cuda"}:
+            if mutated_inputs:
                 log.warning("skipping cudagraphs due to input mutation")
             elif complex_memory_overlap_inputs:
                 log.warning("skipping cudagraphs due to complex input striding")
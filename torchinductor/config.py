@@ -51,7 +51,21 @@ unroll_reductions_threshold = 8
 
 comment_origin = False
 
-compile_threads = 1
+# threads compiling kernels at once, 1 compiles them in the calling thread
+compile_threads = min(
+    32,
+    len(os.sched_getaffinity(0))
+    if hasattr(os, "sched_getaffinity")
+    else os.cpu_count() or 1,
+)
+
+# reuse the output code of graphs compiled by earlier processes, see
+# codecache.FxGraphCache
+persistent_cache = os.environ.get("TORCHINDUCTOR_PERSISTENT_CACHE", "0") == "1"
+
+# persistent_cache skips graphs that read tensors with get_attr larger than
+# this, as their contents are hashed into the key on every compile
+persistent_cache_max_constant_bytes = 1 << 16
 
 # How to import torchinductor, either torchinductor or torch.inductor
 inductor_import = __name__.replace(".config", "")
@@ -73,6 +87,35 @@ class cpp:
 
     simdlen = None
     min_chunk_size = 4096
+
+    # Vectorize the innermost loop of float32 kernels that index it
+    # contiguously (or not at all) with at::vec::Vectorized<float>, followed
+    # by a scalar loop for the remainder.  Other kernels stay scalar
+    vectorize = False
+
+    # Run the two innermost loops of kernels that access memory contiguously
+    # along different ones (transposes) in square tiles, and column
+    # reductions a tile of columns at a time.  Applies to kernels not
+    # vectorized by the above
+    tiling = False
+
+    # bytes a tile of a tiled kernel should touch, about the L1 data cache
+    tile_cache_bytes = 32 * 1024
+
+    # Compile all C++ kernels of a graph as one translation unit into one
+    # .so, so the compiler starts and parses the headers once per graph
+    # rather than once per kernel
+    single_module = False
+
+    # Generate the wrapper that allocates buffers and calls the kernels of a
+    # CPU graph as a C++ function, so running the graph is one call from
+    # Python rather than a ctypes call per kernel.  Graphs with extern
+    # kernels other than aten.*.out ops keep the Python wrapper
+    wrapper = False
+
+    # Parse cpp_prefix.h and the ATen headers it includes once into a
+    # precompiled header shared by all kernels, g++ only
+    precompiled_header = False
     cxx = (
         None,  # download gcc12 from conda-forge if conda is installed
         "g++-12",
@@ -1,6 +1,7 @@
 import logging
 import operator
 import os
+import re
 import time
 
 import sympy
@@ -12,6 +13,7 @@ from torch.utils._mode_utils import no_dispatch
 
 from . import config
 from . import ir
+from .codegen.wrapper import CppWrapperCodeGen
 from .codegen.wrapper import WrapperCodeGen
 from .exc import LoweringException
 from .exc import MissingOperatorWithDecomp
@@ -88,6 +90,7 @@ class GraphLowering(torch.fx.Interpreter):
         self.constants = {}
         self.removed_buffers = set()
         self.wrapper_code = None
+        self.cpp_wrapper = False
         self.num_dynamic_inputs = num_dynamic_inputs
         self.num_static_inputs = None
         self.mutated_inputs = set()
@@ -325,11 +328,39 @@ class GraphLowering(torch.fx.Interpreter):
     def codegen(self):
         from .scheduler import Scheduler
 
-        self.wrapper_code = WrapperCodeGen()
+        self.cpp_wrapper = config.cpp.wrapper and self.can_use_cpp_wrapper()
+        if self.cpp_wrapper:
+            self.wrapper_code = CppWrapperCodeGen()
+        else:
+            self.wrapper_code = WrapperCodeGen()
         self.scheduler = Scheduler(self.buffers)
         self.scheduler.codegen()
         return self.wrapper_code.generate()
 
+    def can_use_cpp_wrapper(self):
+        """
+        CppWrapperCodeGen handles CPU graphs whose only extern kernels are
+        aten.*.out ops with scalar arguments, see config.cpp.wrapper
+        """
+        if self.device_types != {"cpu"} or self.randomness_seeds:
+            return False
+        if self.sizevars.need_seed:
+            return False
+        if any(isinstance(x, ir.NoneAsConstantBuffer) for x in self.graph_outputs):
+            return False
+        for buffer in self.buffers:
+            if isinstance(buffer, ir.ExternKernel):
+                if type(buffer).codegen is not ir.ExternKernelOut.codegen:
+                    return False
+                if not re.match(r"aten\.\w+\.out$", getattr(buffer, "kernel", "")):
+                    return False
+                scalars = [*buffer.constant_args, *buffer.kwargs.values()]
+                if not all(isinstance(x, (bool, int, float)) for x in scalars):
+                    return False
+            if buffer.get_device().type != "cpu":
+                return False
+        return True
+
     @dynamo_utils.dynamo_timed
     def compile_to_module(self):
         from .codecache import PyCodeCache
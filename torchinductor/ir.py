@@ -1366,12 +1366,9 @@ class ReinterpretView(BaseView):
         pass
 
     def codegen_reference(self):
-        size = V.graph.sizevars.codegen_shape_tuple(self.layout.size)
-        stride = V.graph.sizevars.codegen_shape_tuple(self.layout.stride)
-        offset = V.graph.sizevars.codegen_sizevar(self.layout.offset)
-        if offset != "0":
-            return f"as_strided({self.get_name()}, {size}, {stride}, {offset})"
-        return f"as_strided({self.get_name()}, {size}, {stride})"
+        return V.graph.wrapper_code.codegen_as_strided(
+            self.get_name(), self.layout.size, self.layout.stride, self.layout.offset
+        )
 
 
 class SliceView(View):
@@ -2337,13 +2334,19 @@ class ExternKernel(InputsKernel):
 
     def codegen_args(self):
         args = [x.codegen_reference() for x in self.inputs]
-        args.extend(map(repr, self.constant_args))
+        args.extend(map(V.graph.wrapper_code.val_to_str, self.constant_args))
         return args
 
     def codegen_kwargs(self):
         kwargs = []
         if self.kwargs:
-            kwargs = [f"{k}={repr(v)}" for k, v in self.kwargs.items()]
+            if V.graph.cpp_wrapper:
+                # positional, the kwargs of aten.*.out ops are in schema order
+                kwargs = list(
+                    map(V.graph.wrapper_code.val_to_str, self.kwargs.values())
+                )
+            else:
+                kwargs = [f"{k}={repr(v)}" for k, v in self.kwargs.items()]
         return kwargs
 
     def codegen_size_asserts(self, wrapper):
@@ -2411,11 +2414,9 @@ class ExternKernelOut(ExternKernel):
         if kwargs:
             args.extend(kwargs)
 
-        if self.output_view:
-            args.append(f"out={self.output_view.codegen_reference()}")
-        else:
-            args.append(f"out={self.codegen_reference()}")
-        wrapper.writeline(f"{self.kernel}({', '.join(args)})")
+        wrapper.generate_extern_kernel_out(
+            self.output_view, self.codegen_reference(), args, self.kernel
+        )
 
     def __init__(self, layout, inputs, constant_args=(), kwargs={}, output_view=None):
         super().__init__(
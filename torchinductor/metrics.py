@@ -1,8 +1,18 @@
 # counter for tracking how many kernels have been generated
 generated_kernel_count = 0
 
+# C++ kernels with a vectorized innermost loop, see config.cpp.vectorize
+cpp_vectorized_kernel_count = 0
+
+# C++ kernels with tiled loops, see config.cpp.tiling
+cpp_tiled_kernel_count = 0
+
 
 # reset all counters
 def reset():
     global generated_kernel_count
+    global cpp_vectorized_kernel_count
+    global cpp_tiled_kernel_count
     generated_kernel_count = 0
+    cpp_vectorized_kernel_count = 0
+    cpp_tiled_kernel_count = 0
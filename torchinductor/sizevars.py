@@ -451,21 +451,27 @@ class SizeVarAllocator(object):
         order.sort(key=lambda x: (strides[x] == 0, strides[x]))
         return order
 
-    def codegen(self, code: IndentedBuffer, graph_inputs: Dict[str, ir.Buffer]):
-        """Assign all symbolic shapes to locals"""
+    def codegen(
+        self, code: IndentedBuffer, graph_inputs: Dict[str, ir.Buffer], cpp=False
+    ):
+        """Assign all symbolic shapes to locals, in C++ if cpp"""
+        declare, ending = ("auto ", ";") if cpp else ("", "")
         if self.need_seed:
+            assert not cpp
             code.writeline(
                 "seed = torch.randint(2**31, size=(), dtype=torch.int32).item()"
             )
 
         @functools.lru_cache(None)
         def sizeof(name):
-            code.writeline(f"{name}_size = {name}.size()")
+            method = "sizes" if cpp else "size"
+            code.writeline(f"{declare}{name}_size = {name}.{method}(){ending}")
             return f"{name}_size"
 
         @functools.lru_cache(None)
         def strideof(name):
-            code.writeline(f"{name}_stride = {name}.stride()")
+            method = "strides" if cpp else "stride"
+            code.writeline(f"{declare}{name}_stride = {name}.{method}(){ending}")
             return f"{name}_stride"
 
         # TODO: This should be the below, but causes test/test_torchinductor.py::GpuTests::test_triton_conv_cuda to fail
@@ -480,7 +486,7 @@ class SizeVarAllocator(object):
                 shape = str(shape)
                 if shape in needed:
                     needed.remove(shape)
-                    code.writeline(f"{shape} = {sizeof(name)}[{dim}]")
+                    code.writeline(f"{declare}{shape} = {sizeof(name)}[{dim}]{ending}")
 
         for name, value in graph_inputs.items():
             shapes = value.get_stride()
@@ -488,7 +494,9 @@ class SizeVarAllocator(object):
                 shape = str(shape)
                 if shape in needed:
                     needed.remove(shape)
-                    code.writeline(f"{shape} = {strideof(name)}[{dim}]")
+                    code.writeline(
+                        f"{declare}{shape} = {strideof(name)}[{dim}]{ending}"
+                    )
 
         assert not needed
 